@@ -1,12 +1,13 @@
 import os
 import uuid
+import time
 import logging
 from pathlib import Path
 from typing import List, Optional
 import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,23 +16,75 @@ import uvicorn
 from pipeline.processor import DocumentProcessor
 from pipeline.models import ProcessResult, JobStatus, AuditEntry
 from pipeline.config import Config
+from pipeline.job_store import WORKER_EXITED_ERROR, JobStore, create_job_store
+from pipeline.uploads import MAGIC_SIGNATURES, UploadError, max_upload_bytes, save_upload
+from pipeline.scratch import ScratchStorage
+from pipeline.scheduler import JobScheduler, Priority, QueueFull
+from pipeline.pii_visual import VisualPIIDetector
+from pipeline.ocr import PageOCR
+from pipeline.prefork import PreforkServer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Global variables
+config = Config.load()
 processor: DocumentProcessor
-jobs: dict = {}
+job_store: JobStore
+scheduler: JobScheduler
+scratch = ScratchStorage.from_config(config)
+
+async def evict_expired_jobs():
+    """Periodically drop finished jobs past jobs.ttl_hours, with their output files"""
+    ttl_seconds = config.get("jobs.ttl_hours", 24) * 3600
+    interval = config.get("jobs.evict_interval_s", 300)
+    
+    while True:
+        try:
+            for job in await asyncio.to_thread(job_store.evict_expired, ttl_seconds):
+                scratch.discard(job.get("output_path"))
+        except Exception as e:
+            logger.error(f"Error evicting expired jobs: {str(e)}")
+        await asyncio.sleep(interval)
+
+def fail_interrupted_jobs(store: JobStore) -> None:
+    """Fail the jobs a previous server process accepted but never finished"""
+    interrupted = store.fail_unfinished()
+    if interrupted:
+        logger.warning(f"Marked {len(interrupted)} jobs interrupted by a restart as failed")
+
+def fail_worker_jobs(pid: int) -> None:
+    """Fail the jobs a pre-fork worker accepted but never finished before it exited"""
+    store = create_job_store(config)
+    try:
+        interrupted = store.fail_unfinished(WORKER_EXITED_ERROR, worker_pid=pid)
+    finally:
+        store.close()
+    if interrupted:
+        logger.warning(f"Marked {len(interrupted)} jobs of exited worker {pid} as failed")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global processor
+    global processor, job_store, scheduler
     # Initialize processor
-    config = Config.load()
-    processor = DocumentProcessor(config)
+    processor = DocumentProcessor(config, scratch)
+    if config.get("visual.warm_up", True):
+        # Model loading is blocking; keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, processor.warm_up)
+    job_store = create_job_store(config)
+    if config.get("server.workers", 1) <= 1:
+        # Pre-fork workers start while their siblings run jobs; the parent does this before forking
+        fail_interrupted_jobs(job_store)
+    scheduler = JobScheduler.from_config(config, process_document_task)
+    await scheduler.start()
+    evictor = asyncio.create_task(evict_expired_jobs())
     yield
     # Cleanup
+    evictor.cancel()
+    await scheduler.stop()
+    processor.close()
+    job_store.close()
 
 app = FastAPI(
     title="DocuShield AI",
@@ -49,48 +102,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create directories
-os.makedirs("temp", exist_ok=True)
-os.makedirs("output", exist_ok=True)
+@app.middleware("http")
+async def reject_unadmittable_uploads(request: Request, call_next):
+    """Refuse oversized uploads (by Content-Length) and uploads to a full queue before the body is read"""
+    if request.method == "POST" and request.url.path == "/api/v1/redact":
+        limit = max(max_upload_bytes(config, ext) for ext in MAGIC_SIGNATURES)
+        content_length = request.headers.get("content-length")
+        # Allow some room for the multipart envelope
+        if content_length and content_length.isdigit() and int(content_length) > limit + 64 * 1024:
+            return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+        # This worker's queue only: with pre-fork workers a sibling may still have room
+        if scheduler.depth >= scheduler.max_depth:
+            error = queue_full(QueueFull(scheduler.retry_after))
+            return JSONResponse(status_code=error.status_code, content={"detail": error.detail}, headers=error.headers)
+    return await call_next(request)
 
-async def process_document_task(job_id: str, file_path: str, filename: str):
-    """Background task to process document"""
+async def process_document_task(job_id: str, file_path: str, filename: str,
+                                content_sha256: Optional[str] = None,
+                                queued_at: Optional[float] = None):
+    """Scheduler handler that processes one document"""
+    queued_at = queued_at or time.monotonic()
     try:
-        jobs[job_id]["status"] = "processing"
+        queue_wait = time.monotonic() - queued_at
+        await asyncio.to_thread(job_store.update, job_id, status="processing", queue_wait_s=round(queue_wait, 4))
         
         # Process the document
-        result = await processor.process_document(file_path, filename)
-        
-        jobs[job_id].update({
-            "status": "completed",
-            "result": result,
-            "download_url": f"/api/v1/jobs/{job_id}/download",
-            "audit_url": f"/api/v1/jobs/{job_id}/audit"
-        })
+        result = await processor.process_document(file_path, filename, content_sha256)
+        result.job_id = job_id
         
+        # Latencies as the client sees them, from admission to the queue
+        first_page = result.summary.get("time_to_first_page_s")
+        # The audit log is serialized in the store, off the event loop
+        await asyncio.to_thread(
+            job_store.complete,
+            job_id,
+            result,
+            download_url=f"/api/v1/jobs/{job_id}/download",
+            audit_url=f"/api/v1/jobs/{job_id}/audit",
+            time_to_first_page_s=round(queue_wait + first_page, 4) if first_page is not None else None,
+            completion_s=round(time.monotonic() - queued_at, 4)
+        )
+    
     except Exception as e:
         logger.error(f"Error processing job {job_id}: {str(e)}")
-        jobs[job_id].update({
-            "status": "failed",
-            "error": str(e)
-        })
+        await asyncio.to_thread(job_store.update, job_id, status="failed", error=str(e))
+    
+    finally:
+        # The input is no longer needed once the output (or error) is recorded
+        scratch.discard(file_path)
 
 @app.get("/api/v1/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "ok", "service": "DocuShield AI"}
 
+@app.get("/api/v1/cache")
+async def cache_stats():
+    """Result cache hit/miss statistics"""
+    if processor.result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **processor.result_cache.stats()}
+
 @app.post("/api/v1/redact")
 async def redact_document(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    priority: str = Query("interactive", description="interactive | bulk")
 ):
     """Upload and redact a document"""
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
+    try:
+        job_priority = Priority[priority.upper()]
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}")
+    
     # Validate file type
-    allowed_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.tiff']
+    allowed_extensions = list(MAGIC_SIGNATURES)
     file_ext = Path(file.filename).suffix.lower()
     if file_ext not in allowed_extensions:
         raise HTTPException(
@@ -101,53 +189,84 @@ async def redact_document(
     # Generate job ID
     job_id = str(uuid.uuid4())
     
-    # Save uploaded file
-    file_path = f"temp/{job_id}_{file.filename}"
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    # Stream the upload to scratch storage, enforcing type and size as it arrives
+    try:
+        stored = await save_upload(
+            file,
+            scratch,
+            f"{job_id}_{file.filename}",
+            file_ext,
+            max_upload_bytes(config, file_ext),
+            config.get("io.upload_chunk_kb", 1024) * 1024
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
     # Initialize job
-    jobs[job_id] = {
-        "id": job_id,
-        "filename": file.filename,
-        "status": "queued",
-        "created_at": asyncio.get_event_loop().time()
-    }
+    await asyncio.to_thread(job_store.create, job_id, file.filename, sha256=stored.sha256,
+                            size_bytes=stored.size, priority=job_priority.name.lower(),
+                            worker_pid=os.getpid())
     
-    # Start background processing
-    background_tasks.add_task(
-        process_document_task, 
-        job_id, 
-        file_path, 
-        file.filename
-    )
+    # Queue for processing
+    try:
+        position = scheduler.submit(
+            job_id,
+            job_priority,
+            file_path=stored.path,
+            filename=file.filename,
+            content_sha256=stored.sha256,
+            queued_at=time.monotonic()
+        )
+    except QueueFull as e:
+        scratch.discard(stored.path)
+        await asyncio.to_thread(job_store.update, job_id, status="failed", error=str(e))
+        raise queue_full(e)
     
     return {
         "job_id": job_id,
         "status": "queued",
+        "queue_position": position,
         "message": "Document queued for processing"
     }
 
+def queue_full(error: QueueFull) -> HTTPException:
+    """429 response telling the client when to retry"""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 @app.get("/api/v1/jobs/{job_id}")
 async def get_job_status(job_id: str):
-    """Get job status"""
-    if job_id not in jobs:
+    """Get job status
+    
+    queue_position counts jobs ahead in the queue of the worker that took
+    the upload; with server.workers > 1 it is null when the poll is served
+    by another worker.
+    """
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return jobs[job_id]
+    # Internal bookkeeping, not part of the API
+    job.pop("output_path", None)
+    job.pop("worker_pid", None)
+    if job["status"] == "queued":
+        job["queue_position"] = scheduler.position(job_id)
+    return job
 
 @app.get("/api/v1/jobs/{job_id}/download")
 async def download_result(job_id: str):
     """Download processed document"""
-    if job_id not in jobs:
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Job not completed")
     
-    output_path = f"output/{job_id}_redacted_{job['filename']}"
+    output_path = job.get("output_path", "")
     if not os.path.exists(output_path):
         raise HTTPException(status_code=404, detail="Output file not found")
     
@@ -160,14 +279,15 @@ async def download_result(job_id: str):
 @app.get("/api/v1/jobs/{job_id}/audit")
 async def get_audit_log(job_id: str):
     """Get audit log for processed document"""
-    if job_id not in jobs:
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Job not completed")
     
-    result = job.get("result", {})
+    # Audit entries are only deserialized here, never on status polls
+    result = await asyncio.to_thread(job_store.get_result, job_id) or {}
     return {
         "job_id": job_id,
         "filename": job["filename"],
@@ -175,13 +295,50 @@ async def get_audit_log(job_id: str):
         "summary": result.get("summary", {})
     }
 
-# Serve frontend static files
-app.mount("/", StaticFiles(directory="frontend/dist", html=True), name="frontend")
+# Serve frontend static files once the frontend has been built
+if Path("frontend/dist").is_dir():
+    app.mount("/", StaticFiles(directory="frontend/dist", html=True), name="frontend")
+
+def preload_models() -> None:
+    """Load every model in the pre-fork parent so workers share its pages"""
+    # ONNX Runtime thread pools do not survive fork, so preloaded sessions
+    # run on the calling thread; workers and sessions provide the parallelism
+    config.set("visual.intra_op_threads", 1)
+    config.set("visual.inter_op_threads", 1)
+    VisualPIIDetector(config).warm_up(all_sessions=True)
+    PageOCR(config).warm_up(all_sessions=True)
+
+def split_budgets(workers: int) -> None:
+    """Give each pre-fork worker an equal share of the per-process budgets
+    
+    Every worker keeps its own scratch accounting, result cache index and
+    job queue, so the configured totals are divided between them.
+    """
+    global scratch
+    config.set("io.ramdisk_budget_mb", config.get("io.ramdisk_budget_mb", 512) / workers)
+    config.set("cache.max_mb", config.get("cache.max_mb", 2048) / workers)
+    config.set("queue.max_depth", max(1, config.get("queue.max_depth", 100) // workers))
+    scratch = ScratchStorage.from_config(config)
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app:app",
-        host="0.0.0.0",
-        port=8080,
-        reload=False
-    )
\ No newline at end of file
+    host = config.get("server.host", "0.0.0.0")
+    port = config.get("server.port", 8080)
+    workers = config.get("server.workers", 1)
+    
+    if workers > 1:
+        if config.get("jobs.store", "sqlite") == "memory":
+            raise SystemExit("server.workers > 1 needs a job store shared between processes (jobs.store: sqlite)")
+        split_budgets(workers)
+        store = create_job_store(config)
+        fail_interrupted_jobs(store)
+        store.close()
+        server = PreforkServer(app, host, port, workers, preload=preload_models, on_worker_exit=fail_worker_jobs)
+        server.start()
+        server.serve_forever(report_interval_s=config.get("server.memory_report_s", 0))
+    else:
+        uvicorn.run(
+            "app:app",
+            host=host,
+            port=port,
+            reload=False
+        )
\ No newline at end of file
@@ -1,12 +1,17 @@
 import asyncio
+import multiprocessing
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, List
+from typing import Any, Callable, Dict, Iterator, Optional, List
 import typer
 import logging
 
 from pipeline.processor import DocumentProcessor
 from pipeline.config import Config
+from pipeline import batch
+from pipeline.batch import BatchManifest, iter_input_files, redact_file
+from pipeline.audit_log import AuditWriter, merge_audit_logs
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,95 +27,153 @@ def redact(
     input_path: str = typer.Argument(..., help="Input file or directory path"),
     output_dir: str = typer.Option("output", "--out", "-o", help="Output directory"),
     policy_file: str = typer.Option("configs/policies.yaml", "--policy", "-p", help="Policy configuration file"),
-    audit_file: Optional[str] = typer.Option(None, "--audit", "-a", help="Audit log output file"),
+    audit_file: Optional[str] = typer.Option(None, "--audit", "-a", help="Audit log (JSON Lines; .gz or .zst to compress), appended per file"),
     recursive: bool = typer.Option(False, "--recursive", "-r", help="Process directories recursively"),
-    config_file: str = typer.Option("configs/default.yaml", "--config", "-c", help="Configuration file")
+    config_file: str = typer.Option("configs/default.yaml", "--config", "-c", help="Configuration file"),
+    pdf_workers: Optional[int] = typer.Option(None, "--pdf-workers", help="Worker processes per PDF (overrides processing.pdf_workers)"),
+    workers: int = typer.Option(1, "--workers", "-w", min=1, help="Files redacted in parallel, one process each")
 ):
-    """Redact PII from documents"""
+    """Redact PII from documents
+    
+    Progress is checkpointed in the output directory; re-running the same
+    command skips files already redacted and retries the ones that failed.
+    """
     asyncio.run(_redact_documents(
-        input_path, output_dir, policy_file, audit_file, recursive, config_file
+        input_path, output_dir, policy_file, audit_file, recursive, config_file, pdf_workers, workers
     ))
 
+def _output_path(file_path: Path, root: Path, output_dir: str) -> Path:
+    """Where a redacted file goes; subdirectories of the input are mirrored"""
+    relative = file_path.parent.relative_to(root) if root.is_dir() else Path()
+    return Path(output_dir) / relative / f"redacted_{file_path.name}"
+
 async def _redact_documents(
     input_path: str, 
     output_dir: str, 
     policy_file: str, 
     audit_file: Optional[str], 
     recursive: bool,
-    config_file: str
+    config_file: str,
+    pdf_workers: Optional[int] = None,
+    workers: int = 1
 ):
     """Async function to redact documents"""
     try:
         # Load configuration
-        config = Config.load(config_file)
-        processor = DocumentProcessor(config)
+        config = Config.load(config_file, policy_file)
+        if pdf_workers is not None:
+            config.set("processing.pdf_workers", pdf_workers)
         
         # Create output directory
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         
-        # Get input files
         input_path_obj = Path(input_path)
-        files_to_process = []
-        
-        if input_path_obj.is_file():
-            files_to_process = [input_path_obj]
-        elif input_path_obj.is_dir():
-            pattern = "**/*" if recursive else "*"
-            extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.tiff']
-            
-            for ext in extensions:
-                files_to_process.extend(input_path_obj.glob(f"{pattern}{ext}"))
-                files_to_process.extend(input_path_obj.glob(f"{pattern}{ext.upper()}"))
-        else:
+        if not input_path_obj.exists():
             typer.echo(f"Error: Input path {input_path} does not exist", err=True)
             sys.exit(1)
         
-        if not files_to_process:
-            typer.echo("No supported files found to process", err=True)
-            sys.exit(1)
-        
-        typer.echo(f"Found {len(files_to_process)} files to process")
+        manifest = BatchManifest(output_dir)
+        counts = {"done": 0, "failed": 0, "skipped": 0}
+        audit_log = AuditWriter(audit_file) if audit_file else None
         
-        all_audit_entries = []
+        def finish(record: Dict[str, Any]) -> None:
+            audit_entries = record.pop("audit_entries", [])
+            manifest.record(**record)
+            counts[record["status"]] += 1
+            if record["status"] == "done":
+                typer.echo(f"  -> Saved: {record['output']}")
+                typer.echo(f"  -> Found {record['detections']} PII items")
+                if audit_log is not None:
+                    audit_log.write(audit_entries, source=record["input"])
+                    audit_log.flush()
+            else:
+                typer.echo(f"Error processing {record['input']}: {record['error']}", err=True)
         
-        # Process each file
-        for file_path in files_to_process:
-            try:
+        # Files are discovered lazily and handed out as they are found
+        def pending_files():
+            for file_path in iter_input_files(input_path_obj, recursive, exclude=Path(output_dir)):
+                if manifest.is_done(file_path):
+                    counts["skipped"] += 1
+                    continue
                 typer.echo(f"Processing: {file_path}")
-                
-                result = await processor.process_document(str(file_path), file_path.name)
-                
-                # Copy output file to output directory
-                output_filename = f"redacted_{file_path.name}"
-                final_output_path = Path(output_dir) / output_filename
-                
-                # Move the processed file
-                import shutil
-                shutil.move(result.output_path, str(final_output_path))
-                
-                typer.echo(f"  -> Saved: {final_output_path}")
-                typer.echo(f"  -> Found {result.detections_count} PII items")
-                
-                # Collect audit entries
-                all_audit_entries.extend(result.audit_entries)
-                
-            except Exception as e:
-                typer.echo(f"Error processing {file_path}: {str(e)}", err=True)
-                continue
+                yield file_path, _output_path(file_path, input_path_obj, output_dir)
+        
+        try:
+            if workers > 1:
+                await _redact_in_processes(config, pending_files(), workers, finish)
+            else:
+                processor = DocumentProcessor(config)
+                try:
+                    for file_path, output_path in pending_files():
+                        finish(await redact_file(processor, file_path, output_path))
+                finally:
+                    processor.close()
+        finally:
+            manifest.close()
+            if audit_log is not None:
+                audit_log.close()
+        
+        if not any(counts.values()):
+            typer.echo("No supported files found to process", err=True)
+            sys.exit(1)
         
-        # Save audit log if requested
-        if audit_file:
-            import json
-            with open(audit_file, 'w') as f:
-                json.dump([entry.__dict__ for entry in all_audit_entries], f, indent=2)
-            typer.echo(f"Audit log saved: {audit_file}")
+        if audit_log is not None:
+            typer.echo(f"Audit log saved: {audit_file} ({audit_log.entries_written} entries)")
         
-        typer.echo(f"Processing complete. {len(files_to_process)} files processed.")
+        typer.echo(
+            f"Processing complete. {counts['done']} files processed, "
+            f"{counts['failed']} failed, {counts['skipped']} already done."
+        )
         
     except Exception as e:
         typer.echo(f"Error: {str(e)}", err=True)
         sys.exit(1)
 
+async def _redact_in_processes(config: Config, files: Iterator, workers: int,
+                               finish: Callable[[Dict[str, Any]], None]) -> None:
+    """Redact files on a pool of worker processes, a bounded number in flight"""
+    loop = asyncio.get_running_loop()
+    # spawn: workers own fitz documents and executors of their own
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=batch.init_worker,
+        initargs=(config.data, str(config.policies_file), workers)
+    )
+    in_flight = set()
+    try:
+        for file_path, output_path in files:
+            in_flight.add(loop.run_in_executor(
+                pool, batch.redact_file_in_worker, str(file_path), str(output_path)
+            ))
+            if len(in_flight) >= workers * 2:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    finish(future.result())
+        for future in asyncio.as_completed(in_flight):
+            finish(await future)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        batch.remove_worker_dirs(config)
+
+@app.command()
+def audit(
+    shards: List[str] = typer.Argument(..., help="Audit logs to merge (.jsonl, .gz or .zst)"),
+    output: str = typer.Option(..., "--out", "-o", help="Merged audit log; compression follows the extension"),
+    pii_type: Optional[List[str]] = typer.Option(None, "--type", "-t", help="Keep only these PII types"),
+    source: Optional[List[str]] = typer.Option(None, "--file", "-f", help="Keep only entries from these input files"),
+    min_confidence: Optional[float] = typer.Option(None, "--min-confidence", help="Drop entries below this confidence")
+):
+    """Merge and filter audit log shards"""
+    try:
+        count = merge_audit_logs(
+            shards, output, pii_types=pii_type, files=source, min_confidence=min_confidence
+        )
+        typer.echo(f"Wrote {count} entries to {output}")
+    except Exception as e:
+        typer.echo(f"Error: {str(e)}", err=True)
+        sys.exit(1)
+
 @app.command()
 def health():
     """Check system health"""
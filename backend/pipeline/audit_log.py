@@ -0,0 +1,192 @@
+import gzip
+import io
+import json
+import logging
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# What a compressed log cut off mid-stream raises on read (BadGzipFile is an OSError)
+_TRUNCATED_STREAM_ERRORS = (EOFError, OSError, zlib.error)
+
+def compression_for(path: str) -> Optional[str]:
+    """Compression implied by a file name: 'gzip', 'zstd' or None"""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".gz":
+        return "gzip"
+    if suffix in (".zst", ".zstd"):
+        return "zstd"
+    return None
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd audit logs need the 'zstandard' package (pip install zstandard)")
+    return zstandard
+
+class AuditWriter:
+    """Append-only JSON Lines audit log, written as each document completes
+    
+    Every line is one audit entry plus the document it came from. Appending
+    to an existing log continues it: gzip and zstd both allow concatenated
+    streams, so a resumed batch adds a new member instead of rewriting.
+    flush() pushes compressed data out with a sync flush and fsyncs, so
+    everything written before it survives a crash; a reader sees at worst a
+    truncated final line, which is dropped before the log is appended to.
+    """
+    
+    def __init__(self, path: str, compression: Optional[str] = None):
+        self.path = path
+        self.compression = compression or compression_for(path)
+        self.entries_written = 0
+        
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            if self.compression is None:
+                _drop_torn_line(path)
+            else:
+                _repair(path)
+        self._raw = open(path, "ab")
+        if self.compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        elif self.compression == "zstd":
+            self._stream = _zstandard().ZstdCompressor().stream_writer(self._raw, closefd=False)
+        elif self.compression is None:
+            self._stream = self._raw
+        else:
+            self._raw.close()
+            raise ValueError(f"Unknown audit log compression: {self.compression}")
+    
+    def write(self, entries: Iterable[Dict[str, Any]], source: Optional[str] = None) -> int:
+        """Append entries (dicts) tagged with their source document"""
+        count = 0
+        for entry in entries:
+            record = {"file": source, **entry} if source is not None else entry
+            self._stream.write(json.dumps(record).encode("utf-8") + b"\n")
+            count += 1
+        self.entries_written += count
+        return count
+    
+    def flush(self) -> None:
+        """Make everything written so far durable"""
+        if self.compression == "gzip":
+            self._stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == "zstd":
+            self._stream.flush(_zstandard().FLUSH_BLOCK)
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+    
+    def close(self) -> None:
+        if self._raw.closed:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+    
+    def __enter__(self) -> "AuditWriter":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def _open_lines(path: str) -> io.TextIOBase:
+    compression = compression_for(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if compression == "zstd":
+        raw = open(path, "rb")
+        reader = _zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def read_audit_log(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the entries of one audit log, tolerating a log cut off mid-write"""
+    with _open_lines(path) as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping truncated line in {path}")
+        except _TRUNCATED_STREAM_ERRORS:
+            # A compressed stream without its trailer: the writer died
+            logger.warning(f"Audit log {path} ends early")
+
+def _is_complete(path: str) -> bool:
+    """Whether a compressed log decompresses to the end"""
+    try:
+        with _open_lines(path) as f:
+            while f.read(1 << 20):
+                pass
+    except _TRUNCATED_STREAM_ERRORS:
+        return False
+    return True
+
+def _drop_torn_line(path: str, chunk_size: int = 64 * 1024) -> None:
+    """Truncate an uncompressed log after its last newline
+    
+    A line cut off by a crash would otherwise be joined with the first
+    line appended after it, losing both.
+    """
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            logger.warning(f"Audit log {path} ends in a truncated line, dropping it")
+            f.truncate(position)
+
+def _repair(path: str) -> None:
+    """Rewrite a compressed log left unterminated by a crash
+    
+    New data appended after a torn member would be unreadable, so the
+    entries that survive are copied into a fresh stream first.
+    """
+    if _is_complete(path):
+        return
+    
+    logger.warning(f"Audit log {path} was not closed cleanly, rewriting it")
+    tmp_path = str(Path(path).with_name(f".repair-{Path(path).name}"))
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with AuditWriter(tmp_path, compression_for(path)) as writer:
+        writer.write(read_audit_log(path))
+    os.replace(tmp_path, path)
+
+def filter_entries(entries: Iterable[Dict[str, Any]], pii_types: Optional[List[str]] = None,
+                   files: Optional[List[str]] = None,
+                   min_confidence: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Keep entries matching every given criterion"""
+    types = set(pii_types) if pii_types else None
+    sources = set(files) if files else None
+    for entry in entries:
+        if types is not None and entry.get("pii_type") not in types:
+            continue
+        if sources is not None and entry.get("file") not in sources:
+            continue
+        if min_confidence is not None and entry.get("confidence", 0) < min_confidence:
+            continue
+        yield entry
+
+def merge_audit_logs(paths: List[str], output: str, **filters) -> int:
+    """Concatenate audit log shards into one log, optionally filtered
+    
+    Returns the number of entries written.
+    """
+    with AuditWriter(output) as writer:
+        for path in paths:
+            writer.write(filter_entries(read_audit_log(path), **filters))
+        return writer.entries_written
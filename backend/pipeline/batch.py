@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from .config import Config
+from .processor import DocumentProcessor
+from .result_cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.tiff')
+
+MANIFEST_NAME = ".docushield-manifest.jsonl"
+
+# Per-process state of a batch worker, built once by the pool initializer
+_processor: Optional[DocumentProcessor] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def iter_input_files(root: Path, recursive: bool = False, exclude: Optional[Path] = None) -> Iterator[Path]:
+    """Yield supported files under root in one scandir pass
+    
+    Extensions are matched case-insensitively on the name itself, so every
+    file is seen once whatever the filesystem's case rules. Directory
+    symlinks are not followed, which keeps link cycles from looping. The
+    `exclude` directory (the output directory, when it sits inside the
+    input tree) is not descended into, so outputs are not redacted again.
+    """
+    if root.is_file():
+        yield root
+        return
+    
+    excluded = None
+    if exclude is not None and exclude.is_dir():
+        stat = exclude.stat()
+        excluded = (stat.st_dev, stat.st_ino)
+    
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Cannot list {directory}: {str(e)}")
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    stat = entry.stat(follow_symlinks=False)
+                    if (stat.st_dev, stat.st_ino) != excluded:
+                        subdirs.append(Path(entry.path))
+            elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield Path(entry.path)
+        # Depth-first, in name order
+        pending.extend(reversed(subdirs))
+
+class BatchManifest:
+    """Checkpoint of a batch run, kept as JSON Lines in the output directory
+    
+    One record is appended (and fsynced) per finished file, so a run that
+    dies loses at most the files in flight. On load the last record for each
+    input wins; a re-run skips inputs recorded as done whose size and mtime
+    (or, if only the mtime moved, content hash) are unchanged.
+    """
+    
+    def __init__(self, output_dir: str):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self.records: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from a crash mid-write
+                        continue
+                    self.records[record["input"]] = record
+        self._file = None
+    
+    @staticmethod
+    def key(file_path: Path) -> str:
+        return str(file_path.resolve())
+    
+    def is_done(self, file_path: Path) -> bool:
+        """Whether file_path was already redacted and has not changed since"""
+        record = self.records.get(self.key(file_path))
+        if record is None or record.get("status") != "done":
+            return False
+        
+        stat = file_path.stat()
+        if stat.st_size != record.get("size"):
+            return False
+        if stat.st_mtime_ns == record.get("mtime_ns"):
+            return True
+        return file_sha256(str(file_path)) == record.get("sha256")
+    
+    def record(self, **fields) -> None:
+        """Append one record and make it durable"""
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self.records[fields["input"]] = fields
+        self._file.write(json.dumps(fields) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def file_record(file_path: Path, **fields) -> Dict[str, Any]:
+    """Manifest record for an input, stamped with its current size and mtime"""
+    stat = file_path.stat()
+    return {
+        "input": BatchManifest.key(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        **fields
+    }
+
+async def redact_file(processor: DocumentProcessor, file_path: Path, output_path: Path) -> Dict[str, Any]:
+    """Redact one file into output_path and return its manifest record
+    
+    The record also carries the audit entries, which are not written to the
+    manifest.
+    """
+    sha256 = None
+    started = time.monotonic()
+    try:
+        # Inside the try: an unreadable input is a failed record, not a failed batch
+        sha256 = await asyncio.to_thread(file_sha256, str(file_path))
+        result = await processor.process_document(str(file_path), file_path.name, sha256)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(result.output_path, str(output_path))
+        processor.scratch.release(result.output_path)
+    except Exception as e:
+        # No stat(): the input may be the thing that failed, e.g. deleted since discovery.
+        # Only done records are matched on size and mtime.
+        return {"input": BatchManifest.key(file_path), "sha256": sha256, "status": "failed", "error": str(e)}
+    
+    return file_record(
+        file_path,
+        sha256=sha256,
+        status="done",
+        output=str(output_path),
+        detections=result.detections_count,
+        seconds=round(time.monotonic() - started, 3),
+        audit_entries=[asdict(entry) for entry in result.audit_entries]
+    )
+
+def init_worker(config_data: Dict[str, Any], policies_path: str, workers: int) -> None:
+    """Process pool initializer: one processor and event loop per batch worker
+    
+    Workers get their own scratch output directories so files with the same
+    name in different input folders cannot meet in scratch, and an equal
+    share of the ramdisk budget. Parallelism is across files, so each
+    worker detects its PDFs in-process.
+    """
+    global _processor, _loop
+    config = Config(config_data, policies_path)
+    tag = f"cli-{os.getpid()}"
+    ramdisk_dir = Path(config.get("io.ramdisk_dir", "/dev/shm/docushield"))
+    if config.get("io.use_ramdisk", True) and ramdisk_dir.parent.is_dir():
+        ramdisk_dir.mkdir(exist_ok=True)
+    config.set("io.output_dir", os.path.join(config.get("io.output_dir", "output"), tag))
+    config.set("io.ramdisk_dir", str(ramdisk_dir / tag))
+    config.set("io.ramdisk_budget_mb", config.get("io.ramdisk_budget_mb", 512) / workers)
+    config.set("processing.pdf_workers", 1)
+    _processor = DocumentProcessor(config)
+    _loop = asyncio.new_event_loop()
+
+def redact_file_in_worker(file_path: str, output_path: str) -> Dict[str, Any]:
+    """Worker entry point for redact_file"""
+    return _loop.run_until_complete(redact_file(_processor, Path(file_path), Path(output_path)))
+
+def remove_worker_dirs(config: Config) -> None:
+    """Remove the per-worker scratch directories left empty after a batch"""
+    for key, default in (("io.output_dir", "output"), ("io.ramdisk_dir", "/dev/shm/docushield")):
+        root = Path(config.get(key, default))
+        if not root.is_dir():
+            continue
+        for directory in root.glob("cli-*"):
+            for sub in (directory / "output", directory / "input", directory):
+                try:
+                    sub.rmdir()
+                except OSError:
+                    pass
@@ -1,13 +1,91 @@
+import hashlib
+import json
+import threading
 import yaml
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, Iterator, Tuple
+
+DEFAULT_POLICIES = {
+    "PERSON": "mask",
+    "PHONE": "replace",
+    "EMAIL": "mask",
+    "AADHAAR": "mask",
+    "PAN": "mask",
+    "IFSC": "mask",
+    "ACCOUNT_NO": "mask",
+    "SIGNATURE": "blur",
+    "FACE": "blur",
+    "STAMP": "mask",
+    "DATE": "mask",
+    "ORG": "mask"
+}
+
+class PolicySet(Mapping):
+    """Immutable snapshot of redaction policies (PII type -> method)"""
+    
+    def __init__(self, methods: Dict[str, str]):
+        self._methods = MappingProxyType(dict(methods))
+        # Version is derived from the effective policies, not the file bytes,
+        # so comment-only edits keep the same version
+        canonical = json.dumps(self._methods.copy(), sort_keys=True).encode()
+        self.version = hashlib.sha256(canonical).hexdigest()[:12]
+    
+    def __getitem__(self, pii_type: str) -> str:
+        return self._methods[pii_type]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._methods)
+    
+    def __len__(self) -> int:
+        return len(self._methods)
+    
+    def __repr__(self) -> str:
+        return f"PolicySet(version={self.version!r}, {dict(self._methods)!r})"
+
+# Loaded policy snapshots keyed by file path: (mtime_ns, size, content sha256, PolicySet)
+_policy_cache: Dict[Path, Tuple[int, int, str, PolicySet]] = {}
+_policy_lock = threading.Lock()
+
+def load_policies(policies_file: Path) -> PolicySet:
+    """Return the policy snapshot for a file, re-parsing only when it changed"""
+    try:
+        stat = policies_file.stat()
+    except FileNotFoundError:
+        stat = None
+    
+    with _policy_lock:
+        cached = _policy_cache.get(policies_file)
+        if stat is None:
+            if cached is None or cached[0] != -1:
+                cached = (-1, -1, "", PolicySet(DEFAULT_POLICIES))
+                _policy_cache[policies_file] = cached
+            return cached[3]
+        
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[3]
+        
+        content = policies_file.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        if cached and cached[2] == digest:
+            # Touched but unchanged: keep the existing snapshot
+            policy_set = cached[3]
+        else:
+            methods = dict(DEFAULT_POLICIES)
+            methods.update(yaml.safe_load(content) or {})
+            policy_set = PolicySet(methods)
+        
+        _policy_cache[policies_file] = (stat.st_mtime_ns, stat.st_size, digest, policy_set)
+        return policy_set
 
 class Config:
-    def __init__(self, config_data: Dict[str, Any]):
+    def __init__(self, config_data: Dict[str, Any], policies_path: str = "configs/policies.yaml"):
         self.data = config_data
+        self.policies_file = Path(__file__).parent.parent / policies_path
     
     @classmethod
-    def load(cls, config_path: str = "configs/default.yaml"):
+    def load(cls, config_path: str = "configs/default.yaml", policies_path: str = "configs/policies.yaml"):
         """Load configuration from YAML file"""
         config_file = Path(__file__).parent.parent / config_path
         
@@ -15,7 +93,25 @@ class Config:
         default_config = {
             "ocr": {
                 "lang": "en",
-                "min_confidence": 0.5
+                "min_confidence": 0.5,
+                "engine": "auto",
+                "min_text_chars": 20,
+                "min_image_area": 0.02,
+                "full_page_coverage": 0.6,
+                "det_limit_side": 960,
+                "det_threshold": 0.3,
+                "det_box_threshold": 0.6,
+                "det_unclip_ratio": 1.5,
+                "det_batch_size": 4,
+                "rec_batch_size": 8,
+                "render_scale": 2.0
+            },
+            "render": {
+                "scale": "auto",
+                "oversample": 2.0,
+                "min_scale": 0.25,
+                "max_scale": 3.0,
+                "max_mpx": 40
             },
             "layout": {
                 "score_threshold": 0.25
@@ -26,15 +122,76 @@ class Config:
             },
             "visual": {
                 "face_threshold": 0.5,
-                "signature_threshold": 0.35
+                "signature_threshold": 0.35,
+                "stamp_threshold": 0.35,
+                "engine": "auto",
+                "models_dir": "../models",
+                "input_size": 640,
+                "batch_size": 4,
+                "sessions": 2,
+                "intra_op_threads": 2,
+                "inter_op_threads": 1,
+                "model_nms_iou": 0.45,
+                "verify_models": True,
+                "warm_up": True
             },
             "redaction": {
                 "padding_px": 4,
-                "mode": "mask"
+                "mode": "mask",
+                "merge_gap_px": 2,
+                "merge_slack": 0.25,
+                "nms_iou": 0.5
+            },
+            "pdf_writer": {
+                "profile": "balanced"
+            },
+            "processing": {
+                "pdf_workers": 1,
+                "shard_min_pages": 4,
+                "pages_per_unit": 1,
+                "render": "worker",
+                "raster_slots": 0,
+                "raster_slot_mb": 32,
+                "page_scheduling": "round_robin",
+                "image_threads": 4,
+                "max_concurrent_jobs": 8
+            },
+            "server": {
+                "host": "0.0.0.0",
+                "port": 8080,
+                "workers": 1,
+                "memory_report_s": 0
+            },
+            "jobs": {
+                "store": "sqlite",
+                "path": "jobs.db",
+                "ttl_hours": 24,
+                "evict_interval_s": 300
+            },
+            "queue": {
+                "max_depth": 100,
+                "retry_after_s": 30
+            },
+            "cache": {
+                "enabled": True,
+                "dir": "cache",
+                "max_mb": 2048
             },
             "io": {
                 "max_pdf_mb": 200,
-                "use_ramdisk": True
+                "max_image_mb": 50,
+                "upload_chunk_kb": 1024,
+                "scratch_dir": "temp",
+                "output_dir": "output",
+                "use_ramdisk": True,
+                "ramdisk_dir": "/dev/shm/docushield",
+                "ramdisk_budget_mb": 512
+            },
+            "tiles": {
+                "min_mpx": 40,
+                "height_px": 1024,
+                "overlap_px": 256,
+                "rows_per_strip": 64
             },
             "logs": {
                 "level": "INFO",
@@ -48,7 +205,7 @@ class Config:
                 # Merge with defaults
                 default_config.update(config_data)
         
-        return cls(default_config)
+        return cls(default_config, policies_path)
     
     def get(self, key: str, default=None):
         """Get configuration value by dot notation"""
@@ -63,29 +220,17 @@ class Config:
         
         return value
     
-    @property
-    def policies(self) -> Dict[str, str]:
-        """Load redaction policies"""
-        policies_file = Path(__file__).parent.parent / "configs" / "policies.yaml"
-        
-        default_policies = {
-            "PERSON": "mask",
-            "PHONE": "replace",
-            "EMAIL": "mask",
-            "AADHAAR": "mask",
-            "PAN": "mask",
-            "IFSC": "mask",
-            "ACCOUNT_NO": "mask",
-            "SIGNATURE": "blur",
-            "FACE": "blur",
-            "STAMP": "mask",
-            "DATE": "mask",
-            "ORG": "mask"
-        }
+    def set(self, key: str, value: Any) -> None:
+        """Set configuration value by dot notation"""
+        keys = key.split('.')
+        section = self.data
         
-        if policies_file.exists():
-            with open(policies_file, 'r') as f:
-                policies = yaml.safe_load(f)
-                default_policies.update(policies)
+        for k in keys[:-1]:
+            section = section.setdefault(k, {})
         
-        return default_policies
\ No newline at end of file
+        section[keys[-1]] = value
+    
+    @property
+    def policies(self) -> PolicySet:
+        """Current redaction policies, hot-reloaded when policies.yaml changes"""
+        return load_policies(self.policies_file)
\ No newline at end of file
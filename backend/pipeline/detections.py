@@ -0,0 +1,149 @@
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from .models import AuditEntry, BoundingBox, PIIDetection, PIIType
+
+# PIIType <-> the small integer code stored per row
+PII_TYPES: List[PIIType] = list(PIIType)
+_TYPE_CODES: Dict[PIIType, int] = {pii_type: code for code, pii_type in enumerate(PII_TYPES)}
+
+DETECTION_DTYPE = np.dtype([
+    ("page", np.int32),
+    ("type", np.uint8),
+    ("confidence", np.float64),
+    ("x", np.int32),
+    ("y", np.int32),
+    ("width", np.int32),
+    ("height", np.int32),
+])
+
+# Rows turned into audit entries per step
+_AUDIT_CHUNK = 4096
+
+class DetectionSet:
+    """Detections of one document as columns rather than objects
+    
+    Geometry, type, page and confidence live in one NumPy structured array
+    (29 bytes a row) and the matched texts in a parallel object array, so
+    filtering and counting are vectorized and a dense form costs a few
+    arrays instead of three dataclass instances per hit. Sets are built once
+    per page from the detectors' lists and concatenated per document.
+    
+    Iterating, or indexing with an int, yields PIIDetection objects built on
+    the fly, so code written against lists of detections keeps working.
+    """
+    
+    __slots__ = ("rows", "texts")
+    
+    def __init__(self, rows: Optional[np.ndarray] = None, texts: Optional[np.ndarray] = None):
+        self.rows = rows if rows is not None else np.empty(0, dtype=DETECTION_DTYPE)
+        self.texts = texts if texts is not None else np.empty(len(self.rows), dtype=object)
+    
+    @classmethod
+    def from_detections(cls, detections: Iterable[PIIDetection]) -> "DetectionSet":
+        detections = list(detections)
+        rows = np.empty(len(detections), dtype=DETECTION_DTYPE)
+        texts = np.empty(len(detections), dtype=object)
+        for i, d in enumerate(detections):
+            bbox = d.bbox
+            rows[i] = (d.page, _TYPE_CODES[d.pii_type], d.confidence, bbox.x, bbox.y, bbox.width, bbox.height)
+            texts[i] = d.text
+        return cls(rows, texts)
+    
+    @classmethod
+    def concat(cls, sets: Sequence["DetectionSet"]) -> "DetectionSet":
+        """One set holding the rows of all sets, in order"""
+        if not sets:
+            return cls()
+        return cls(
+            np.concatenate([s.rows for s in sets]),
+            np.concatenate([s.texts for s in sets])
+        )
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def __iter__(self) -> Iterator[PIIDetection]:
+        for i in range(len(self.rows)):
+            yield self._detection(i)
+    
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Union[PIIDetection, "DetectionSet"]:
+        if isinstance(index, (int, np.integer)):
+            return self._detection(int(index))
+        return DetectionSet(self.rows[index], self.texts[index])
+    
+    def _detection(self, i: int) -> PIIDetection:
+        page, code, confidence, x, y, width, height = self.rows[i].tolist()
+        return PIIDetection(
+            text=self.texts[i],
+            pii_type=PII_TYPES[code],
+            confidence=confidence,
+            bbox=BoundingBox(x=x, y=y, width=width, height=height),
+            page=page
+        )
+    
+    @property
+    def pages(self) -> np.ndarray:
+        return self.rows["page"]
+    
+    @property
+    def confidences(self) -> np.ndarray:
+        return self.rows["confidence"]
+    
+    def type_mask(self, pii_types: Iterable[PIIType]) -> np.ndarray:
+        codes = [_TYPE_CODES[pii_type] for pii_type in pii_types]
+        return np.isin(self.rows["type"], codes)
+    
+    def filter(self, pii_types: Optional[Iterable[PIIType]] = None,
+               pages: Optional[Iterable[int]] = None,
+               min_confidence: Optional[float] = None) -> "DetectionSet":
+        """Rows matching every given criterion"""
+        mask = np.ones(len(self.rows), dtype=bool)
+        if pii_types is not None:
+            mask &= self.type_mask(pii_types)
+        if pages is not None:
+            mask &= np.isin(self.rows["page"], list(pages))
+        if min_confidence is not None:
+            mask &= self.rows["confidence"] >= min_confidence
+        return self[mask]
+    
+    def by_page(self) -> Dict[int, "DetectionSet"]:
+        """Split into per-page sets, keeping row order within each page"""
+        if not len(self.rows):
+            return {}
+        order = np.argsort(self.rows["page"], kind="stable")
+        bounds = np.flatnonzero(np.diff(self.rows["page"][order])) + 1
+        return {
+            int(self.rows["page"][chunk[0]]): self[chunk]
+            for chunk in np.split(order, bounds)
+        }
+    
+    def type_counts(self) -> Dict[str, int]:
+        """Detections per PII type value, for types that occur"""
+        counts = np.bincount(self.rows["type"], minlength=len(PII_TYPES))
+        return {PII_TYPES[code].value: int(count) for code, count in enumerate(counts) if count}
+    
+    def audit_entries(self, policies: Mapping[str, str], timestamp: str) -> List[AuditEntry]:
+        """Audit entries for every row, stamped with one document-level timestamp
+        
+        Rows are converted to Python values a chunk at a time, so the peak is
+        the entries themselves rather than entries plus a copy of every column.
+        """
+        methods = [policies.get(pii_type.value, "mask") for pii_type in PII_TYPES]
+        entries = []
+        for start in range(0, len(self.rows), _AUDIT_CHUNK):
+            chunk = self.rows[start:start + _AUDIT_CHUNK]
+            columns = zip(*(chunk[name].tolist() for name in DETECTION_DTYPE.names))
+            entries.extend(
+                AuditEntry(
+                    pii_type=PII_TYPES[code].value,
+                    method=methods[code],
+                    bbox={"x": x, "y": y, "width": width, "height": height},
+                    page=page,
+                    confidence=confidence,
+                    timestamp=timestamp
+                )
+                for page, code, confidence, x, y, width, height in columns
+            )
+        return entries
@@ -0,0 +1,75 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .config import Config
+from . import page_shards
+
+logger = logging.getLogger(__name__)
+
+class PipelineExecutors:
+    """Executors that keep CPU-bound pipeline stages off the event loop
+    
+    - pdf: one thread. MuPDF is not thread-safe, so every fitz call
+      (open, render, redact, save) is serialized on it.
+    - image: thread pool for PIL work; decode, filters and encode release the GIL.
+    - detect: process pool for page-sharded detection, which is Python-heavy
+      regex work that would otherwise hold the GIL. Only started when
+      processing.pdf_workers > 1.
+    
+    Whole documents are admitted through job slots so at most
+    processing.max_concurrent_jobs are in the pipeline at once.
+    """
+    
+    def __init__(self, config: Config):
+        self.config = config
+        self.pdf_workers = config.get("processing.pdf_workers", 1)
+        self.image_threads = config.get("processing.image_threads", 4)
+        self.max_concurrent_jobs = config.get("processing.max_concurrent_jobs", 8)
+        
+        self.pdf = ThreadPoolExecutor(max_workers=1, thread_name_prefix="docushield-pdf")
+        self.image = ThreadPoolExecutor(
+            max_workers=self.image_threads, thread_name_prefix="docushield-image"
+        )
+        self._detect: Optional[ProcessPoolExecutor] = None
+        self._job_slots: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def has_processes(self) -> bool:
+        return self.pdf_workers > 1
+    
+    @property
+    def detect(self) -> ProcessPoolExecutor:
+        """Process pool for page-sharded detection, started on first use"""
+        if self._detect is None:
+            # spawn: forking a process that holds open fitz documents is unsafe
+            self._detect = ProcessPoolExecutor(
+                max_workers=self.pdf_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=page_shards.init_worker,
+                initargs=(self.config.data,)
+            )
+        return self._detect
+    
+    @property
+    def job_slots(self) -> asyncio.Semaphore:
+        """Semaphore bounding how many documents are processed concurrently"""
+        if self._job_slots is None:
+            self._job_slots = asyncio.Semaphore(self.max_concurrent_jobs)
+        return self._job_slots
+    
+    async def run(self, executor: Executor, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on an executor and await the result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    
+    def shutdown(self) -> None:
+        """Stop all executors, cancelling queued work"""
+        self.pdf.shutdown(wait=True, cancel_futures=True)
+        self.image.shutdown(wait=True, cancel_futures=True)
+        if self._detect is not None:
+            self._detect.shutdown(cancel_futures=True)
+            self._detect = None
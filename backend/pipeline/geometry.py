@@ -0,0 +1,163 @@
+import logging
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+from .detections import PII_TYPES, DetectionSet
+from .models import PIIType
+
+logger = logging.getLogger(__name__)
+
+# Detector output that can report the same object more than once
+VISUAL_TYPES = (PIIType.FACE, PIIType.SIGNATURE, PIIType.STAMP)
+
+# (method, (x1, y1, x2, y2)) in page coordinates
+Region = Tuple[str, Tuple[int, int, int, int]]
+
+# Merging compares boxes pairwise; bigger groups are merged in blocks of
+# this many (by vertical position) to bound the N x N temporaries
+MAX_MERGE_GROUP = 2048
+
+# Exact covered area costs O(boxes * cells); beyond this the plain sum is used
+MAX_EXACT_AREA_GROUP = 64
+
+def corner_boxes(detections: DetectionSet, padding: int = 0) -> np.ndarray:
+    """(N, 4) int64 array of x1, y1, x2, y2 with padding applied"""
+    rows = detections.rows
+    boxes = np.empty((len(rows), 4), dtype=np.int64)
+    boxes[:, 0] = rows["x"] - padding
+    boxes[:, 1] = rows["y"] - padding
+    boxes[:, 2] = rows["x"] + rows["width"] + padding
+    boxes[:, 3] = rows["y"] + rows["height"] + padding
+    return boxes
+
+def _areas(boxes: np.ndarray) -> np.ndarray:
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+def pairwise_iou(boxes: np.ndarray) -> np.ndarray:
+    """(N, N) intersection over union"""
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areas = _areas(boxes)
+    union = areas[:, None] + areas[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros(intersection.shape), where=union > 0)
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Indices of boxes kept by greedy non-max suppression, best score first"""
+    order = np.argsort(-scores, kind="stable")
+    iou = pairwise_iou(boxes)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return np.array(keep, dtype=np.int64)
+
+def suppress_duplicates(detections: DetectionSet, iou_threshold: float,
+                        pii_types: Iterable[PIIType] = VISUAL_TYPES) -> DetectionSet:
+    """Run NMS per page and type over the given (visual) types; others pass through"""
+    if not len(detections) or iou_threshold >= 1:
+        return detections
+    
+    candidates = detections.type_mask(pii_types)
+    keep = ~candidates
+    boxes = corner_boxes(detections)
+    groups = detections.rows["page"].astype(np.int64) * len(PII_TYPES) + detections.rows["type"]
+    for group in np.unique(groups[candidates]):
+        members = np.flatnonzero(candidates & (groups == group))
+        kept = nms(boxes[members], detections.confidences[members], iou_threshold)
+        keep[members[kept]] = True
+    
+    if not keep.all():
+        logger.debug(f"NMS dropped {int((~keep).sum())} duplicate visual detections")
+    return detections[keep]
+
+def _components(adjacent: np.ndarray) -> np.ndarray:
+    """Connected-component label (smallest member index) for each node"""
+    labels = np.arange(len(adjacent))
+    while True:
+        neighbour_min = np.where(adjacent, labels[None, :], len(adjacent)).min(axis=1)
+        updated = np.minimum(labels, neighbour_min)
+        # Pointer jumping: follow labels to their own labels
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def merge_boxes(boxes: np.ndarray, gap: int = 0, slack: float = 0.25) -> np.ndarray:
+    """Union boxes that overlap or lie within `gap` of each other
+    
+    A group is only replaced by its bounding box when that box covers at
+    most `slack` more area than the boxes themselves (counted without
+    overlap), so two hits on neighbouring lines of a paragraph are not
+    merged into one rectangle over the unrelated text between them. Groups
+    that fail the check keep their original boxes.
+    """
+    if len(boxes) < 2:
+        return boxes
+    if len(boxes) > MAX_MERGE_GROUP:
+        order = np.argsort(boxes[:, 1], kind="stable")
+        return np.concatenate([
+            merge_boxes(boxes[order[start:start + MAX_MERGE_GROUP]], gap, slack)
+            for start in range(0, len(boxes), MAX_MERGE_GROUP)
+        ])
+    
+    adjacent = (
+        (boxes[:, None, 0] <= boxes[None, :, 2] + gap) & (boxes[None, :, 0] <= boxes[:, None, 2] + gap) &
+        (boxes[:, None, 1] <= boxes[None, :, 3] + gap) & (boxes[None, :, 1] <= boxes[:, None, 3] + gap)
+    )
+    labels = _components(adjacent)
+    
+    merged = []
+    for label in np.unique(labels):
+        members = boxes[labels == label]
+        if len(members) == 1:
+            merged.append(members[0])
+            continue
+        union = np.array([members[:, 0].min(), members[:, 1].min(), members[:, 2].max(), members[:, 3].max()])
+        if len(members) <= MAX_EXACT_AREA_GROUP:
+            covered = _covered_area(members)
+        else:
+            covered = int(_areas(members).sum())
+        if _areas(union[None, :])[0] <= covered * (1 + slack):
+            merged.append(union)
+        else:
+            merged.extend(members)
+    return np.array(merged, dtype=boxes.dtype)
+
+def _covered_area(boxes: np.ndarray) -> int:
+    """Area of the union of boxes, on the grid of their own edges"""
+    xs = np.unique(boxes[:, [0, 2]])
+    ys = np.unique(boxes[:, [1, 3]])
+    # Cell (i, j) spans xs[i]..xs[i+1] by ys[j]..ys[j+1]; covered if inside any box
+    cx = (xs[:-1] + xs[1:]) / 2
+    cy = (ys[:-1] + ys[1:]) / 2
+    inside_x = (boxes[:, 0, None] <= cx[None, :]) & (cx[None, :] <= boxes[:, 2, None])
+    inside_y = (boxes[:, 1, None] <= cy[None, :]) & (cy[None, :] <= boxes[:, 3, None])
+    covered = (inside_x[:, :, None] & inside_y[:, None, :]).any(axis=0)
+    return int((np.diff(xs)[:, None] * np.diff(ys)[None, :] * covered).sum())
+
+def redaction_regions(detections: DetectionSet, policies: Mapping[str, str], padding: int = 0,
+                      gap: int = 0, slack: float = 0.25) -> Dict[int, List[Region]]:
+    """Padded, merged redaction rectangles per page, grouped by policy method"""
+    if not len(detections):
+        return {}
+    
+    methods = np.array([policies.get(pii_type.value, "mask") for pii_type in PII_TYPES])
+    row_methods = methods[detections.rows["type"]]
+    boxes = corner_boxes(detections, padding)
+    pages = detections.rows["page"]
+    
+    regions: Dict[int, List[Region]] = {}
+    for page in np.unique(pages):
+        on_page = pages == page
+        page_regions = regions.setdefault(int(page), [])
+        for method in np.unique(row_methods[on_page]):
+            group = boxes[on_page & (row_methods == method)]
+            page_regions.extend((str(method), tuple(int(v) for v in box)) for box in merge_boxes(group, gap, slack))
+    return regions
@@ -0,0 +1,284 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import Config
+from .models import JobStatus, ProcessResult
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = (JobStatus.COMPLETED.value, JobStatus.FAILED.value)
+UNFINISHED_STATUSES = (JobStatus.QUEUED.value, JobStatus.PROCESSING.value)
+
+# Recorded on jobs a previous server process accepted but never finished
+INTERRUPTED_ERROR = "Interrupted by a server restart; please upload the document again"
+# Recorded on jobs of a pre-fork worker that exited while the server kept running
+WORKER_EXITED_ERROR = "Interrupted by a server worker exiting; please upload the document again"
+
+class JobStore(ABC):
+    """Job status and results, split so status polling stays cheap
+    
+    get() returns only the small status record; the audit entries of a
+    completed job are loaded by get_result() when they are actually asked for.
+    """
+    
+    @abstractmethod
+    def create(self, job_id: str, filename: str, **fields) -> Dict[str, Any]:
+        """Register a new queued job"""
+    
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        """Update status fields of a job"""
+    
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status record of a job, without its audit entries"""
+    
+    @abstractmethod
+    def complete(self, job_id: str, result: ProcessResult, **fields) -> None:
+        """Mark a job completed and store its result"""
+    
+    @abstractmethod
+    def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Full result of a completed job, including audit entries"""
+    
+    @abstractmethod
+    def evict_expired(self, ttl_seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Delete finished jobs older than the TTL and return their status records"""
+    
+    @abstractmethod
+    def fail_unfinished(self, error: str = INTERRUPTED_ERROR,
+                        worker_pid: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Mark queued and processing jobs failed (their process is gone) and return them
+        
+        With worker_pid, only the jobs created with that worker_pid field are failed.
+        """
+    
+    def close(self) -> None:
+        pass
+
+class MemoryJobStore(JobStore):
+    """Process-local job store; contents are lost on restart"""
+    
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def create(self, job_id: str, filename: str, **fields) -> Dict[str, Any]:
+        now = time.time()
+        job = {
+            "id": job_id,
+            "filename": filename,
+            "status": JobStatus.QUEUED.value,
+            "created_at": now,
+            "updated_at": now,
+            **fields
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        return dict(job)
+    
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+    
+    def complete(self, job_id: str, result: ProcessResult, **fields) -> None:
+        with self._lock:
+            self._results[job_id] = asdict(result)
+        self.update(job_id, status=JobStatus.COMPLETED.value, **_result_fields(result), **fields)
+    
+    def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._results.get(job_id)
+    
+    def evict_expired(self, ttl_seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        cutoff = (now or time.time()) - ttl_seconds
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job["status"] in TERMINAL_STATUSES and job["updated_at"] < cutoff
+            ]
+            for job in expired:
+                del self._jobs[job["id"]]
+                self._results.pop(job["id"], None)
+        return expired
+    
+    def fail_unfinished(self, error: str = INTERRUPTED_ERROR,
+                        worker_pid: Optional[int] = None) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            unfinished = [
+                job for job in self._jobs.values()
+                if job["status"] in UNFINISHED_STATUSES and worker_pid in (None, job.get("worker_pid"))
+            ]
+            for job in unfinished:
+                job.update(status=JobStatus.FAILED.value, error=error, updated_at=now)
+            return [dict(job) for job in unfinished]
+
+class SQLiteJobStore(JobStore):
+    """Job store persisted in SQLite, indexed on status and creation time"""
+    
+    # Columns returned to status polls; the audit log lives in its own table
+    STATUS_COLUMNS = [
+        "id", "filename", "status", "created_at", "updated_at", "error", "download_url",
+        "audit_url", "total_pages", "detections_count", "policy_version", "output_path"
+    ]
+    
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the event loop and worker threads, serialized by a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    error TEXT,
+                    download_url TEXT,
+                    audit_url TEXT,
+                    total_pages INTEGER,
+                    detections_count INTEGER,
+                    policy_version TEXT,
+                    output_path TEXT,
+                    extra TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+                CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+                CREATE TABLE IF NOT EXISTS job_results (
+                    job_id TEXT PRIMARY KEY REFERENCES jobs (id) ON DELETE CASCADE,
+                    result TEXT NOT NULL
+                );
+            """)
+    
+    def _split_fields(self, fields: Dict[str, Any]):
+        """Separate known columns from free-form fields kept as JSON in `extra`"""
+        columns = {k: v for k, v in fields.items() if k in self.STATUS_COLUMNS}
+        extra = {k: v for k, v in fields.items() if k not in self.STATUS_COLUMNS}
+        return columns, extra
+    
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = {k: row[k] for k in self.STATUS_COLUMNS if row[k] is not None}
+        if row["extra"]:
+            job.update(json.loads(row["extra"]))
+        return job
+    
+    def create(self, job_id: str, filename: str, **fields) -> Dict[str, Any]:
+        now = time.time()
+        columns, extra = self._split_fields(fields)
+        columns.update(id=job_id, filename=filename, status=JobStatus.QUEUED.value,
+                       created_at=now, updated_at=now, extra=json.dumps(extra) if extra else None)
+        names = ", ".join(columns)
+        placeholders = ", ".join("?" for _ in columns)
+        with self._lock:
+            self._conn.execute(f"INSERT INTO jobs ({names}) VALUES ({placeholders})", list(columns.values()))
+        return self.get(job_id)
+    
+    def update(self, job_id: str, **fields) -> None:
+        columns, extra = self._split_fields(fields)
+        columns["updated_at"] = time.time()
+        with self._lock:
+            if extra:
+                row = self._conn.execute("SELECT extra FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                merged = json.loads(row[0]) if row and row[0] else {}
+                merged.update(extra)
+                columns["extra"] = json.dumps(merged)
+            assignments = ", ".join(f"{name} = ?" for name in columns)
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?", [*columns.values(), job_id]
+            )
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+    
+    def complete(self, job_id: str, result: ProcessResult, **fields) -> None:
+        payload = json.dumps(asdict(result))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, result) VALUES (?, ?)", (job_id, payload)
+            )
+        self.update(job_id, status=JobStatus.COMPLETED.value, **_result_fields(result), **fields)
+    
+    def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM job_results WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+    
+    def evict_expired(self, ttl_seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        cutoff = (now or time.time()) - ttl_seconds
+        expired_where = "status IN (?, ?) AND updated_at < ?"
+        params = (*TERMINAL_STATUSES, cutoff)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM jobs WHERE {expired_where}", params).fetchall()
+            if rows:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    f"DELETE FROM job_results WHERE job_id IN (SELECT id FROM jobs WHERE {expired_where})",
+                    params
+                )
+                self._conn.execute(f"DELETE FROM jobs WHERE {expired_where}", params)
+                self._conn.execute("COMMIT")
+        return [self._row_to_job(row) for row in rows]
+    
+    def fail_unfinished(self, error: str = INTERRUPTED_ERROR,
+                        worker_pid: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            # Other workers write concurrently; take the write lock before reading
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute("SELECT * FROM jobs WHERE status IN (?, ?)", UNFINISHED_STATUSES).fetchall()
+            jobs = [self._row_to_job(row) for row in rows]
+            if worker_pid is not None:
+                # Few jobs are ever unfinished, so the pid is matched here rather than indexed
+                jobs = [job for job in jobs if job.get("worker_pid") == worker_pid]
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                [(JobStatus.FAILED.value, error, now, job["id"]) for job in jobs]
+            )
+            self._conn.execute("COMMIT")
+        return [{**job, "status": JobStatus.FAILED.value, "error": error} for job in jobs]
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def _result_fields(result: ProcessResult) -> Dict[str, Any]:
+    """Small result fields copied onto the status record"""
+    return {
+        "total_pages": result.total_pages,
+        "detections_count": result.detections_count,
+        "policy_version": result.policy_version,
+        "output_path": result.output_path
+    }
+
+def create_job_store(config: Config) -> JobStore:
+    """Build the job store selected by jobs.store"""
+    backend = config.get("jobs.store", "sqlite")
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(config.get("jobs.path", "jobs.db"))
+    raise ValueError(f"Unknown job store: {backend}")
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+# Sidecar next to the manifest holding digests already verified
+DIGEST_CACHE_NAME = ".sha256-cache.json"
+
+class DigestCache:
+    """SHA-256 digests of files, remembered in a JSON sidecar by size and mtime
+    
+    A file whose size and mtime match its cached entry is not read again,
+    so restarts and repeated verification skip rehashing unchanged models.
+    If the sidecar cannot be written (read-only models directory) the
+    digests are only kept for the life of the process.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.hashed = 0
+        try:
+            self.entries: Dict[str, Dict[str, Any]] = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+    
+    def digest(self, file_path: Path, data: Optional[mmap.mmap] = None) -> str:
+        """Digest of file_path, hashing `data` (its contents, if already mapped) only on a cache miss"""
+        stat = os.stat(file_path)
+        name = os.path.relpath(file_path, self.path.parent)
+        cached = self.entries.get(name)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        
+        if data is None:
+            with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest = hashlib.sha256(mapped).hexdigest()
+        else:
+            digest = hashlib.sha256(data).hexdigest()
+        self.hashed += 1
+        
+        self.entries[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        self._save()
+        return digest
+    
+    def _save(self) -> None:
+        tmp_path = self.path.with_name(f".tmp-{os.getpid()}-{self.path.name}")
+        try:
+            tmp_path.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write digest cache {self.path}: {e}")
+
+class ModelRegistry:
+    """The models of a manifest, loaded on first use and shared by the process
+    
+    Model files are memory-mapped read-only, so their bytes live in the
+    page cache (shared with every other process using them) rather than on
+    the Python heap, and are verified against the manifest's SHA-256 the
+    first time they are mapped. Whatever a caller builds from a model
+    (inference sessions, say) is cached under a key by get_or_load, so
+    every DocumentProcessor in the process reuses one copy.
+    """
+    
+    _shared: Dict[Path, "ModelRegistry"] = {}
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, models_dir: Path, verify: bool = True):
+        self.models_dir = Path(models_dir)
+        self.verify = verify
+        manifest_path = self.models_dir / MANIFEST_NAME
+        self.manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {"models": {}}
+        self.digests = DigestCache(self.models_dir / DIGEST_CACHE_NAME)
+        self._maps: Dict[Tuple[str, str], mmap.mmap] = {}
+        self._loaded: Dict[Hashable, Any] = {}
+        # Loads are rare and one-off, so a single lock serializes them
+        self._lock = threading.RLock()
+    
+    @classmethod
+    def shared(cls, models_dir: Path, verify: bool = True) -> "ModelRegistry":
+        """The process-wide registry for a models directory"""
+        key = Path(models_dir).resolve()
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(key, verify)
+            return cls._shared[key]
+    
+    def entries(self, category: str) -> Dict[str, Dict[str, Any]]:
+        return self.manifest["models"].get(category, {})
+    
+    def path(self, category: str, name: str) -> Optional[Path]:
+        entry = self.entries(category).get(name)
+        return self.models_dir / entry["path"] if entry else None
+    
+    def available(self, category: str, name: str) -> bool:
+        path = self.path(category, name)
+        return path is not None and path.is_file()
+    
+    def weights(self, category: str, name: str) -> mmap.mmap:
+        """Read-only map of a model file, checked against the manifest when first mapped"""
+        key = (category, name)
+        with self._lock:
+            mapped = self._maps.get(key)
+            if mapped is None:
+                path = self.path(category, name)
+                if path is None or not path.is_file():
+                    raise FileNotFoundError(f"Model {category}/{name} not found in {self.models_dir}")
+                with open(path, "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if self.verify:
+                    self._check(category, name, path, mapped)
+                self._maps[key] = mapped
+            return mapped
+    
+    def verified_path(self, category: str, name: str) -> Path:
+        """Path of a model file, after weights() has checked it against the manifest"""
+        self.weights(category, name)
+        return self.path(category, name)
+    
+    def digest(self, category: str, name: str) -> str:
+        """SHA-256 of a model file, mapping (and verifying) it if not mapped yet"""
+        mapped = self.weights(category, name)
+        with self._lock:
+            return self.digests.digest(self.path(category, name), mapped)
+    
+    def _check(self, category: str, name: str, path: Path, mapped: mmap.mmap) -> None:
+        expected = self.entries(category)[name].get("sha256", "")
+        if not expected or expected.startswith("placeholder"):
+            logger.warning(f"Model {category}/{name} has no checksum in the manifest; not verified")
+            return
+        actual = self.digests.digest(path, mapped)
+        if actual != expected:
+            mapped.close()
+            raise ValueError(f"Checksum mismatch for model {category}/{name}: expected {expected}, got {actual}")
+    
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """The object cached under key, built by loader() the first time it is asked for"""
+        with self._lock:
+            if key not in self._loaded:
+                self._loaded[key] = loader()
+            return self._loaded[key]
+    
+    def close(self) -> None:
+        """Drop loaded objects and unmap model files"""
+        with self._lock:
+            self._loaded.clear()
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
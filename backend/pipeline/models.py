@@ -22,14 +22,14 @@ class RedactionMethod(Enum):
     REPLACE = "replace"
     REMOVE = "remove"
 
-@dataclass
+@dataclass(slots=True)
 class BoundingBox:
     x: int
     y: int
     width: int
     height: int
 
-@dataclass
+@dataclass(slots=True)
 class PIIDetection:
     text: str
     pii_type: PIIType
@@ -37,7 +37,7 @@ class PIIDetection:
     bbox: BoundingBox
     page: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class AuditEntry:
     pii_type: str
     method: str
@@ -55,6 +55,7 @@ class ProcessResult:
     audit_entries: List[AuditEntry]
     output_path: str
     summary: Dict[str, Any]
+    policy_version: str = ""
 
 class JobStatus(Enum):
     QUEUED = "queued"
@@ -0,0 +1,423 @@
+import logging
+import math
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .config import Config
+from .model_registry import ModelRegistry
+from .onnx_engine import SessionPool, run_batch, runtime_available
+from .render_plan import RenderPlan
+from .text_layer import Rect, TextLayer
+
+logger = logging.getLogger(__name__)
+
+# PaddleOCR models in models/manifest.json; the recognizer's entry also names its character dictionary
+OCR_CATEGORY = "paddleocr"
+DET_MODEL = "det_model"
+REC_MODEL = "rec_model"
+
+# Normalization the detector was trained with, per channel in BGR order
+_DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32) * 255
+_DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32) * 255
+
+class OcrLine(NamedTuple):
+    """One recognized line: its box in the pixels of the image it was read from"""
+    box: Tuple[int, int, int, int]
+    text: str
+    score: float
+
+def ocr_regions(page, text_layer: TextLayer, min_text_chars: int = 20, min_image_area: float = 0.02,
+                full_page_coverage: float = 0.6) -> List[Rect]:
+    """Parts of a PDF page (in points) whose text can only be read by OCR
+    
+    Only images can hold text the page's text layer does not have, so a
+    born-digital page without images gets no regions at all. An image is
+    skipped when it is small (logos, icons) or when native words already
+    cover it (a searchable scan), and when the remaining images cover most
+    of the page the whole page is read at once.
+    """
+    page_rect = page.rect
+    page_area = page_rect.width * page_rect.height
+    if page_area <= 0:
+        return []
+    
+    regions: List[Rect] = []
+    for info in page.get_image_info():
+        x0, y0, x1, y1 = info["bbox"]
+        x0, y0 = max(x0, page_rect.x0), max(y0, page_rect.y0)
+        x1, y1 = min(x1, page_rect.x1), min(y1, page_rect.y1)
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) < min_image_area * page_area:
+            continue
+        if _chars_inside(text_layer, (x0, y0, x1, y1)) >= min_text_chars:
+            continue
+        regions.append((x0, y0, x1, y1))
+    
+    # Overlapping images are counted twice, which only errs towards a full-page read
+    covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+    if regions and covered >= full_page_coverage * page_area:
+        return [(page_rect.x0, page_rect.y0, page_rect.x1, page_rect.y1)]
+    return regions
+
+def _chars_inside(text_layer: TextLayer, rect: Rect) -> int:
+    """Characters of the words whose centre lies in rect"""
+    x0, y0, x1, y1 = rect
+    chars = 0
+    for i, (wx0, wy0, wx1, wy1) in enumerate(text_layer.rects):
+        cx, cy = (wx0 + wx1) / 2, (wy0 + wy1) / 2
+        if x0 <= cx <= x1 and y0 <= cy <= y1:
+            chars += text_layer.ends[i] - text_layer.starts[i]
+    return chars
+
+def _rgb(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        image = image[:, :, None]
+    if image.shape[2] == 1:
+        return np.repeat(image, 3, axis=2)
+    return image[:, :, :3]
+
+def _components(mask: np.ndarray, prob: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Bounding boxes (x0, y0, x1, y1, exclusive) and mean probability of 8-connected mask regions
+    
+    Regions are built from horizontal runs of set pixels, joining runs
+    that touch in consecutive rows with a union-find.
+    """
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, stops = np.nonzero(edges == -1)
+    if not len(rows):
+        return np.empty((0, 4), dtype=np.int64), np.empty(0)
+    
+    parent = list(range(len(rows)))
+    
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    row_first = np.searchsorted(rows, np.arange(height + 1)).tolist()
+    starts_list, stops_list = starts.tolist(), stops.tolist()
+    for row in range(1, height):
+        i, i_end = row_first[row - 1], row_first[row]
+        j, j_end = row_first[row], row_first[row + 1]
+        while i < i_end and j < j_end:
+            # Runs touch, diagonally included, when their column ranges meet
+            if starts_list[j] <= stops_list[i] and starts_list[i] <= stops_list[j]:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+            if stops_list[i] < stops_list[j]:
+                i += 1
+            else:
+                j += 1
+    
+    _, labels = np.unique([find(i) for i in range(len(rows))], return_inverse=True)
+    count = labels.max() + 1
+    boxes = np.empty((count, 4), dtype=np.int64)
+    boxes[:, [0, 1]] = np.iinfo(np.int64).max
+    boxes[:, [2, 3]] = 0
+    np.minimum.at(boxes[:, 0], labels, starts)
+    np.minimum.at(boxes[:, 1], labels, rows)
+    np.maximum.at(boxes[:, 2], labels, stops)
+    np.maximum.at(boxes[:, 3], labels, rows + 1)
+    
+    # Probability summed over each run from per-row cumulative sums
+    cumulative = np.zeros((height, width + 1), dtype=np.float64)
+    np.cumsum(prob, axis=1, out=cumulative[:, 1:])
+    sums = np.zeros(count)
+    pixels = np.zeros(count)
+    np.add.at(sums, labels, cumulative[rows, stops] - cumulative[rows, starts])
+    np.add.at(pixels, labels, stops - starts)
+    return boxes, sums / pixels
+
+def text_boxes(prob: np.ndarray, threshold: float = 0.3, box_threshold: float = 0.6,
+               unclip_ratio: float = 1.5, min_size: int = 3) -> np.ndarray:
+    """(N, 4) float x1, y1, x2, y2 of text lines in a DB detector's probability map
+    
+    The detector is trained on text regions shrunk towards their centre,
+    so each box is grown back by area * unclip_ratio / perimeter.
+    """
+    boxes, scores = _components(prob > threshold, prob)
+    widths = boxes[:, 2] - boxes[:, 0]
+    heights = boxes[:, 3] - boxes[:, 1]
+    keep = (np.minimum(widths, heights) >= min_size) & (scores >= box_threshold)
+    boxes, widths, heights = boxes[keep].astype(np.float64), widths[keep], heights[keep]
+    
+    distance = widths * heights * unclip_ratio / (2 * (widths + heights))
+    boxes[:, :2] -= distance[:, None]
+    boxes[:, 2:] += distance[:, None]
+    return boxes
+
+def ctc_decode(probs: np.ndarray, charset: Sequence[str]) -> Tuple[str, float]:
+    """Greedy CTC decoding of (T, C) class probabilities: text and mean character confidence
+    
+    Class 0 is the blank; repeats of a class are collapsed unless a blank
+    separates them.
+    """
+    best = probs.argmax(axis=1)
+    confidence = probs.max(axis=1)
+    keep = best != 0
+    keep[1:] &= best[1:] != best[:-1]
+    keep &= best < len(charset)
+    if not keep.any():
+        return "", 0.0
+    return "".join(charset[i] for i in best[keep].tolist()), float(confidence[keep].mean())
+
+def load_charset(path: Path) -> List[str]:
+    """Recognizer classes from a PaddleOCR dictionary: blank, one character per line, then space"""
+    with open(path, encoding="utf-8") as f:
+        return ["<blank>"] + [line.rstrip("\r\n") for line in f] + [" "]
+
+def line_words(lines: Sequence[OcrLine], origin: Tuple[int, int], plan: RenderPlan, block_no: int = 0) -> List[tuple]:
+    """PyMuPDF-style word tuples for OCR lines, mapped from crop pixels to page coordinates
+    
+    `origin` is the crop's top-left pixel in the render described by plan.
+    Recognition gives a line's text but not where its words sit, so words
+    are spaced along the line box in proportion to their characters.
+    """
+    words = []
+    for line_no, line in enumerate(lines):
+        x0, y0, x1, y1 = line.box
+        step = (x1 - x0) / max(1, len(line.text))
+        for word_no, match in enumerate(re.finditer(r"\S+", line.text)):
+            words.append(plan.to_points(
+                origin[0] + x0 + match.start() * step, origin[1] + y0,
+                origin[0] + x0 + match.end() * step, origin[1] + y1
+            ) + (match.group(), block_no, line_no, word_no))
+    return words
+
+class PaddleOCR:
+    """PaddleOCR text detection (DB) and recognition (CTC) on ONNX Runtime sessions
+    
+    Detection runs up to det_batch_size images at a time, padded to one
+    size, and recognition runs up to rec_batch_size line crops at a time,
+    sorted by aspect ratio so a batch wastes little padding. The direction
+    classifier is not used: pages are expected upright.
+    """
+    
+    def __init__(self, det_pool: SessionPool, rec_pool: SessionPool, charset: List[str],
+                 det_limit_side: int = 960, det_batch_size: int = 4, rec_batch_size: int = 8,
+                 rec_height: int = 48, rec_max_width: int = 960, det_threshold: float = 0.3,
+                 box_threshold: float = 0.6, unclip_ratio: float = 1.5, min_confidence: float = 0.5):
+        self.det_pool = det_pool
+        self.rec_pool = rec_pool
+        self.charset = charset
+        self.det_limit_side = det_limit_side
+        self.det_batch_size = max(1, det_batch_size)
+        self.rec_batch_size = max(1, rec_batch_size)
+        self.rec_height = rec_height
+        self.rec_max_width = rec_max_width
+        self.det_threshold = det_threshold
+        self.box_threshold = box_threshold
+        self.unclip_ratio = unclip_ratio
+        self.min_confidence = min_confidence
+    
+    def recognize(self, images: Sequence[np.ndarray]) -> List[List[OcrLine]]:
+        """Text lines of each (H, W, C) image, top to bottom"""
+        crops, owners = [], []
+        for index, (image, boxes) in enumerate(zip(images, self.detect_lines(images))):
+            for box in boxes:
+                x0, y0, x1, y1 = box
+                crops.append(image[y0:y1, x0:x1])
+                owners.append((index, box))
+        
+        results: List[List[OcrLine]] = [[] for _ in images]
+        for (index, box), (text, score) in zip(owners, self.read_lines(crops)):
+            if text.strip() and score >= self.min_confidence:
+                results[index].append(OcrLine(box, text, score))
+        for lines in results:
+            lines.sort(key=lambda line: (line.box[1], line.box[0]))
+        return results
+    
+    def detect_lines(self, images: Sequence[np.ndarray]) -> List[List[Tuple[int, int, int, int]]]:
+        """Integer x0, y0, x1, y1 line boxes in each image's pixels"""
+        results = []
+        for start in range(0, len(images), self.det_batch_size):
+            batch = images[start:start + self.det_batch_size]
+            resized = [self._det_resize(image) for image in batch]
+            # Padding goes right and below, so box coordinates need no shift
+            tensor = np.zeros(
+                (len(batch), 3, max(r.shape[0] for r in resized), max(r.shape[1] for r in resized)),
+                dtype=np.float32
+            )
+            for i, image in enumerate(resized):
+                normalized = (image[:, :, ::-1].astype(np.float32) - _DET_MEAN) / _DET_STD
+                tensor[i, :, :image.shape[0], :image.shape[1]] = normalized.transpose(2, 0, 1)
+            prob = run_batch(self.det_pool, tensor)[0]
+            
+            for i, (image, fitted) in enumerate(zip(batch, resized)):
+                height, width = fitted.shape[:2]
+                boxes = text_boxes(prob[i, 0, :height, :width], self.det_threshold,
+                                   self.box_threshold, self.unclip_ratio)
+                boxes[:, [0, 2]] *= image.shape[1] / width
+                boxes[:, [1, 3]] *= image.shape[0] / height
+                lines = []
+                for x0, y0, x1, y1 in boxes.tolist():
+                    x0, y0 = max(0, math.floor(x0)), max(0, math.floor(y0))
+                    x1, y1 = min(image.shape[1], math.ceil(x1)), min(image.shape[0], math.ceil(y1))
+                    if x1 > x0 and y1 > y0:
+                        lines.append((x0, y0, x1, y1))
+                results.append(lines)
+        return results
+    
+    def _det_resize(self, image: np.ndarray) -> np.ndarray:
+        """RGB copy of image with the longer side at most det_limit_side and both sides multiples of 32"""
+        height, width = image.shape[:2]
+        ratio = min(1.0, self.det_limit_side / max(height, width))
+        new_height = max(32, round(height * ratio / 32) * 32)
+        new_width = max(32, round(width * ratio / 32) * 32)
+        resized = Image.fromarray(_rgb(image)).resize((new_width, new_height), Image.Resampling.BILINEAR)
+        return np.asarray(resized)
+    
+    def read_lines(self, crops: Sequence[np.ndarray]) -> List[Tuple[str, float]]:
+        """Text and confidence of each line crop"""
+        results: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+        widths = [
+            min(self.rec_max_width, max(1, math.ceil(self.rec_height * crop.shape[1] / crop.shape[0])))
+            for crop in crops
+        ]
+        order = np.argsort(widths, kind="stable").tolist()
+        for start in range(0, len(order), self.rec_batch_size):
+            indices = order[start:start + self.rec_batch_size]
+            tensor = np.zeros((len(indices), 3, self.rec_height, max(widths[i] for i in indices)), dtype=np.float32)
+            for k, i in enumerate(indices):
+                resized = Image.fromarray(_rgb(crops[i])).resize((widths[i], self.rec_height), Image.Resampling.BILINEAR)
+                normalized = np.asarray(resized)[:, :, ::-1].astype(np.float32) / 127.5 - 1.0
+                tensor[k, :, :, :widths[i]] = normalized.transpose(2, 0, 1)
+            probs = run_batch(self.rec_pool, tensor)[0]
+            for k, i in enumerate(indices):
+                results[i] = ctc_decode(probs[k], self.charset)
+        return results
+
+class PageOCR:
+    """Routes pages to OCR by their text layer and reads the routed regions
+    
+    Born-digital pages skip OCR entirely; scans, and image regions of mixed
+    pages, are read with PaddleOCR and turned into a TextLayer in page
+    coordinates, so text PII detection runs on them like on native text.
+    The models share the visual models' directory and session settings.
+    """
+    
+    def __init__(self, config: Config):
+        self.config = config
+        self.engine_name = config.get("ocr.engine", "auto")
+        self.min_text_chars = config.get("ocr.min_text_chars", 20)
+        self.min_image_area = config.get("ocr.min_image_area", 0.02)
+        self.full_page_coverage = config.get("ocr.full_page_coverage", 0.6)
+        self.models_dir = Path(__file__).parent.parent / config.get("visual.models_dir", "../models")
+        self.registry = ModelRegistry.shared(self.models_dir, verify=config.get("visual.verify_models", True))
+        self._engine: Optional[PaddleOCR] = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+    
+    @property
+    def engine(self) -> Optional[PaddleOCR]:
+        """The OCR models, loaded on first use; None when OCR is off or unavailable"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._engine = self._load_engine()
+                    self._loaded = True
+        return self._engine
+    
+    def _load_engine(self) -> Optional[PaddleOCR]:
+        if self.engine_name == "off":
+            return None
+        if self.engine_name not in ("auto", "onnx"):
+            raise ValueError(f"Unknown OCR engine: {self.engine_name}")
+        if self.engine_name == "auto" and not runtime_available():
+            logger.warning("onnxruntime is not installed; OCR is skipped")
+            return None
+        
+        rec_entry = self.registry.entries(OCR_CATEGORY).get(REC_MODEL, {})
+        charset_path = self.models_dir / rec_entry["dict"] if "dict" in rec_entry else None
+        if not (self.registry.available(OCR_CATEGORY, DET_MODEL) and self.registry.available(OCR_CATEGORY, REC_MODEL)
+                and charset_path is not None and charset_path.is_file()):
+            if self.engine_name == "onnx":
+                raise FileNotFoundError(f"PaddleOCR models or dictionary not found in {self.models_dir}")
+            logger.warning(f"No PaddleOCR models found in {self.models_dir}; OCR is skipped")
+            return None
+        
+        sessions = self.config.get("visual.sessions", 2)
+        intra_op = self.config.get("visual.intra_op_threads", 2)
+        inter_op = self.config.get("visual.inter_op_threads", 1)
+        det_pool, rec_pool = (
+            self.registry.get_or_load(
+                (OCR_CATEGORY, name, sessions, intra_op, inter_op),
+                lambda name=name: SessionPool(self.registry.verified_path(OCR_CATEGORY, name), sessions, intra_op, inter_op)
+            )
+            for name in (DET_MODEL, REC_MODEL)
+        )
+        logger.info("Using PaddleOCR models for scanned pages and image regions")
+        return PaddleOCR(
+            det_pool, rec_pool, load_charset(charset_path),
+            det_limit_side=self.config.get("ocr.det_limit_side", 960),
+            det_batch_size=self.config.get("ocr.det_batch_size", 4),
+            rec_batch_size=self.config.get("ocr.rec_batch_size", 8),
+            det_threshold=self.config.get("ocr.det_threshold", 0.3),
+            box_threshold=self.config.get("ocr.det_box_threshold", 0.6),
+            unclip_ratio=self.config.get("ocr.det_unclip_ratio", 1.5),
+            min_confidence=self.config.get("ocr.min_confidence", 0.5)
+        )
+    
+    def model_state(self) -> Dict[str, str]:
+        """The resolved engine and the digests of the OCR models and dictionary, loading them if needed"""
+        if self.engine is None:
+            return {"engine": "off"}
+        rec_entry = self.registry.entries(OCR_CATEGORY)[REC_MODEL]
+        return {
+            "engine": "onnx",
+            DET_MODEL: self.registry.digest(OCR_CATEGORY, DET_MODEL),
+            REC_MODEL: self.registry.digest(OCR_CATEGORY, REC_MODEL),
+            "dict": self.registry.digests.digest(self.models_dir / rec_entry["dict"])
+        }
+    
+    def warm_up(self, all_sessions: bool = False) -> None:
+        """Load the OCR models and run them once (see VisualPIIDetector.warm_up)"""
+        if self.engine is None:
+            return
+        if all_sessions:
+            self.engine.det_pool.prefill()
+            self.engine.rec_pool.prefill()
+        self.engine.recognize([np.full((64, 64, 3), 255, dtype=np.uint8)])
+        self.engine.read_lines([np.full((48, 96, 3), 255, dtype=np.uint8)])
+    
+    def regions(self, page, text_layer: TextLayer) -> List[Rect]:
+        """Regions of a PDF page to OCR, in points; none when OCR is unavailable"""
+        if self.engine is None:
+            return []
+        return ocr_regions(page, text_layer, self.min_text_chars, self.min_image_area, self.full_page_coverage)
+    
+    def read(self, images: Sequence[np.ndarray], regions: Sequence[List[Rect]],
+             plans: Sequence[RenderPlan]) -> List[Optional[TextLayer]]:
+        """OCR text layer of each image's regions, None for images without any
+        
+        `images` are renders of pages as described by `plans`; the regions
+        of all of them go through the models together and the resulting
+        words are in points. With a scale 1 plan covering an image, the
+        coordinates stay in image pixels.
+        """
+        crops, owners = [], []
+        for index, (image, rects, plan) in enumerate(zip(images, regions, plans)):
+            for block_no, rect in enumerate(rects):
+                px0, py0, px1, py1 = plan.to_pixels(rect)
+                px0, py0 = max(0, px0), max(0, py0)
+                px1, py1 = min(image.shape[1], px1), min(image.shape[0], py1)
+                if px1 > px0 and py1 > py0:
+                    crops.append(image[py0:py1, px0:px1])
+                    owners.append((index, block_no, (px0, py0), plan))
+        
+        words: List[Optional[List[tuple]]] = [[] if rects else None for rects in regions]
+        if crops and self.engine is not None:
+            for (index, block_no, origin, plan), lines in zip(owners, self.engine.recognize(crops)):
+                words[index].extend(line_words(lines, origin, plan, block_no))
+            logger.info(f"OCR read {len(crops)} regions of {sum(1 for rects in regions if rects)} pages")
+        return [TextLayer(found) if found is not None else None for found in words]
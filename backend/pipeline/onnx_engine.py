@@ -0,0 +1,240 @@
+import functools
+import importlib.util
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .geometry import nms
+
+logger = logging.getLogger(__name__)
+
+# Candidates kept per image (best score first) before NMS
+MAX_CANDIDATES = 300
+
+# RetinaFace anchors: per stride, the prior sizes in input pixels
+_RETINAFACE_STEPS = (8, 16, 32)
+_RETINAFACE_MIN_SIZES = ((16, 32), (64, 128), (256, 512))
+_RETINAFACE_VARIANCE = (0.1, 0.2)
+
+def runtime_available() -> bool:
+    return importlib.util.find_spec("onnxruntime") is not None
+
+def _onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError:
+        raise ValueError("ONNX visual detection needs the 'onnxruntime' package (pip install onnxruntime)")
+    return onnxruntime
+
+@dataclass(frozen=True)
+class Letterbox:
+    """How a raster was fitted into the square model input: scaled, then padded"""
+    scale: float
+    pad_x: int
+    pad_y: int
+    width: int
+    height: int
+    
+    def to_source(self, boxes: np.ndarray) -> np.ndarray:
+        """Map (N, 4) x1, y1, x2, y2 from model input pixels back to the source raster"""
+        mapped = np.empty(boxes.shape, dtype=np.float64)
+        mapped[:, [0, 2]] = ((boxes[:, [0, 2]] - self.pad_x) / self.scale).clip(0, self.width)
+        mapped[:, [1, 3]] = ((boxes[:, [1, 3]] - self.pad_y) / self.scale).clip(0, self.height)
+        return mapped
+
+def letterbox(image: np.ndarray, size: int, fill: int = 114) -> Tuple[np.ndarray, Letterbox]:
+    """Fit an (H, W, C) uint8 raster into a size x size RGB array, keeping its aspect ratio
+    
+    The resized image is centred and the border filled with `fill`. Only
+    the downscaled copy is converted to RGB, never the full-size raster.
+    """
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+    height, width = image.shape[:2]
+    scale = min(size / width, size / height)
+    new_width, new_height = max(1, round(width * scale)), max(1, round(height * scale))
+    
+    resized = Image.fromarray(image).resize((new_width, new_height), Image.Resampling.BILINEAR, reducing_gap=3.0)
+    canvas = np.full((size, size, 3), fill, dtype=np.uint8)
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = np.asarray(resized.convert("RGB"))
+    return canvas, Letterbox(scale, pad_x, pad_y, width, height)
+
+def decode_yolov5(outputs: List[np.ndarray], input_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Boxes and scores from a raw YOLOv5 head: rows of cx, cy, w, h, objectness, class scores"""
+    rows = outputs[0]
+    scores = rows[:, 4] * rows[:, 5:].max(axis=1) if rows.shape[1] > 5 else rows[:, 4]
+    centers, sizes = rows[:, :2], rows[:, 2:4]
+    return np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1), scores
+
+@functools.lru_cache(maxsize=8)
+def retinaface_priors(input_size: int) -> np.ndarray:
+    """(P, 4) anchor cx, cy, w, h (fractions of the input) in RetinaFace output order"""
+    priors = []
+    for step, min_sizes in zip(_RETINAFACE_STEPS, _RETINAFACE_MIN_SIZES):
+        cells = -(-input_size // step)
+        ys, xs = np.meshgrid(np.arange(cells), np.arange(cells), indexing="ij")
+        centers = np.stack([(xs.ravel() + 0.5) * step, (ys.ravel() + 0.5) * step], axis=1) / input_size
+        # Every cell carries one anchor per prior size, sizes innermost
+        for_cells = np.repeat(centers, len(min_sizes), axis=0)
+        sizes = np.tile(np.array(min_sizes, dtype=np.float64) / input_size, len(centers))[:, None]
+        priors.append(np.concatenate([for_cells, sizes, sizes], axis=1))
+    return np.concatenate(priors)
+
+def decode_retinaface(outputs: List[np.ndarray], input_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Boxes and scores from RetinaFace's loc (P, 4) and softmaxed conf (P, 2) outputs"""
+    loc, conf = outputs[0], outputs[1]
+    priors = retinaface_priors(input_size)
+    centers = priors[:, :2] + loc[:, :2] * _RETINAFACE_VARIANCE[0] * priors[:, 2:]
+    sizes = priors[:, 2:] * np.exp(loc[:, 2:] * _RETINAFACE_VARIANCE[1])
+    boxes = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1) * input_size
+    return boxes, conf[:, 1]
+
+@dataclass(frozen=True)
+class ModelLayout:
+    """Input normalization and output decoding of one family of models"""
+    decode: Callable[[List[np.ndarray], int], Tuple[np.ndarray, np.ndarray]]
+    fill: int
+    bgr: bool
+    mean: Tuple[float, float, float]
+    scale: float
+
+LAYOUTS = {
+    "yolov5": ModelLayout(decode_yolov5, fill=114, bgr=False, mean=(0.0, 0.0, 0.0), scale=1 / 255),
+    "retinaface": ModelLayout(decode_retinaface, fill=0, bgr=True, mean=(104.0, 117.0, 123.0), scale=1.0),
+}
+
+def to_tensor(batch: np.ndarray, layout: ModelLayout) -> np.ndarray:
+    """(N, S, S, 3) uint8 RGB to the model's (N, 3, S, S) float32 input"""
+    if layout.bgr:
+        batch = batch[..., ::-1]
+    tensor = (batch.astype(np.float32) - np.array(layout.mean, dtype=np.float32)) * np.float32(layout.scale)
+    return np.ascontiguousarray(tensor.transpose(0, 3, 1, 2))
+
+class SessionPool:
+    """Up to `size` CPU inference sessions over one model, shared between threads
+    
+    The model is given as bytes or as a file path, and sessions are created
+    only when all existing ones are busy. ONNX Runtime keeps its own copy of
+    the weights in every session; from a path it reads the file itself, so
+    no Python-side copy of the model is made per session. A caller borrows
+    a session for one run, so concurrent pages never queue on one session's
+    thread pool; total CPU use is bounded by size * intra_op_threads.
+    """
+    
+    def __init__(self, model: Union[bytes, str, os.PathLike], size: int = 1, intra_op_threads: int = 1,
+                 inter_op_threads: int = 1):
+        self.model = model
+        self.size = max(1, size)
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.sessions_created = 0
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+    
+    def _new_session(self):
+        ort = _onnxruntime()
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # ONNX Runtime takes a path or bytes, not an arbitrary buffer
+        model = self.model if isinstance(self.model, bytes) else os.fspath(self.model)
+        return ort.InferenceSession(model, sess_options=options, providers=["CPUExecutionProvider"])
+    
+    def prefill(self) -> None:
+        """Create every session now (before forking workers, say) rather than on demand"""
+        with self._lock:
+            missing = self.size - self.sessions_created
+            self.sessions_created = self.size
+        for _ in range(missing):
+            self._idle.put(self._new_session())
+    
+    @contextmanager
+    def session(self) -> Iterator:
+        """Borrow an idle session, creating one if the pool is not full, else wait"""
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self.sessions_created < self.size
+                if create:
+                    self.sessions_created += 1
+            if create:
+                try:
+                    session = self._new_session()
+                except Exception:
+                    with self._lock:
+                        self.sessions_created -= 1
+                    raise
+            else:
+                session = self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+def run_batch(pool: SessionPool, tensor: np.ndarray) -> List[np.ndarray]:
+    """Outputs of one batched run on a pooled session"""
+    with pool.session() as session:
+        model_input = session.get_inputs()[0]
+        fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        if fixed_batch is None or fixed_batch == len(tensor):
+            return session.run(None, {model_input.name: tensor})
+        # Exported with a fixed batch of one: run the images one at a time
+        runs = [session.run(None, {model_input.name: tensor[i:i + 1]}) for i in range(len(tensor))]
+    return [np.concatenate(parts) for parts in zip(*runs)]
+
+class OnnxDetector:
+    """One detection model: letterboxing, batched inference, decoding and NMS"""
+    
+    def __init__(self, pool: SessionPool, layout: str, input_size: int = 640, batch_size: int = 4,
+                 threshold: float = 0.5, iou_threshold: float = 0.45):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown model layout: {layout}")
+        self.pool = pool
+        self.layout = LAYOUTS[layout]
+        self.input_size = input_size
+        self.batch_size = max(1, batch_size)
+        self.threshold = threshold
+        self.iou_threshold = iou_threshold
+    
+    def detect(self, images: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """(N, 5) x1, y1, x2, y2, score in source pixels, for each (H, W, C) image
+        
+        Images are letterboxed to one input size so up to batch_size of
+        them (pages of any shape) go through the model in a single run.
+        """
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            fitted = [letterbox(image, self.input_size, self.layout.fill)
+                      for image in images[start:start + self.batch_size]]
+            outputs = self._run(to_tensor(np.stack([canvas for canvas, _ in fitted]), self.layout))
+            for i, (_, transform) in enumerate(fitted):
+                results.append(self._postprocess([output[i] for output in outputs], transform))
+        return results
+    
+    def _run(self, tensor: np.ndarray) -> List[np.ndarray]:
+        return run_batch(self.pool, tensor)
+    
+    def _postprocess(self, outputs: List[np.ndarray], transform: Letterbox) -> np.ndarray:
+        boxes, scores = self.layout.decode(outputs, self.input_size)
+        candidates = np.flatnonzero(scores >= self.threshold)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")[:MAX_CANDIDATES]]
+        
+        boxes = transform.to_source(boxes[candidates])
+        scores = scores[candidates].astype(np.float64)
+        # Boxes that fell entirely in the padding collapse to nothing
+        visible = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        boxes, scores = boxes[visible], scores[visible]
+        
+        keep = nms(boxes, scores, self.iou_threshold) if len(boxes) else np.empty(0, dtype=np.int64)
+        return np.column_stack([boxes[keep], scores[keep]]) if len(keep) else np.empty((0, 5))
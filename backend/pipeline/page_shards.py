@@ -0,0 +1,212 @@
+import logging
+import os
+from typing import List, NamedTuple, Tuple, Dict, Any, Optional, Union
+
+import numpy as np
+
+from .detections import DetectionSet
+from .models import PIIDetection
+from .pii_text import TextPIIDetector
+from .pii_visual import VisualPIIDetector
+from .ocr import PageOCR
+from .config import Config
+from .text_layer import Rect, TextLayer
+from .raster import CopyCounter, RasterView
+from .render_plan import RenderPlan, RenderPlanner, render_page
+from .raster_ring import RasterRing, SlotRef, read_slot
+
+logger = logging.getLogger(__name__)
+
+# Per-process detectors, built once by the pool initializer
+_text_detector: Optional[TextPIIDetector] = None
+_visual_detector: Optional[VisualPIIDetector] = None
+_ocr: Optional[PageOCR] = None
+_render_planner: Optional[RenderPlanner] = None
+
+# One open document per worker process, reused by consecutive page units
+_open_doc: Optional[Tuple[tuple, Any]] = None
+
+def plan_page_units(total_pages: int, pages_per_unit: int = 1) -> List[Tuple[int, int]]:
+    """Split pages into contiguous [start, stop) units of at most pages_per_unit pages
+    
+    Units are the granularity at which concurrent jobs share the detection
+    slots, so they are kept small regardless of how many workers there are.
+    """
+    step = max(1, pages_per_unit)
+    return [(start, min(start + step, total_pages)) for start in range(0, max(0, total_pages), step)]
+
+def detect_pages(doc, start: int, stop: int, text_detector: TextPIIDetector,
+                 visual_detector: VisualPIIDetector,
+                 copy_counter: Optional[CopyCounter] = None,
+                 ocr: Optional[PageOCR] = None,
+                 planner: Optional[RenderPlanner] = None) -> DetectionSet:
+    """Run text and visual detection over pages [start, stop) of an open PDF
+    
+    Each page is rendered as its RenderPlan says (the planner defaults to
+    one built from the visual detector's config). Rendered pages are
+    handed to the visual detector in batches of its batch_size, so units
+    of several pages share model runs; the regions OCR is routed to on
+    those pages are read together in the same step.
+    """
+    if planner is None:
+        planner = RenderPlanner(visual_detector.config)
+    
+    page_detections: Dict[int, List[PIIDetection]] = {}
+    pending: List[Tuple[int, RasterView, List[Rect], RenderPlan]] = []
+    for page_num in range(start, stop):
+        page = doc[page_num]
+        
+        # Extract the word layer once
+        text_layer = TextLayer.from_page(page)
+        
+        # Detect text PII with real word coordinates
+        page_detections[page_num] = text_detector.detect_pii(text_layer.text, page_num, text_layer)
+        
+        # Render only what the detectors need, at the resolution they need
+        regions = ocr.regions(page, text_layer) if ocr is not None else []
+        plan = planner.plan(tuple(page.rect), visual_detector.enabled, regions)
+        if plan is None:
+            continue
+        
+        # Detect visual PII on a view of the pixmap samples (no encode, no copy)
+        raster, plan = render_page(page, plan)
+        if copy_counter is not None:
+            copy_counter.add(page_num, raster.bytes_copied)
+        pending.append((page_num, raster, regions, plan))
+        if len(pending) >= visual_detector.batch_size:
+            _detect_rasters(text_detector, visual_detector, ocr, pending, page_detections)
+    
+    if pending:
+        _detect_rasters(text_detector, visual_detector, ocr, pending, page_detections)
+    
+    return DetectionSet.concat([DetectionSet.from_detections(found) for found in page_detections.values()])
+
+def _detect_rasters(text_detector: TextPIIDetector, visual_detector: VisualPIIDetector,
+                    ocr: Optional[PageOCR], pending: List[Tuple[int, RasterView, List[Rect], RenderPlan]],
+                    page_detections: Dict[int, List[PIIDetection]]) -> None:
+    """Run one visual batch, and OCR on the batch's routed regions, then release the rasters
+    
+    Visual boxes come back in render pixels and are mapped to page points
+    through each page's plan, like the OCR words.
+    """
+    page_nums = [page_num for page_num, _, _, _ in pending]
+    batch = visual_detector.detect_pii_batch([raster for _, raster, _, _ in pending], page_nums)
+    for (page_num, _, _, plan), found in zip(pending, batch):
+        for detection in found:
+            detection.bbox = plan.bbox_to_points(detection.bbox)
+        page_detections[page_num].extend(found)
+    
+    if ocr is not None and any(regions for _, _, regions, _ in pending):
+        layers = ocr.read([raster.array for _, raster, _, _ in pending],
+                          [regions for _, _, regions, _ in pending],
+                          [plan for _, _, _, plan in pending])
+        for page_num, layer in zip(page_nums, layers):
+            if layer is not None and layer.text:
+                page_detections[page_num].extend(text_detector.detect_pii(layer.text, page_num, layer))
+    pending.clear()
+
+class RenderedPage(NamedTuple):
+    """A page prepared by the parent for detection in a worker; raster is None when nothing needed pixels"""
+    page_num: int
+    text_layer: TextLayer
+    raster: Union[SlotRef, np.ndarray, None]
+    regions: List[Rect]
+    plan: Optional[RenderPlan]
+
+def render_to_ring(doc, start: int, stop: int, ring: RasterRing, slots: List[int], planner: RenderPlanner,
+                   visual: bool = True, ocr: Optional[PageOCR] = None) -> List[RenderedPage]:
+    """Extract the word layer, route OCR and render pages [start, stop) into ring slots (pdf thread)
+    
+    A page too large for a slot is sent as a copy of its pixels instead.
+    """
+    pages = []
+    for page_num, slot in zip(range(start, stop), slots):
+        page = doc[page_num]
+        text_layer = TextLayer.from_page(page)
+        regions = ocr.regions(page, text_layer) if ocr is not None else []
+        plan = planner.plan(tuple(page.rect), visual, regions)
+        if plan is None:
+            pages.append(RenderedPage(page_num, text_layer, None, regions, None))
+            continue
+        
+        # The view keeps the pixmap alive until its samples are copied out
+        raster, plan = render_page(page, plan)
+        if ring.fits(raster.array):
+            pages.append(RenderedPage(page_num, text_layer, ring.write(slot, raster.array), regions, plan))
+        else:
+            logger.debug(f"Page {page_num} ({raster.nbytes} bytes) exceeds a ring slot; pickling it")
+            pages.append(RenderedPage(page_num, text_layer, np.array(raster.array), regions, plan))
+    return pages
+
+def detect_rendered_pages(pages: List[RenderedPage]) -> DetectionSet:
+    """Worker entry point: detect PII on pages the parent rendered into a raster ring"""
+    page_detections: Dict[int, List[PIIDetection]] = {}
+    pending: List[Tuple[int, RasterView, List[Rect], RenderPlan]] = []
+    for page in pages:
+        text_layer = page.text_layer
+        page_detections[page.page_num] = _text_detector.detect_pii(text_layer.text, page.page_num, text_layer)
+        if page.raster is not None:
+            array = read_slot(page.raster) if isinstance(page.raster, SlotRef) else page.raster
+            pending.append((page.page_num, RasterView(array), page.regions, page.plan))
+    
+    if pending:
+        _detect_rasters(_text_detector, _visual_detector, _ocr, pending, page_detections)
+    return DetectionSet.concat([DetectionSet.from_detections(found) for found in page_detections.values()])
+
+def init_worker(config_data: Dict[str, Any]) -> None:
+    """Process pool initializer: build detectors once per worker"""
+    global _text_detector, _visual_detector, _ocr, _render_planner
+    config = Config(config_data)
+    _text_detector = TextPIIDetector(config)
+    _visual_detector = VisualPIIDetector(config)
+    _ocr = PageOCR(config)
+    _render_planner = RenderPlanner(config)
+
+def _close_worker_document() -> None:
+    global _open_doc
+    if _open_doc is not None:
+        _open_doc[1].close()
+        _open_doc = None
+
+def _worker_document(file_path: str):
+    """Return this worker's handle on file_path, reopening only when the file changes
+    
+    PyMuPDF documents cannot be shared, so every worker opens its own handle;
+    keeping the last one avoids reparsing the PDF for every page unit. The
+    file's device and inode are part of the key, so a new upload at a reused
+    path is never read through the old handle, and a handle on a file that
+    is gone is dropped.
+    """
+    import fitz  # PyMuPDF
+    global _open_doc
+    
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        _close_worker_document()
+        raise
+    key = (file_path, stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _open_doc is not None and _open_doc[0] == key:
+        return _open_doc[1]
+    
+    _close_worker_document()
+    doc = fitz.open(file_path)
+    _open_doc = (key, doc)
+    return doc
+
+def detect_page_range(file_path: str, start: int,
+                      stop: int) -> Tuple[DetectionSet, Dict[int, int]]:
+    """Worker entry point: detect PII on one page unit of a PDF
+    
+    Returns the detections, which pickle as two arrays, and the raster
+    bytes copied per page.
+    """
+    copy_counter = CopyCounter()
+    doc = _worker_document(file_path)
+    detections = detect_pages(doc, start, stop, _text_detector, _visual_detector, copy_counter, _ocr, _render_planner)
+    if stop >= len(doc):
+        # The job's last unit: an idle handle would keep its input's storage after it is deleted
+        _close_worker_document()
+    
+    logger.debug(f"Pages {start}-{stop} of {file_path}: {len(detections)} detections")
+    return detections, copy_counter.pages
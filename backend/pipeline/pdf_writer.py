@@ -0,0 +1,58 @@
+import inspect
+import logging
+from typing import Any, Dict
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Named trade-offs between save time and output size; keys are Document.save options.
+# Every profile collects garbage: apply_redactions leaves the page's original
+# content stream behind as an unreferenced object, and garbage=0 writes it out.
+WRITER_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Only drop unused objects: fastest save, largest file
+    "fast": {"garbage": 1, "deflate": False, "deflate_images": False,
+             "deflate_fonts": False, "clean": False, "use_objstms": False},
+    # Drop unused objects and compress streams
+    "balanced": {"garbage": 3, "deflate": True, "deflate_images": False,
+                 "deflate_fonts": False, "clean": False, "use_objstms": False},
+    # Everything that shrinks the file, at several times the save time
+    "smallest": {"garbage": 4, "deflate": True, "deflate_images": True,
+                 "deflate_fonts": True, "clean": True, "use_objstms": True},
+}
+
+SAVE_OPTIONS = ("garbage", "deflate", "deflate_images", "deflate_fonts", "clean", "linear", "use_objstms")
+
+def save_options(config: Config) -> Dict[str, Any]:
+    """Document.save keyword arguments from the pdf_writer config section
+    
+    pdf_writer.profile picks a base from WRITER_PROFILES and any option set
+    next to it overrides that profile's value. Options the installed
+    PyMuPDF does not know (use_objstms needs 1.24) are dropped with a
+    warning. Incremental saves are deliberately not offered, and garbage
+    below 1 is refused, for the same reason: either would keep the
+    unredacted content in the output file.
+    """
+    section = config.get("pdf_writer", {}) or {}
+    profile = section.get("profile", "balanced")
+    if profile not in WRITER_PROFILES:
+        raise ValueError(f"Unknown pdf_writer profile: {profile}")
+    
+    options = dict(WRITER_PROFILES[profile])
+    options.update({key: section[key] for key in SAVE_OPTIONS if key in section})
+    if options["garbage"] < 1:
+        raise ValueError("pdf_writer.garbage must be at least 1: garbage=0 keeps redacted content in the file")
+    return supported_options(options)
+
+def supported_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop options this PyMuPDF's Document.save does not accept (when enabled, with a warning)"""
+    import fitz  # PyMuPDF
+    
+    accepted = inspect.signature(fitz.Document.save).parameters
+    supported = {}
+    for key, value in options.items():
+        if key in accepted:
+            supported[key] = value
+        elif value:
+            logger.warning(f"PyMuPDF {fitz.VersionBind} cannot save with {key}; ignoring it")
+    return supported
@@ -1,27 +1,44 @@
 import re
-from typing import List
+from typing import List, Optional
 import logging
 
 from .models import PIIDetection, PIIType, BoundingBox
 from .config import Config
+from .text_layer import TextLayer
 
 logger = logging.getLogger(__name__)
 
+# Regex patterns for Indian PII in priority order. All patterns are compiled
+# into a single alternation so a page is scanned once; when two patterns match
+# at the same offset the earlier entry wins (a 12-digit run is AADHAAR, a
+# 10-digit mobile number is PHONE, neither is re-reported as ACCOUNT_NO).
+PII_PATTERNS = [
+    (PIIType.EMAIL, r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    (PIIType.AADHAAR, r'\d{4}\s?\d{4}\s?\d{4}\b'),
+    (PIIType.PHONE, r'(?:\+?91[- ]?)?[6-9]\d{9}\b'),
+    (PIIType.PAN, r'[A-Z]{5}[0-9]{4}[A-Z]\b'),
+    (PIIType.IFSC, r'[A-Z]{4}0[A-Z0-9]{6}\b'),
+    (PIIType.DATE, r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b'),
+    (PIIType.ACCOUNT_NO, r'\d{9,18}\b'),
+]
+
+def compile_scanner(patterns) -> re.Pattern:
+    """Compile (PIIType, pattern) pairs into one named-group alternation"""
+    branches = '|'.join(f'(?P<{pii_type.name}>{pattern})' for pii_type, pattern in patterns)
+    # Every pattern starts on a word boundary, so it is hoisted out of the branches
+    return re.compile(rf'\b(?:{branches})', re.IGNORECASE)
+
+_SCANNER = compile_scanner(PII_PATTERNS)
+_WORD = re.compile(r'\S+')
+
 class TextPIIDetector:
     def __init__(self, config: Config):
         self.config = config
         self.min_confidence = config.get("ner.min_confidence", 0.6)
         
-        # Define regex patterns for Indian PII
-        self.patterns = {
-            PIIType.AADHAAR: r'\b\d{4}\s?\d{4}\s?\d{4}\b',
-            PIIType.PAN: r'\b[A-Z]{5}[0-9]{4}[A-Z]\b',
-            PIIType.IFSC: r'\b[A-Z]{4}0[A-Z0-9]{6}\b',
-            PIIType.PHONE: r'\b(?:\+?91[- ]?)?[6-9]\d{9}\b',
-            PIIType.EMAIL: r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            PIIType.ACCOUNT_NO: r'\b\d{9,18}\b',
-            PIIType.DATE: r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b',
-        }
+        # Regex patterns for Indian PII, scanned in a single pass
+        self.patterns = dict(PII_PATTERNS)
+        self.scanner = _SCANNER
         
         # Common Indian names and organizations for basic NER
         self.name_indicators = [
@@ -32,71 +49,74 @@ class TextPIIDetector:
             'ltd', 'limited', 'pvt', 'private', 'corp', 'corporation', 'inc', 'company', 'bank', 'hospital'
         ]
     
-    async def detect_pii(self, text: str, page_num: int = 0) -> List[PIIDetection]:
-        """Detect PII in text using regex patterns and simple NER"""
+    def detect_pii(self, text: str, page_num: int = 0,
+                   text_layer: Optional[TextLayer] = None) -> List[PIIDetection]:
+        """Detect PII in text using regex patterns and simple NER
+        
+        With a text layer (whose .text is `text`), bounding boxes are the real
+        word rectangles; otherwise they are estimated from the match length.
+        """
         detections = []
         
-        # Apply regex patterns
-        for pii_type, pattern in self.patterns.items():
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                # Create a simple bounding box (would need OCR coordinates in real implementation)
-                bbox = BoundingBox(
-                    x=0,  # Would get from OCR
-                    y=0,
-                    width=len(match.group()) * 10,  # Estimated
-                    height=20
-                )
-                
-                detection = PIIDetection(
-                    text=match.group(),
-                    pii_type=pii_type,
-                    confidence=0.9,  # High confidence for regex matches
-                    bbox=bbox,
-                    page=page_num
-                )
-                detections.append(detection)
+        # Apply all regex patterns in one scan; matches never overlap
+        for match in self.scanner.finditer(text):
+            detections.extend(self._span_detections(
+                match.group(), match.start(), match.end(), PIIType[match.lastgroup],
+                0.9,  # High confidence for regex matches
+                page_num, text_layer, char_width=10
+            ))
         
         # Simple person name detection
-        words = text.split()
+        words = list(_WORD.finditer(text))
         for i, word in enumerate(words):
             # Check for name indicators
-            if word.lower() in self.name_indicators:
+            if word.group().lower() in self.name_indicators:
                 # Next word might be a name
                 if i + 1 < len(words):
                     next_word = words[i + 1]
-                    if next_word.istitle() and len(next_word) > 2:
-                        bbox = BoundingBox(x=0, y=0, width=len(next_word) * 10, height=20)
-                        detection = PIIDetection(
-                            text=next_word,
-                            pii_type=PIIType.PERSON,
-                            confidence=0.7,
-                            bbox=bbox,
-                            page=page_num
-                        )
-                        detections.append(detection)
+                    if next_word.group().istitle() and len(next_word.group()) > 2:
+                        detections.extend(self._span_detections(
+                            next_word.group(), next_word.start(), next_word.end(),
+                            PIIType.PERSON, 0.7, page_num, text_layer, char_width=10
+                        ))
         
         # Simple organization detection
         for i, word in enumerate(words):
-            if word.lower() in self.org_indicators:
+            if word.group().lower() in self.org_indicators:
                 # Previous words might be org name
                 start_idx = max(0, i - 3)
                 org_words = words[start_idx:i + 1]
-                org_name = ' '.join(org_words)
+                org_name = ' '.join(w.group() for w in org_words)
                 
-                bbox = BoundingBox(x=0, y=0, width=len(org_name) * 8, height=20)
-                detection = PIIDetection(
-                    text=org_name,
-                    pii_type=PIIType.ORG,
-                    confidence=0.6,
-                    bbox=bbox,
-                    page=page_num
-                )
-                detections.append(detection)
+                detections.extend(self._span_detections(
+                    org_name, org_words[0].start(), word.end(),
+                    PIIType.ORG, 0.6, page_num, text_layer, char_width=8
+                ))
         
         logger.info(f"Detected {len(detections)} PII items in text")
         return detections
     
+    def _span_detections(self, value: str, start: int, end: int, pii_type: PIIType,
+                         confidence: float, page_num: int, text_layer: Optional[TextLayer],
+                         char_width: int) -> List[PIIDetection]:
+        """Create detections for text[start:end], one per line it covers"""
+        if text_layer is not None:
+            boxes = text_layer.span_boxes(start, end)
+        else:
+            # No coordinates available (plain text input): estimate the box
+            boxes = [BoundingBox(x=0, y=0, width=len(value) * char_width, height=20)]
+        
+        return [
+            PIIDetection(
+                text=value,
+                pii_type=pii_type,
+                confidence=confidence,
+                bbox=bbox,
+                page=page_num
+            )
+            for bbox in boxes
+        ]
+    
     def validate_aadhaar(self, aadhaar: str) -> bool:
         """Validate Aadhaar number using simple checksum"""
         # Remove spaces
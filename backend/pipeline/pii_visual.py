@@ -1,69 +1,178 @@
 import logging
-from typing import List
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
 import numpy as np
 
 from .models import PIIDetection, PIIType, BoundingBox
 from .config import Config
+from .raster import RasterView
+from .model_registry import ModelRegistry
+from .onnx_engine import OnnxDetector, SessionPool, runtime_available
 
 logger = logging.getLogger(__name__)
 
+# Visual models in models/manifest.json: PII type, output layout, threshold key
+VISUAL_MODELS = {
+    "retinaface": (PIIType.FACE, "retinaface", "visual.face_threshold"),
+    "signature_detector": (PIIType.SIGNATURE, "yolov5", "visual.signature_threshold"),
+    "stamp_detector": (PIIType.STAMP, "yolov5", "visual.stamp_threshold"),
+}
+
 class VisualPIIDetector:
     def __init__(self, config: Config):
         self.config = config
         self.face_threshold = config.get("visual.face_threshold", 0.5)
         self.signature_threshold = config.get("visual.signature_threshold", 0.35)
+        self.engine = config.get("visual.engine", "auto")
+        self.batch_size = config.get("visual.batch_size", 4)
+        self.models_dir = Path(__file__).parent.parent / config.get("visual.models_dir", "../models")
+        self.registry = ModelRegistry.shared(self.models_dir, verify=config.get("visual.verify_models", True))
+        self._detectors: Optional[Dict[PIIType, OnnxDetector]] = None
+        self._load_lock = threading.Lock()
     
-    async def detect_pii(self, image_data: bytes, page_num: int = 0) -> List[PIIDetection]:
-        """Detect visual PII in image data"""
-        detections = []
+    @property
+    def detectors(self) -> Dict[PIIType, OnnxDetector]:
+        """ONNX detectors by PII type, loaded on first use; empty when running on mock output"""
+        if self._detectors is None:
+            with self._load_lock:
+                if self._detectors is None:
+                    self._detectors = self._load_detectors()
+        return self._detectors
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether pages need rendering for visual detection at all (engine not off)"""
+        return self.engine != "off"
+    
+    def _load_detectors(self) -> Dict[PIIType, OnnxDetector]:
+        if self.engine in ("mock", "off"):
+            return {}
+        if self.engine not in ("auto", "onnx"):
+            raise ValueError(f"Unknown visual engine: {self.engine}")
+        if self.engine == "auto" and not runtime_available():
+            logger.warning("onnxruntime is not installed; visual detection returns mock output")
+            return {}
         
-        try:
-            # Convert bytes to numpy array (simplified)
-            # In real implementation, would load ONNX models here
-            
-            # Mock detections for demonstration
-            # In production, these would come from ONNX model inference
-            
-            # Mock face detection
-            if len(image_data) > 10000:  # Simple heuristic
-                face_detection = PIIDetection(
-                    text="[FACE]",
-                    pii_type=PIIType.FACE,
-                    confidence=0.8,
-                    bbox=BoundingBox(x=100, y=100, width=150, height=150),
-                    page=page_num
-                )
-                detections.append(face_detection)
+        detectors = {}
+        for name, (pii_type, layout, threshold_key) in VISUAL_MODELS.items():
+            if not self.registry.available("visual", name):
+                if self.engine == "onnx":
+                    raise FileNotFoundError(f"Visual model '{name}' not found in {self.models_dir}")
+                continue
             
-            # Mock signature detection
-            if len(image_data) > 5000:  # Simple heuristic
-                signature_detection = PIIDetection(
-                    text="[SIGNATURE]",
-                    pii_type=PIIType.SIGNATURE,
-                    confidence=0.7,
-                    bbox=BoundingBox(x=200, y=300, width=100, height=50),
-                    page=page_num
-                )
-                detections.append(signature_detection)
-            
-            logger.info(f"Detected {len(detections)} visual PII items")
-            return detections
-            
-        except Exception as e:
-            logger.error(f"Error in visual PII detection: {str(e)}")
-            return []
+            # Sessions are shared by every detector in the process with the same pool settings
+            sessions = self.config.get("visual.sessions", 2)
+            intra_op = self.config.get("visual.intra_op_threads", 2)
+            inter_op = self.config.get("visual.inter_op_threads", 1)
+            pool = self.registry.get_or_load(
+                ("visual", name, sessions, intra_op, inter_op),
+                lambda: SessionPool(self.registry.verified_path("visual", name), sessions, intra_op, inter_op)
+            )
+            detectors[pii_type] = OnnxDetector(
+                pool, layout,
+                input_size=self.config.get("visual.input_size", 640),
+                batch_size=self.batch_size,
+                threshold=self.config.get(threshold_key, 0.35),
+                iou_threshold=self.config.get("visual.model_nms_iou", 0.45)
+            )
+            logger.info(f"Using visual model {name} ({pii_type.value})")
+        
+        if not detectors:
+            logger.warning(f"No visual models found in {self.models_dir}; visual detection returns mock output")
+        return detectors
     
-    def _detect_faces(self, image_array: np.ndarray) -> List[dict]:
-        """Detect faces using ONNX model (mock implementation)"""
-        # In real implementation, would use RetinaFace or SCRFD ONNX model
-        return []
+    def model_state(self) -> Dict[str, str]:
+        """The resolved engine and the digest of each model in use, loading them if needed"""
+        if not self.enabled:
+            return {"engine": "off"}
+        detectors = self.detectors
+        if not detectors:
+            return {"engine": "mock"}
+        state = {"engine": "onnx"}
+        for name, (pii_type, _, _) in VISUAL_MODELS.items():
+            if pii_type in detectors:
+                state[name] = self.registry.digest("visual", name)
+        return state
+    
+    def warm_up(self, all_sessions: bool = False) -> None:
+        """Load the models and run each once, so the first document does not pay for it
+        
+        With all_sessions every pool is filled up front, as a pre-fork parent
+        needs so that workers inherit sessions instead of building their own.
+        """
+        blank = np.zeros((64, 64, 3), dtype=np.uint8)
+        for detector in self.detectors.values():
+            if all_sessions:
+                detector.pool.prefill()
+            detector.detect([blank])
+        logger.info(f"Warmed up {len(self.detectors)} visual models")
     
-    def _detect_signatures(self, image_array: np.ndarray) -> List[dict]:
-        """Detect signatures using ONNX model (mock implementation)"""
-        # In real implementation, would use custom YOLO model
-        return []
+    def detect_pii(self, image: Union[RasterView, np.ndarray], page_num: int = 0) -> List[PIIDetection]:
+        """Detect visual PII in a (height, width, channels) raster view"""
+        return self.detect_pii_batch([image], [page_num])[0]
     
-    def _detect_stamps(self, image_array: np.ndarray) -> List[dict]:
-        """Detect stamps using ONNX model (mock implementation)"""
-        # In real implementation, would use custom detection model
-        return []
\ No newline at end of file
+    def detect_pii_batch(self, images: Sequence[Union[RasterView, np.ndarray]],
+                         page_nums: Sequence[int]) -> List[List[PIIDetection]]:
+        """Detect visual PII in several rasters (pages), batched through each model"""
+        arrays = [image.array if isinstance(image, RasterView) else image for image in images]
+        if not self.enabled:
+            return [[] for _ in arrays]
+        
+        # Missing or corrupt models and inference errors fail the job: returning
+        # nothing would leave faces and signatures unredacted. Only engine auto
+        # without any models installed falls back to mock output.
+        detectors = self.detectors
+        if not detectors:
+            return [self._mock_detections(array, page_num) for array, page_num in zip(arrays, page_nums)]
+        
+        results: List[List[PIIDetection]] = [[] for _ in arrays]
+        for pii_type, detector in detectors.items():
+            for found, page_num, boxes in zip(results, page_nums, detector.detect(arrays)):
+                found.extend(self._to_detections(boxes, pii_type, page_num))
+        
+        logger.info(f"Detected {sum(map(len, results))} visual PII items on {len(arrays)} pages")
+        return results
+    
+    def _to_detections(self, boxes: np.ndarray, pii_type: PIIType, page_num: int) -> List[PIIDetection]:
+        """Detections from (N, 5) x1, y1, x2, y2, score rows in raster pixels"""
+        detections = []
+        for x1, y1, x2, y2, score in boxes.tolist():
+            x, y = int(np.floor(x1)), int(np.floor(y1))
+            detections.append(PIIDetection(
+                text=f"[{pii_type.value}]",
+                pii_type=pii_type,
+                confidence=score,
+                bbox=BoundingBox(x=x, y=y, width=int(np.ceil(x2)) - x, height=int(np.ceil(y2)) - y),
+                page=page_num
+            ))
+        return detections
+    
+    def _mock_detections(self, image_array: np.ndarray, page_num: int) -> List[PIIDetection]:
+        """Fixed placeholder boxes, used when no visual models are available"""
+        detections = []
+        image_size = image_array.nbytes
+        
+        # Mock face detection
+        if image_size > 10000:  # Simple heuristic
+            face_detection = PIIDetection(
+                text="[FACE]",
+                pii_type=PIIType.FACE,
+                confidence=0.8,
+                bbox=BoundingBox(x=100, y=100, width=150, height=150),
+                page=page_num
+            )
+            detections.append(face_detection)
+        
+        # Mock signature detection
+        if image_size > 5000:  # Simple heuristic
+            signature_detection = PIIDetection(
+                text="[SIGNATURE]",
+                pii_type=PIIType.SIGNATURE,
+                confidence=0.7,
+                bbox=BoundingBox(x=200, y=300, width=100, height=50),
+                page=page_num
+            )
+            detections.append(signature_detection)
+        
+        return detections
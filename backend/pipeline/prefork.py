@@ -0,0 +1,210 @@
+import asyncio
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# smaps_rollup fields reported per process (kB in the file, bytes here)
+_MEMORY_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+}
+
+def process_memory(pid: int) -> Dict[str, int]:
+    """Resident memory of a process in bytes, split into shared and private pages
+    
+    Pss charges each shared page to its sharers in equal parts, so the Pss
+    of all workers adds up to what they really cost together; Rss counts
+    shared pages in full for every one of them. Linux only.
+    """
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            field, _, value = line.partition(":")
+            if field in _MEMORY_FIELDS:
+                memory[_MEMORY_FIELDS[field]] = int(value.split()[0]) * 1024
+    memory["shared"] = memory.get("shared_clean", 0) + memory.get("shared_dirty", 0)
+    memory["private"] = memory.get("private_clean", 0) + memory.get("private_dirty", 0)
+    return memory
+
+def memory_report(processes: Dict[int, str]) -> List[Dict[str, Any]]:
+    """process_memory for each pid (labelled by role), skipping ones that have exited"""
+    report = []
+    for pid, role in processes.items():
+        try:
+            report.append({"pid": pid, "role": role, **process_memory(pid)})
+        except OSError:
+            continue
+    return report
+
+def format_memory_report(report: List[Dict[str, Any]]) -> str:
+    mib = 1024 * 1024
+    lines = [f"{'pid':>8} {'role':<8} {'rss MiB':>9} {'pss MiB':>9} {'shared':>9} {'private':>9}"]
+    for row in report:
+        lines.append(
+            f"{row['pid']:>8} {row['role']:<8} {row['rss'] / mib:>9.1f} {row['pss'] / mib:>9.1f} "
+            f"{row['shared'] / mib:>9.1f} {row['private'] / mib:>9.1f}"
+        )
+    lines.append(f"{'total':>17} {sum(r['rss'] for r in report) / mib:>9.1f} {sum(r['pss'] for r in report) / mib:>9.1f}")
+    return "\n".join(lines)
+
+class PreforkServer:
+    """Serve an ASGI app from forked worker processes that share preloaded state
+    
+    The parent binds the socket and runs `preload` (loading models, say)
+    before forking, then freezes the garbage collector so collections in
+    the workers do not write to, and so un-share, the preloaded objects'
+    pages. Workers inherit everything copy-on-write and all accept on the
+    one socket. A worker that dies is replaced by a fresh fork of the
+    preloaded parent, after `on_worker_exit(pid)` has cleaned up what the
+    dead worker left behind, and `memory_report()` shows how much of each
+    worker is still shared.
+    
+    Nothing that owns threads may be created before the fork; each worker
+    builds its own executors in the app's lifespan.
+    """
+    
+    def __init__(self, app: Any, host: str = "0.0.0.0", port: int = 8080, workers: int = 2,
+                 preload: Optional[Callable[[], None]] = None, log_level: str = "info",
+                 on_worker_exit: Optional[Callable[[int], None]] = None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.preload = preload
+        self.log_level = log_level
+        self.on_worker_exit = on_worker_exit
+        self.socket: Optional[socket.socket] = None
+        self.children: Dict[int, int] = {}
+        self._running = False
+        self._report_requested = False
+    
+    def start(self) -> None:
+        """Bind, preload and fork the workers"""
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(2048)
+        self.port = self.socket.getsockname()[1]
+        
+        if self.preload is not None:
+            started = time.monotonic()
+            self.preload()
+            logger.info(f"Preloaded in {time.monotonic() - started:.1f}s")
+        gc.collect()
+        gc.freeze()
+        
+        self._running = True
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Serving on {self.host}:{self.port} with {self.workers} workers {sorted(self.children)}")
+    
+    def _spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            return
+        
+        # Worker: never returns into the parent's code
+        code = 1
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            self._serve_worker()
+            code = 0
+        except BaseException:
+            logger.exception(f"Worker {os.getpid()} failed")
+        finally:
+            os._exit(code)
+    
+    def _serve_worker(self) -> None:
+        import uvicorn
+        
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan="on")
+        asyncio.run(uvicorn.Server(config).serve(sockets=[self.socket]))
+    
+    def memory_report(self) -> List[Dict[str, Any]]:
+        """Memory of the parent and every live worker"""
+        processes = {os.getpid(): "parent"}
+        processes.update({pid: f"worker{index}" for pid, index in sorted(self.children.items())})
+        return memory_report(processes)
+    
+    def serve_forever(self, report_interval_s: float = 0) -> None:
+        """Supervise workers until SIGINT/SIGTERM; SIGUSR1 logs a memory report"""
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGUSR1, self._handle_report)
+        
+        next_report = time.monotonic() + report_interval_s if report_interval_s else None
+        try:
+            while self._running:
+                self._reap(respawn=True)
+                if self._report_requested or (next_report and time.monotonic() >= next_report):
+                    self._report_requested = False
+                    logger.info("Worker memory:\n" + format_memory_report(self.memory_report()))
+                    if next_report:
+                        next_report = time.monotonic() + report_interval_s
+                time.sleep(0.5)
+        finally:
+            self.stop()
+    
+    def _handle_stop(self, signum, frame) -> None:
+        self._running = False
+    
+    def _handle_report(self, signum, frame) -> None:
+        self._report_requested = True
+    
+    def _reap(self, respawn: bool) -> None:
+        # Only our own workers are waited for; the process may have other children
+        for pid, index in list(self.children.items()):
+            try:
+                waited, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                waited, status = pid, 0
+            if waited == 0:
+                continue
+            del self.children[pid]
+            if respawn and self._running:
+                logger.warning(f"Worker {pid} exited ({os.waitstatus_to_exitcode(status)}); replacing it")
+                if self.on_worker_exit is not None:
+                    try:
+                        self.on_worker_exit(pid)
+                    except Exception:
+                        logger.exception(f"Cleaning up after worker {pid} failed")
+                self._spawn(index)
+    
+    def stop(self, timeout: float = 10.0) -> None:
+        """Ask workers to shut down gracefully, killing any that do not within timeout"""
+        self._running = False
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        
+        deadline = time.monotonic() + timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap(respawn=False)
+            time.sleep(0.05)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children.clear()
+        
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        gc.unfreeze()
@@ -1,96 +1,187 @@
 import os
 import asyncio
+import functools
+import math
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 from datetime import datetime
 
 from .models import ProcessResult, PIIDetection, AuditEntry, PIIType
+from .detections import DetectionSet
+from .geometry import suppress_duplicates
 from .pii_text import TextPIIDetector
 from .pii_visual import VisualPIIDetector
+from .ocr import PageOCR
+from .render_plan import RenderPlan, RenderPlanner
 from .redaction import RedactionEngine
 from .config import Config
+from .executors import PipelineExecutors
+from . import page_shards
+from .raster import CopyCounter, from_pil
+from .raster_ring import RasterRing
+from .tiles import StripSource, iter_bands
+from .scratch import ScratchStorage
+from .result_cache import ResultCache, config_fingerprint, file_sha256, result_from_dict
+from .scheduler import FairPageScheduler
 
 logger = logging.getLogger(__name__)
 
 class DocumentProcessor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, scratch: Optional[ScratchStorage] = None):
         self.config = config
+        self.scratch = scratch or ScratchStorage.from_config(config)
         self.text_detector = TextPIIDetector(config)
         self.visual_detector = VisualPIIDetector(config)
-        self.redaction_engine = RedactionEngine(config)
+        self.ocr = PageOCR(config)
+        self.render_planner = RenderPlanner(config)
+        self.redaction_engine = RedactionEngine(config, self.scratch)
+        self.pdf_workers = config.get("processing.pdf_workers", 1)
+        self.shard_min_pages = config.get("processing.shard_min_pages", 4)
+        self.pages_per_unit = config.get("processing.pages_per_unit", 1)
+        self.render_mode = config.get("processing.render", "worker")
+        self.nms_iou = config.get("redaction.nms_iou", 0.5)
+        self.tile_min_pixels = int(config.get("tiles.min_mpx", 40) * 1_000_000)
+        self.tile_height = config.get("tiles.height_px", 1024)
+        self.tile_overlap = config.get("tiles.overlap_px", 256)
+        self.executors = PipelineExecutors(config)
+        # Page units from all jobs share the pdf thread (or the detect processes)
+        self.page_scheduler = FairPageScheduler(
+            self.pdf_workers if self.executors.has_processes else 1,
+            config.get("processing.page_scheduling", "round_robin")
+        )
+        self._raster_ring: Optional[RasterRing] = None
+        self._model_state: Optional[Dict[str, Dict[str, str]]] = None
+        self.result_cache: Optional[ResultCache] = None
+        if config.get("cache.enabled", True):
+            self.result_cache = ResultCache(
+                config.get("cache.dir", "cache"),
+                int(config.get("cache.max_mb", 2048) * 1024 * 1024)
+            )
+    
+    def warm_up(self) -> None:
+        """Load detection models ahead of the first document (blocking)"""
+        self.visual_detector.warm_up()
+        self.ocr.warm_up()
+    
+    def model_state(self) -> Dict[str, Dict[str, str]]:
+        """Resolved detection engines and model digests, part of the result cache key (blocking)"""
+        if self._model_state is None:
+            self._model_state = {"visual": self.visual_detector.model_state(), "ocr": self.ocr.model_state()}
+        return self._model_state
+    
+    @property
+    def raster_ring(self) -> RasterRing:
+        """Shared memory slots for rasters rendered here and detected in worker processes"""
+        if self._raster_ring is None:
+            slots = self.config.get("processing.raster_slots", 0) or self.pdf_workers * self.pages_per_unit
+            self._raster_ring = RasterRing(
+                max(slots, self.pages_per_unit),
+                int(self.config.get("processing.raster_slot_mb", 32) * 1024 * 1024)
+            )
+        return self._raster_ring
     
-    async def process_document(self, file_path: str, filename: str) -> ProcessResult:
-        """Process a document and return results"""
-        logger.info(f"Processing document: {filename}")
+    def close(self) -> None:
+        """Shut down worker threads and processes"""
+        self.executors.shutdown()
+        if self._raster_ring is not None:
+            self._raster_ring.close()
+            self._raster_ring = None
+    
+    async def process_document(self, file_path: str, filename: str,
+                               content_sha256: Optional[str] = None) -> ProcessResult:
+        """Process a document and return results
         
+        Identical content processed under the same config and policies is
+        served from the result cache; pass content_sha256 if already known.
+        """
         file_ext = Path(filename).suffix.lower()
         
-        if file_ext == '.pdf':
-            return await self._process_pdf(file_path, filename)
-        elif file_ext in ['.jpg', '.jpeg', '.png', '.tiff']:
-            return await self._process_image(file_path, filename)
-        else:
+        if file_ext not in ['.pdf', '.jpg', '.jpeg', '.png', '.tiff']:
             raise ValueError(f"Unsupported file type: {file_ext}")
+        
+        started = time.monotonic()
+        cache_key = None
+        if self.result_cache is not None:
+            if content_sha256 is None:
+                content_sha256 = await asyncio.to_thread(file_sha256, file_path)
+            models = await asyncio.to_thread(self.model_state)
+            cache_key = ResultCache.make_key(content_sha256, config_fingerprint(self.config, models), file_ext)
+            output_path = self.redaction_engine.output_path_for(file_path, filename)
+            cached = await asyncio.to_thread(self.result_cache.get, cache_key, output_path)
+            if cached is None:
+                # Allocated again (possibly on another tier) by the redaction step
+                self.scratch.release(output_path)
+            else:
+                logger.info(f"Result cache hit for {filename}")
+                result = result_from_dict(cached)
+                result.filename = filename
+                result.output_path = output_path
+                result.summary["cache_hit"] = True
+                elapsed = round(time.monotonic() - started, 4)
+                result.summary["time_to_first_page_s"] = elapsed
+                result.summary["completion_s"] = elapsed
+                return result
+        
+        # Bound the number of documents in flight; the rest wait here
+        async with self.executors.job_slots:
+            logger.info(f"Processing document: {filename}")
+            if file_ext == '.pdf':
+                result = await self._process_pdf(file_path, filename)
+            else:
+                result = await self._process_image(file_path, filename)
+        
+        if cache_key is not None:
+            await asyncio.to_thread(self.result_cache.put, cache_key, result)
+        return result
     
     async def _process_pdf(self, file_path: str, filename: str) -> ProcessResult:
         """Process PDF document"""
-        import fitz  # PyMuPDF
+        copy_counter = CopyCounter()
+        # One policy snapshot for the whole document
+        policies = self.config.policies
         
-        detections = []
-        audit_entries = []
+        # The input path is unique per job, so it doubles as the scheduling key
+        job_key = file_path
         
         try:
-            # Open PDF
-            doc = fitz.open(file_path)
-            total_pages = len(doc)
+            doc = await self.executors.run(self.executors.pdf, self._open_pdf, file_path)
+            try:
+                total_pages = len(doc)
+                units = self._units(total_pages)
+                timing = self.page_scheduler.register(job_key, len(units))
+                if not self.executors.has_processes or total_pages < self.shard_min_pages:
+                    # Short documents stay here: shipping them to processes costs more than it saves
+                    detections = await self._detect_pdf(doc, job_key, units, copy_counter)
+                elif self.render_mode == "parent":
+                    # Rendered here, detected in worker processes reading the raster ring
+                    detections = await self._detect_pdf_ring(doc, job_key, units, copy_counter)
+                else:
+                    # Python-heavy detection goes to worker processes, one page unit at a time;
+                    # they open the file themselves
+                    await self.executors.run(self.executors.pdf, doc.close)
+                    detections = await self._detect_pages_sharded(file_path, units, copy_counter)
+            finally:
+                self.page_scheduler.unregister(job_key)
+                if not doc.is_closed:
+                    await self.executors.run(self.executors.pdf, doc.close)
             
-            for page_num in range(total_pages):
-                page = doc[page_num]
-                
-                # Extract text and images from page
-                text_blocks = page.get_text("dict")
-                page_image = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                
-                # Detect text PII
-                page_text = page.get_text()
-                text_detections = await self.text_detector.detect_pii(
-                    page_text, page_num
-                )
-                detections.extend(text_detections)
-                
-                # Detect visual PII (convert page to image)
-                img_data = page_image.tobytes()
-                visual_detections = await self.visual_detector.detect_pii(
-                    img_data, page_num
-                )
-                detections.extend(visual_detections)
-            
-            doc.close()
-            
-            # Create audit entries
-            for detection in detections:
-                audit_entries.append(AuditEntry(
-                    pii_type=detection.pii_type.value,
-                    method=self.config.policies.get(detection.pii_type.value, "mask"),
-                    bbox={
-                        "x": detection.bbox.x,
-                        "y": detection.bbox.y,
-                        "width": detection.bbox.width,
-                        "height": detection.bbox.height
-                    },
-                    page=detection.page,
-                    confidence=detection.confidence,
-                    timestamp=datetime.now().isoformat()
-                ))
+            # Repeated visual hits on one object are one detection
+            detections = suppress_duplicates(detections, self.nms_iou)
+            
+            # Create audit entries, one timestamp for the whole document
+            audit_entries = detections.audit_entries(policies, datetime.now().isoformat())
             
             # Apply redaction
-            output_path = await self.redaction_engine.redact_pdf(
-                file_path, detections, filename
+            output_path = await self.executors.run(
+                self.executors.pdf, self.redaction_engine.redact_pdf,
+                file_path, detections, filename, policies
             )
             
             # Create summary
-            summary = self._create_summary(detections, total_pages)
+            summary = self._create_summary(detections, total_pages, copy_counter)
+            summary.update(self._latency(timing.started_at, timing.first_unit_at))
             
             return ProcessResult(
                 job_id="",  # Will be set by caller
@@ -99,86 +190,246 @@ class DocumentProcessor:
                 detections_count=len(detections),
                 audit_entries=audit_entries,
                 output_path=output_path,
-                summary=summary
+                summary=summary,
+                policy_version=policies.version
             )
-            
+        
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
             raise
     
+    def _open_pdf(self, file_path: str):
+        """Open a PDF (runs on the pdf thread, which must also close it)"""
+        import fitz  # PyMuPDF
+        
+        return fitz.open(file_path)
+    
+    def _units(self, total_pages: int) -> List[tuple]:
+        """Page units of processing.pages_per_unit pages"""
+        return page_shards.plan_page_units(total_pages, self.pages_per_unit)
+    
+    async def _detect_pdf(self, doc, job_key: str, units: List[tuple],
+                          copy_counter: CopyCounter) -> DetectionSet:
+        """Detect PII unit by unit on the pdf thread, taking turns with other jobs"""
+        unit_sets = []
+        for start, stop in units:
+            unit_sets.append(await self.page_scheduler.run(job_key, functools.partial(
+                self.executors.run, self.executors.pdf, page_shards.detect_pages,
+                doc, start, stop, self.text_detector, self.visual_detector, copy_counter,
+                self.ocr, self.render_planner
+            )))
+        return DetectionSet.concat(unit_sets)
+    
+    async def _detect_pdf_ring(self, doc, job_key: str, units: List[tuple],
+                               copy_counter: CopyCounter) -> DetectionSet:
+        """Render units on the pdf thread into the raster ring and detect them in worker processes"""
+        ring = self.raster_ring
+        
+        async def run_unit(start: int, stop: int) -> DetectionSet:
+            # Waits while the ring is full: rendering never runs ahead of detection
+            slots = await ring.acquire(stop - start)
+            try:
+                pages = await self.executors.run(
+                    self.executors.pdf, page_shards.render_to_ring, doc, start, stop, ring, slots,
+                    self.render_planner, self.visual_detector.enabled, self.ocr
+                )
+                for page in pages:
+                    # One copy per rendered page: pixmap samples into the slot (or a pickled array)
+                    if page.raster is not None:
+                        copy_counter.add(page.page_num, math.prod(page.raster.shape))
+                return await self.executors.run(
+                    self.executors.detect, page_shards.detect_rendered_pages, pages
+                )
+            finally:
+                await ring.release(slots)
+        
+        unit_sets = await asyncio.gather(*(
+            self.page_scheduler.run(job_key, functools.partial(run_unit, start, stop))
+            for start, stop in units
+        ))
+        logger.info(f"Detected PII on {len(units)} page units through the raster ring")
+        return DetectionSet.concat(list(unit_sets))
+    
+    async def _detect_pages_sharded(self, file_path: str, units: List[tuple],
+                                    copy_counter: CopyCounter) -> DetectionSet:
+        """Detect PII on page units in worker processes, taking turns with other jobs"""
+        futures = [
+            self.page_scheduler.run(file_path, functools.partial(
+                self.executors.run, self.executors.detect,
+                page_shards.detect_page_range, file_path, start, stop
+            ))
+            for start, stop in units
+        ]
+        
+        # gather keeps unit order, and units are contiguous, so pages stay in order
+        unit_sets = []
+        for unit_set, page_copies in await asyncio.gather(*futures):
+            unit_sets.append(unit_set)
+            copy_counter.update(page_copies)
+        
+        logger.info(f"Detected PII on {len(units)} page units")
+        return DetectionSet.concat(unit_sets)
+    
     async def _process_image(self, file_path: str, filename: str) -> ProcessResult:
         """Process image file"""
-        from PIL import Image
-        
-        detections = []
-        audit_entries = []
+        copy_counter = CopyCounter()
+        policies = self.config.policies
+        started = time.monotonic()
         
         try:
-            # Open image
-            with Image.open(file_path) as img:
-                # Convert to RGB if needed
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Detect text PII (OCR first)
-                # For now, skip OCR and focus on visual PII
-                
-                # Detect visual PII
-                img_bytes = img.tobytes()
-                visual_detections = await self.visual_detector.detect_pii(
-                    img_bytes, 0
+            # Huge scans are decoded, detected and redacted in bands of rows
+            frames, tiled = await self.executors.run(self.executors.image, self._inspect_image, file_path)
+            detect = self._detect_image_tiled if tiled else self._detect_image
+            redact = self.redaction_engine.redact_image_tiled if tiled else self.redaction_engine.redact_image
+            
+            # Frames of a multi-page TIFF are detected in parallel on the image threads
+            finished_at: List[float] = []
+            
+            async def detect_frame(frame: int) -> DetectionSet:
+                frame_set = await self.executors.run(
+                    self.executors.image, detect, file_path, copy_counter, frame
                 )
-                detections.extend(visual_detections)
-            
-            # Create audit entries
-            for detection in detections:
-                audit_entries.append(AuditEntry(
-                    pii_type=detection.pii_type.value,
-                    method=self.config.policies.get(detection.pii_type.value, "mask"),
-                    bbox={
-                        "x": detection.bbox.x,
-                        "y": detection.bbox.y,
-                        "width": detection.bbox.width,
-                        "height": detection.bbox.height
-                    },
-                    page=detection.page,
-                    confidence=detection.confidence,
-                    timestamp=datetime.now().isoformat()
-                ))
+                finished_at.append(time.monotonic())
+                return frame_set
+            
+            detections = DetectionSet.concat(
+                await asyncio.gather(*(detect_frame(frame) for frame in range(frames)))
+            )
+            detected_at = min(finished_at)
+            
+            # Repeated visual hits on one object are one detection
+            detections = suppress_duplicates(detections, self.nms_iou)
+            
+            # Create audit entries, one timestamp for the whole document
+            audit_entries = detections.audit_entries(policies, datetime.now().isoformat())
             
             # Apply redaction
-            output_path = await self.redaction_engine.redact_image(
-                file_path, detections, filename
+            output_path = await self.executors.run(
+                self.executors.image, redact, file_path, detections, filename, policies
             )
             
             # Create summary
-            summary = self._create_summary(detections, 1)
+            summary = self._create_summary(detections, frames, copy_counter)
+            summary.update(self._latency(started, detected_at))
+            summary["tiled"] = tiled
             
             return ProcessResult(
                 job_id="",
                 filename=filename,
-                total_pages=1,
+                total_pages=frames,
                 detections_count=len(detections),
                 audit_entries=audit_entries,
                 output_path=output_path,
-                summary=summary
+                summary=summary,
+                policy_version=policies.version
             )
-            
+        
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
             raise
     
-    def _create_summary(self, detections: List[PIIDetection], total_pages: int) -> Dict[str, Any]:
+    def _inspect_image(self, file_path: str) -> Tuple[int, bool]:
+        """Frame count, and whether the image is a single-frame TIFF big enough to process in bands"""
+        from PIL import Image
+        
+        with Image.open(file_path) as img:
+            frames = getattr(img, "n_frames", 1)
+            tiled = (
+                frames == 1 and img.format == "TIFF"
+                and img.width * img.height >= self.tile_min_pixels
+            )
+        return frames, tiled
+    
+    def _detect_image_tiled(self, file_path: str, copy_counter: CopyCounter, frame: int = 0) -> DetectionSet:
+        """Detect PII band by band (runs on an image thread)
+        
+        Bands overlap by tiles.overlap_px rows so an object cut by a band
+        edge is still seen whole in one of them; the duplicate visual hits
+        this produces are removed by NMS afterwards. Each band is OCR'd in
+        image pixels too and keeps the text lines whose top edge lies below
+        its first row and above the next band's first row. A line cut by a
+        band's top edge therefore belongs to the band above, and a line
+        starting just above the next band's first row reaches at most
+        overlap_px rows past it: every line up to overlap_px tall is read
+        whole exactly once. Taller lines are read cut by the band's bottom
+        edge, with a warning.
+        """
+        band_sets = []
+        with StripSource(file_path, frame) as source:
+            for y0, y1 in iter_bands(source.height, self.tile_height, self.tile_overlap):
+                raster = from_pil(source.read(y0, y1))
+                copy_counter.add(frame, raster.bytes_copied)
+                band = DetectionSet.from_detections(self.visual_detector.detect_pii(raster, frame))
+                band.rows["y"] += y0
+                band_sets.append(band)
+                
+                plan = RenderPlan(1.0, (0, y0, source.width, y1), origin=(0, y0))
+                ocr_layer = self.ocr.read([raster.array], [[plan.clip]], [plan])[0]
+                if ocr_layer is not None:
+                    # Box edges are clamped to the band, so a line cut by the top edge starts exactly at y0
+                    owned = ocr_layer.lines_starting(y0 + 1 if y0 else 0, y0 + self.tile_height + 1)
+                    if y1 < source.height:
+                        cut = sum(1 for _, bottom in owned.line_extents().values() if bottom >= y1 - 1)
+                        if cut:
+                            logger.warning(f"{cut} text lines of {file_path} are taller than tiles.overlap_px "
+                                           f"and were read cut at row {y1}")
+                    if owned.text:
+                        band_sets.append(DetectionSet.from_detections(
+                            self.text_detector.detect_pii(owned.text, frame, owned)
+                        ))
+        
+        return DetectionSet.concat(band_sets)
+    
+    def _detect_image(self, file_path: str, copy_counter: CopyCounter, frame: int = 0) -> DetectionSet:
+        """Detect PII in one frame of an image file (runs on an image thread)"""
+        from PIL import Image
+        
+        detections = []
+        
+        # Open image; each call opens its own handle so frames can run concurrently
+        with Image.open(file_path) as img:
+            if frame:
+                img.seek(frame)
+            
+            # Convert to RGB if needed
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+            raster = from_pil(img)
+            copy_counter.add(frame, raster.bytes_copied)
+            
+            # Images have no text layer: OCR the whole frame, in image pixels
+            ocr_layer = self.ocr.read(
+                [raster.array], [[(0, 0, img.width, img.height)]], [RenderPlan(1.0, (0, 0, img.width, img.height))]
+            )[0]
+            if ocr_layer is not None and ocr_layer.text:
+                detections.extend(self.text_detector.detect_pii(ocr_layer.text, frame, ocr_layer))
+            
+            # Detect visual PII
+            visual_detections = self.visual_detector.detect_pii(
+                raster, frame
+            )
+            detections.extend(visual_detections)
+        
+        return DetectionSet.from_detections(detections)
+    
+    def _latency(self, started: float, first_page_at: Optional[float]) -> Dict[str, Any]:
+        """Time to first detected page and to the finished output, in seconds"""
+        return {
+            "time_to_first_page_s": round(first_page_at - started, 4) if first_page_at else None,
+            "completion_s": round(time.monotonic() - started, 4)
+        }
+    
+    def _create_summary(self, detections: DetectionSet, total_pages: int,
+                        copy_counter: Optional[CopyCounter] = None) -> Dict[str, Any]:
         """Create processing summary"""
-        pii_counts = {}
-        for detection in detections:
-            pii_type = detection.pii_type.value
-            pii_counts[pii_type] = pii_counts.get(pii_type, 0) + 1
+        pii_counts = detections.type_counts()
         
         return {
             "total_pages": total_pages,
             "total_detections": len(detections),
             "pii_types_found": list(pii_counts.keys()),
             "pii_counts": pii_counts,
+            "raster_bytes_copied": copy_counter.total if copy_counter else 0,
             "processing_complete": True
         }
\ No newline at end of file
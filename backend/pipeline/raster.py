@@ -0,0 +1,75 @@
+import logging
+from typing import Any, Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class RasterView:
+    """Read-only (height, width, channels) uint8 view of a page raster
+    
+    The view aliases the source buffer, so the source object (pixmap or
+    image) is kept alive for as long as the view is.
+    """
+    
+    def __init__(self, array: np.ndarray, source: Any = None, bytes_copied: int = 0):
+        self.array = array
+        self.source = source
+        self.bytes_copied = bytes_copied
+    
+    @property
+    def height(self) -> int:
+        return self.array.shape[0]
+    
+    @property
+    def width(self) -> int:
+        return self.array.shape[1]
+    
+    @property
+    def channels(self) -> int:
+        return self.array.shape[2]
+    
+    @property
+    def nbytes(self) -> int:
+        return self.array.nbytes
+
+def from_pixmap(pixmap) -> RasterView:
+    """Wrap Pixmap.samples in an array without encoding or copying"""
+    # samples_mv is a memoryview on the pixmap's own buffer; rows may be padded,
+    # so the row stride comes from the pixmap rather than width * n
+    array = np.ndarray(
+        shape=(pixmap.height, pixmap.width, pixmap.n),
+        dtype=np.uint8,
+        buffer=pixmap.samples_mv,
+        strides=(pixmap.stride, pixmap.n, 1)
+    )
+    array.flags.writeable = False
+    return RasterView(array, source=pixmap)
+
+def from_pil(img) -> RasterView:
+    """Wrap a PIL image in an array
+    
+    Pillow does not expose its pixel storage through the buffer protocol, so
+    this costs exactly one copy of the decoded pixels, which is counted.
+    """
+    array = np.asarray(img)
+    if array.ndim == 2:
+        array = array[:, :, np.newaxis]
+    return RasterView(array, source=img, bytes_copied=array.nbytes)
+
+class CopyCounter:
+    """Bytes copied per page while handing rasters to detectors"""
+    
+    def __init__(self):
+        self.pages: Dict[int, int] = {}
+    
+    def add(self, page_num: int, nbytes: int) -> None:
+        self.pages[page_num] = self.pages.get(page_num, 0) + nbytes
+    
+    def update(self, pages: Dict[int, int]) -> None:
+        for page_num, nbytes in pages.items():
+            self.add(page_num, nbytes)
+    
+    @property
+    def total(self) -> int:
+        return sum(self.pages.values())
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SlotRef(NamedTuple):
+    """Where a raster sits in a ring: what a detection process receives instead of the pixels"""
+    name: str
+    offset: int
+    shape: Tuple[int, int, int]
+
+# Rings this process has attached to, by shared memory name
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+class RasterRing:
+    """Fixed-size slots in one shared memory block, for handing page rasters to other processes
+    
+    The renderer copies a page's samples into a free slot and sends only a
+    SlotRef; a detection process maps the same memory and reads the pixels
+    as a NumPy view, so a 30 MB page is never pickled through a pipe.
+    
+    Slots are recycled explicitly: acquire() hands out free slots and waits
+    while too few are left, which is the backpressure that stops rendering
+    from running ahead of detection, and release() returns it once the
+    detection that reads it has finished. Only the owning process acquires
+    and releases; readers never write.
+    """
+    
+    def __init__(self, slots: int, slot_bytes: int):
+        self.slots = max(1, slots)
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * slot_bytes)
+        self._free: List[int] = list(range(self.slots))
+        self._changed: Optional[asyncio.Condition] = None
+    
+    @property
+    def changed(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+    
+    @property
+    def in_use(self) -> int:
+        return self.slots - len(self._free)
+    
+    async def acquire(self, count: int = 1) -> List[int]:
+        """`count` free slots, waiting until that many have been released if necessary
+        
+        Slots are taken all at once, so callers needing several (one per page
+        of a unit) never sit on part of the ring while waiting for the rest.
+        """
+        if count > self.slots:
+            raise ValueError(f"Cannot take {count} slots from a ring of {self.slots}")
+        async with self.changed:
+            await self.changed.wait_for(lambda: len(self._free) >= count)
+            taken, self._free = self._free[:count], self._free[count:]
+            return taken
+    
+    async def release(self, slots: List[int]) -> None:
+        """Return slots whose readers have finished"""
+        async with self.changed:
+            self._free.extend(slots)
+            self.changed.notify_all()
+    
+    def fits(self, array: np.ndarray) -> bool:
+        return array.nbytes <= self.slot_bytes
+    
+    def write(self, slot: int, array: np.ndarray) -> SlotRef:
+        """Copy an (H, W, C) uint8 raster into a slot, packed row after row"""
+        if not self.fits(array):
+            raise ValueError(f"Raster of {array.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+        offset = slot * self.slot_bytes
+        view = np.ndarray(array.shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+        view[...] = array
+        del view
+        return SlotRef(self.shm.name, offset, tuple(array.shape))
+    
+    def close(self) -> None:
+        """Free the shared memory; processes still attached keep their mapping until they exit"""
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def read_slot(ref: SlotRef) -> np.ndarray:
+    """Read-only view of the raster a SlotRef points at, from any process"""
+    shm = _attached.get(ref.name)
+    if shm is None:
+        # Readers are children of the creator and share its resource tracker,
+        # so attaching re-registers a name it already holds and is harmless
+        shm = shared_memory.SharedMemory(name=ref.name)
+        _attached[ref.name] = shm
+    array = np.ndarray(ref.shape, dtype=np.uint8, buffer=shm.buf, offset=ref.offset)
+    array.flags.writeable = False
+    return array
@@ -1,51 +1,68 @@
 import os
 import logging
-from typing import List
+from typing import Dict, Iterable, List, Optional, Union
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFilter
+from PIL import Image, ImageDraw, ImageFilter, ImageSequence, TiffImagePlugin
 
 from .models import PIIDetection, PIIType
-from .config import Config
+from .detections import DetectionSet
+from .geometry import Region, redaction_regions
+from .pdf_writer import save_options
+from .tiles import StripSource, StripTiffWriter, iter_bands
+from .config import Config, PolicySet
+from .scratch import ScratchStorage
 
 logger = logging.getLogger(__name__)
 
 class RedactionEngine:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, scratch: Optional[ScratchStorage] = None):
         self.config = config
+        self.scratch = scratch or ScratchStorage.from_config(config)
         self.padding_px = config.get("redaction.padding_px", 4)
-        self.policies = config.policies
+        self.merge_gap_px = config.get("redaction.merge_gap_px", 2)
+        self.merge_slack = config.get("redaction.merge_slack", 0.25)
+        self.save_options = save_options(config)
+        self.tile_height = config.get("tiles.height_px", 1024)
+        self.tile_rows_per_strip = config.get("tiles.rows_per_strip", 64)
     
-    async def redact_pdf(self, input_path: str, detections: List[PIIDetection], filename: str) -> str:
-        """Redact PDF document"""
+    @property
+    def policies(self) -> PolicySet:
+        """Current policy snapshot; callers should pass one per document"""
+        return self.config.policies
+    
+    def output_path_for(self, input_path: str, filename: str) -> str:
+        """Allocate the output location for a job's redacted document"""
+        job_id = os.path.basename(input_path).split('_')[0]
+        return self.scratch.output_path(job_id, filename, size_hint=os.path.getsize(input_path))
+    
+    def regions(self, detections: Union[DetectionSet, Iterable[PIIDetection]], policies: PolicySet):
+        """Padded redaction rectangles per page, overlapping boxes merged per method"""
+        if not isinstance(detections, DetectionSet):
+            detections = DetectionSet.from_detections(detections)
+        return redaction_regions(
+            detections, policies, self.padding_px, self.merge_gap_px, self.merge_slack
+        )
+    
+    def redact_pdf(self, input_path: str, detections: Union[DetectionSet, List[PIIDetection]], filename: str,
+                   policies: Optional[PolicySet] = None) -> str:
+        """Redact PDF document (blocking; callers run it on the pdf thread)"""
         import fitz  # PyMuPDF
         
+        if policies is None:
+            policies = self.policies
+        
         try:
-            # Open PDF
-            doc = fitz.open(input_path)
+            # Merged rectangles per page
+            page_regions = self.regions(detections, policies)
             
-            # Group detections by page
-            page_detections = {}
-            for detection in detections:
-                page_num = detection.page
-                if page_num not in page_detections:
-                    page_detections[page_num] = []
-                page_detections[page_num].append(detection)
-            
-            # Apply redaction to each page
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                if page_num in page_detections:
-                    for detection in page_detections[page_num]:
-                        method = self.policies.get(detection.pii_type.value, "mask")
-                        
+            with fitz.open(input_path) as doc:
+                # Only pages with something to redact are touched
+                for page_num in sorted(page_regions):
+                    page = doc[page_num]
+                    
+                    for method, box in page_regions[page_num]:
                         # Create redaction rectangle
-                        rect = fitz.Rect(
-                            detection.bbox.x - self.padding_px,
-                            detection.bbox.y - self.padding_px,
-                            detection.bbox.x + detection.bbox.width + self.padding_px,
-                            detection.bbox.y + detection.bbox.height + self.padding_px
-                        )
+                        rect = fitz.Rect(*box)
                         
                         if method == "mask":
                             # Add black rectangle
@@ -56,65 +73,136 @@ class RedactionEngine:
                         elif method == "replace":
                             # Replace with placeholder text
                             page.add_redact_annot(rect, text="[REDACTED]", fill=(1, 1, 1))
+                    
+                    # Apply redactions
+                    page.apply_redactions()
                 
-                # Apply redactions
-                page.apply_redactions()
-            
-            # Save redacted PDF
-            job_id = os.path.basename(input_path).split('_')[0]
-            output_path = f"output/{job_id}_redacted_{filename}"
-            doc.save(output_path)
-            doc.close()
+                # Save redacted PDF
+                output_path = self.output_path_for(input_path, filename)
+                with self.scratch.atomic_write(output_path) as tmp_path:
+                    doc.save(tmp_path, **self.save_options)
             
             logger.info(f"PDF redaction completed: {output_path}")
             return output_path
-            
+        
         except Exception as e:
             logger.error(f"Error redacting PDF: {str(e)}")
             raise
     
-    async def redact_image(self, input_path: str, detections: List[PIIDetection], filename: str) -> str:
-        """Redact image file"""
+    def redact_image(self, input_path: str, detections: Union[DetectionSet, List[PIIDetection]], filename: str,
+                     policies: Optional[PolicySet] = None) -> str:
+        """Redact image file (blocking; callers run it on an image thread)"""
+        if policies is None:
+            policies = self.policies
+        
         try:
             # Open image
             with Image.open(input_path) as img:
-                # Convert to RGB if needed
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Create drawing context
-                draw = ImageDraw.Draw(img)
+                output_path = self.output_path_for(input_path, filename)
                 
-                # Apply redactions
-                for detection in detections:
-                    method = self.policies.get(detection.pii_type.value, "mask")
+                if img.format == "TIFF":
+                    # Every frame, each with the regions of its own page
+                    with self.scratch.atomic_write(output_path) as tmp_path:
+                        self._redact_tiff_frames(img, self.regions(detections, policies), tmp_path)
+                else:
+                    # Convert to RGB if needed
+                    if img.mode != 'RGB':
+                        img = img.convert('RGB')
                     
-                    # Calculate coordinates with padding
-                    x1 = max(0, detection.bbox.x - self.padding_px)
-                    y1 = max(0, detection.bbox.y - self.padding_px)
-                    x2 = min(img.width, detection.bbox.x + detection.bbox.width + self.padding_px)
-                    y2 = min(img.height, detection.bbox.y + detection.bbox.height + self.padding_px)
+                    # Apply redactions
+                    regions = [region for page in self.regions(detections, policies).values() for region in page]
+                    self._draw_regions(img, regions)
                     
-                    if method == "mask":
-                        # Draw black rectangle
-                        draw.rectangle([x1, y1, x2, y2], fill=(0, 0, 0))
-                    elif method == "blur":
-                        # Extract region, blur it, and paste back
-                        region = img.crop((x1, y1, x2, y2))
-                        blurred = region.filter(ImageFilter.GaussianBlur(radius=10))
-                        img.paste(blurred, (x1, y1))
-                    elif method == "replace":
-                        # Draw white rectangle
-                        draw.rectangle([x1, y1, x2, y2], fill=(255, 255, 255))
-                
-                # Save redacted image
-                job_id = os.path.basename(input_path).split('_')[0]
-                output_path = f"output/{job_id}_redacted_{filename}"
-                img.save(output_path)
+                    # Save redacted image
+                    with self.scratch.atomic_write(output_path) as tmp_path:
+                        img.save(tmp_path)
             
             logger.info(f"Image redaction completed: {output_path}")
             return output_path
+        
+        except Exception as e:
+            logger.error(f"Error redacting image: {str(e)}")
+            raise
+    
+    def _redact_tiff_frames(self, img: Image.Image, regions: Dict[int, List[Region]], output_path: str) -> None:
+        """Redact a (multi-page) TIFF frame by frame into a new TIFF
+        
+        Only one frame is decoded at a time. Each keeps the compression and
+        resolution of its source frame; bilevel and grey frames are painted
+        in RGB and converted back, so fax compression (group3/group4) still
+        applies to them.
+        """
+        with TiffImagePlugin.AppendingTiffWriter(output_path, new=True) as tf:
+            for page, frame in enumerate(ImageSequence.Iterator(img)):
+                redacted = frame.convert('RGB')
+                self._draw_regions(redacted, regions.get(page, []))
+                if frame.mode in ('1', 'L'):
+                    redacted = redacted.convert(frame.mode)
+                
+                options = {"compression": frame.info.get("compression", "raw")}
+                if "dpi" in frame.info:
+                    options["dpi"] = frame.info["dpi"]
+                redacted.save(tf, format="TIFF", **options)
+                tf.newFrame()
+    
+    def _draw_regions(self, img: Image.Image, regions: List[Region]) -> None:
+        """Paint redaction regions onto an RGB image in place"""
+        # Create drawing context
+        draw = ImageDraw.Draw(img)
+        
+        for method, (x1, y1, x2, y2) in regions:
+            # Clip the padded rectangle to the image
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(img.width, x2), min(img.height, y2)
+            if x2 <= x1 or y2 <= y1:
+                continue
             
+            if method == "mask":
+                # Draw black rectangle
+                draw.rectangle([x1, y1, x2, y2], fill=(0, 0, 0))
+            elif method == "blur":
+                # Extract region, blur it, and paste back
+                region = img.crop((x1, y1, x2, y2))
+                blurred = region.filter(ImageFilter.GaussianBlur(radius=10))
+                img.paste(blurred, (x1, y1))
+            elif method == "replace":
+                # Draw white rectangle
+                draw.rectangle([x1, y1, x2, y2], fill=(255, 255, 255))
+    
+    def redact_image_tiled(self, input_path: str, detections: Union[DetectionSet, List[PIIDetection]],
+                           filename: str, policies: Optional[PolicySet] = None) -> str:
+        """Redact a large image band by band, streaming the output as a TIFF
+        
+        Only one band of rows is decoded (for uncompressed sources) and
+        held at a time; each is redacted with the regions that cross it and
+        written straight out. Regions spanning a band edge are redacted in
+        parts, so a blur is computed per band.
+        """
+        if policies is None:
+            policies = self.policies
+        
+        regions = [region for page in self.regions(detections, policies).values() for region in page]
+        
+        try:
+            with StripSource(input_path) as source:
+                output_path = self.output_path_for(input_path, filename)
+                with self.scratch.atomic_write(output_path) as tmp_path, open(tmp_path, 'wb') as f:
+                    writer = StripTiffWriter(f, source.width, source.height, self.tile_rows_per_strip,
+                                             dpi=source.info.get("dpi"))
+                    for top, bottom in iter_bands(source.height, self.tile_height):
+                        band = source.read(top, bottom)
+                        # Band-local copies of the regions that cross it
+                        crossing = [
+                            (method, (x1, y1 - top, x2, y2 - top))
+                            for method, (x1, y1, x2, y2) in regions if y1 < bottom and y2 > top
+                        ]
+                        self._draw_regions(band, crossing)
+                        writer.write_rows(band)
+                    writer.close()
+            
+            logger.info(f"Tiled image redaction completed: {output_path}")
+            return output_path
+        
         except Exception as e:
             logger.error(f"Error redacting image: {str(e)}")
             raise
@@ -0,0 +1,103 @@
+import logging
+import math
+from dataclasses import dataclass, replace
+from typing import List, Optional, Tuple
+
+from .config import Config
+from .models import BoundingBox
+from .raster import RasterView, from_pixmap
+from .text_layer import Rect
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """How much of a PDF page to rasterize, and at how many pixels per point
+    
+    `origin` is the top-left pixel of the render in the scaled page, as
+    PyMuPDF rounds the clip outwards to whole pixels; it is filled in by
+    render_page so boxes map back to points exactly.
+    """
+    scale: float
+    clip: Rect
+    origin: Tuple[int, int] = (0, 0)
+    
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Approximate width and height of the render in pixels"""
+        x0, y0, x1, y1 = self.clip
+        return math.ceil((x1 - x0) * self.scale), math.ceil((y1 - y0) * self.scale)
+    
+    def to_points(self, x0: float, y0: float, x1: float, y1: float) -> Rect:
+        """A box in render pixels as page points"""
+        ox, oy = self.origin
+        return ((ox + x0) / self.scale, (oy + y0) / self.scale, (ox + x1) / self.scale, (oy + y1) / self.scale)
+    
+    def to_pixels(self, rect: Rect) -> Tuple[int, int, int, int]:
+        """A page rectangle as the render pixels covering it (not clipped to the render)"""
+        x0, y0, x1, y1 = rect
+        ox, oy = self.origin
+        return (math.floor(x0 * self.scale) - ox, math.floor(y0 * self.scale) - oy,
+                math.ceil(x1 * self.scale) - ox, math.ceil(y1 * self.scale) - oy)
+    
+    def bbox_to_points(self, bbox: BoundingBox) -> BoundingBox:
+        """A BoundingBox in render pixels as the smallest integer box of page points holding it"""
+        x0, y0, x1, y1 = self.to_points(bbox.x, bbox.y, bbox.x + bbox.width, bbox.y + bbox.height)
+        x, y = math.floor(x0), math.floor(y0)
+        return BoundingBox(x=x, y=y, width=math.ceil(x1) - x, height=math.ceil(y1) - y)
+
+class RenderPlanner:
+    """Picks each page's render scale and clip from its size and what will read the pixels
+    
+    Visual models letterbox every raster to visual.input_size, so pixels
+    beyond input_size * render.oversample on the long side are wasted; an
+    A0 drawing renders far below 2x and a small receipt above it. OCR
+    needs a fixed resolution for text whatever the page size
+    (ocr.render_scale). The larger need wins, within render.min_scale and
+    render.max_scale, and no render exceeds render.max_mpx. Without visual
+    detection only the OCR regions are rendered, and a page nothing needs
+    pixels from is not rendered at all. render.scale fixes the scale
+    instead (2 is the former behaviour).
+    """
+    
+    def __init__(self, config: Config):
+        fixed = config.get("render.scale", "auto")
+        self.fixed_scale = None if fixed == "auto" else float(fixed)
+        self.visual_pixels = config.get("visual.input_size", 640) * config.get("render.oversample", 2.0)
+        self.ocr_scale = config.get("ocr.render_scale", 2.0)
+        self.min_scale = config.get("render.min_scale", 0.25)
+        self.max_scale = config.get("render.max_scale", 3.0)
+        self.max_pixels = config.get("render.max_mpx", 40) * 1_000_000
+    
+    def plan(self, page_rect: Rect, visual: bool, regions: List[Rect]) -> Optional[RenderPlan]:
+        """The render for a page with the given OCR regions; None when nothing needs pixels"""
+        if not visual and not regions:
+            return None
+        
+        x0, y0, x1, y1 = page_rect
+        if self.fixed_scale is not None:
+            scale = self.fixed_scale
+        else:
+            needs = []
+            if visual:
+                needs.append(self.visual_pixels / max(x1 - x0, y1 - y0, 1))
+            if regions:
+                needs.append(self.ocr_scale)
+            scale = min(self.max_scale, max(self.min_scale, max(needs)))
+        
+        if visual:
+            clip = (x0, y0, x1, y1)
+        else:
+            clip = (min(r[0] for r in regions), min(r[1] for r in regions),
+                    max(r[2] for r in regions), max(r[3] for r in regions))
+        area = (clip[2] - clip[0]) * (clip[3] - clip[1])
+        if area * scale * scale > self.max_pixels:
+            scale = math.sqrt(self.max_pixels / area)
+        return RenderPlan(scale, clip)
+
+def render_page(page, plan: RenderPlan) -> Tuple[RasterView, RenderPlan]:
+    """Render a plan's clip of a PyMuPDF page: a view of the pixmap and the plan with its pixel origin"""
+    import fitz  # PyMuPDF
+    
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(plan.scale, plan.scale), clip=fitz.Rect(plan.clip))
+    return from_pixmap(pixmap), replace(plan, origin=(pixmap.x, pixmap.y))
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .config import Config
+from .models import AuditEntry, ProcessResult
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pipeline changes what it produces for the same input and config
+CACHE_FORMAT_VERSION = 2
+
+# Config sections that do not change the redacted output or audit log
+_NON_OUTPUT_SECTIONS = {"processing", "server", "queue", "jobs", "io", "logs", "cache"}
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in large chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def config_fingerprint(config: Config, models: Optional[Dict[str, Any]] = None) -> str:
+    """Hash of the config sections, policies and models that affect processing output
+    
+    `models` is what the detectors actually resolved to (engine auto may
+    run models or fall back) with the digest of each model file, so that
+    installing or replacing a model does not serve stale results.
+    """
+    effective = {k: v for k, v in config.data.items() if k not in _NON_OUTPUT_SECTIONS}
+    payload = json.dumps(
+        {"format": CACHE_FORMAT_VERSION, "config": effective, "policies": config.policies.version,
+         "models": models},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResultCache:
+    """Content-addressed, size-bounded LRU cache of redacted outputs and results
+    
+    Each entry is two files under the cache directory, <key>.out (the redacted
+    document) and <key>.json (the ProcessResult). Recency is kept in memory
+    and mirrored to file mtimes so the LRU order survives restarts.
+    
+    Processes may share the directory (prefork server workers): entries
+    another process wrote are picked up on lookup, but each process keeps
+    its own index and evicts against its own max_bytes, so the budget is
+    split between them up front.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> bytes on disk
+        self._lock = threading.Lock()
+        self._load_index()
+    
+    @staticmethod
+    def make_key(content_sha256: str, fingerprint: str, file_ext: str) -> str:
+        return hashlib.sha256(f"{content_sha256}:{fingerprint}:{file_ext}".encode()).hexdigest()
+    
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        shard = self.directory / key[:2]
+        return shard / f"{key}.out", shard / f"{key}.json"
+    
+    def _load_index(self) -> None:
+        """Rebuild the LRU index from the files on disk, oldest first"""
+        if not self.directory.exists():
+            return
+        
+        entries = []
+        for meta_path in self.directory.glob("*/*.json"):
+            output_path = meta_path.with_suffix(".out")
+            if not output_path.exists():
+                meta_path.unlink(missing_ok=True)
+                continue
+            stat = meta_path.stat()
+            entries.append((stat.st_mtime, meta_path.stem, stat.st_size + output_path.stat().st_size))
+        
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+    
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._entries.values())
+    
+    def get(self, key: str, dest_path: str) -> Optional[Dict[str, Any]]:
+        """On a hit, place the cached output at dest_path and return the stored result"""
+        output_path, meta_path = self._paths(key)
+        with self._lock:
+            if key not in self._entries and not self._adopt(key):
+                self.misses += 1
+                return None
+            try:
+                result = json.loads(meta_path.read_text())
+                _link_or_copy(output_path, dest_path)
+                os.utime(meta_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return result
+    
+    def put(self, key: str, result: ProcessResult) -> None:
+        """Store a finished result and a copy of its output file"""
+        output_path, meta_path = self._paths(key)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        with self._lock:
+            # Other processes may store the same key at the same time
+            tmp_output = output_path.with_suffix(f".out.{os.getpid()}.tmp")
+            _link_or_copy(Path(result.output_path), str(tmp_output))
+            os.replace(tmp_output, output_path)
+            # Metadata is written last: an entry exists once its .json does
+            tmp_meta = meta_path.with_suffix(f".json.{os.getpid()}.tmp")
+            tmp_meta.write_text(json.dumps(asdict(result)))
+            os.replace(tmp_meta, meta_path)
+            
+            self._entries[key] = output_path.stat().st_size + meta_path.stat().st_size
+            self._entries.move_to_end(key)
+            self._evict()
+    
+    def _adopt(self, key: str) -> bool:
+        """Index an entry another process stored since this one started"""
+        output_path, meta_path = self._paths(key)
+        try:
+            size = meta_path.stat().st_size + output_path.stat().st_size
+        except OSError:
+            return False
+        self._entries[key] = size
+        self._evict()
+        return key in self._entries
+    
+    def _evict(self) -> None:
+        """Drop least recently used entries until under the size budget"""
+        total = self.total_bytes
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            self._remove(key)
+            self.evictions += 1
+            total -= size
+    
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        for path in self._paths(key):
+            # Another process may have evicted it already
+            path.unlink(missing_ok=True)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+def _link_or_copy(src: Path, dest: str) -> None:
+    """Hard-link src to dest when possible (outputs are never modified), else copy"""
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+def result_from_dict(data: Dict[str, Any]) -> ProcessResult:
+    """Rebuild a ProcessResult stored by the cache"""
+    data = dict(data)
+    data["audit_entries"] = [AuditEntry(**entry) for entry in data["audit_entries"]]
+    return ProcessResult(**data)
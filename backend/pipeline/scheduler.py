@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """Queue classes; lower values are served first"""
+    INTERACTIVE = 0
+    BULK = 1
+
+class QueueFull(Exception):
+    """Admission refused because the queue is at its maximum depth"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class JobScheduler:
+    """Bounded in-process priority queue drained by a fixed number of workers
+    
+    Jobs are admitted only while fewer than max_depth are waiting; within a
+    priority class they run in submission order.
+    """
+    
+    def __init__(self, handler: Callable[..., Awaitable[Any]], concurrency: int = 2,
+                 max_depth: int = 100, retry_after: int = 30):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.retry_after = retry_after
+        self._queue: List[Tuple[int, int, str, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+        # Counts queued entries; each worker takes one permit per job it pops
+        self._available = asyncio.Semaphore(0)
+        self._workers: List[asyncio.Task] = []
+        self.running: Dict[str, Priority] = {}
+    
+    @classmethod
+    def from_config(cls, config: Config, handler: Callable[..., Awaitable[Any]]) -> "JobScheduler":
+        return cls(
+            handler,
+            concurrency=config.get("processing.max_concurrent_jobs", 8),
+            max_depth=config.get("queue.max_depth", 100),
+            retry_after=config.get("queue.retry_after_s", 30)
+        )
+    
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+    
+    def submit(self, job_id: str, priority: Priority = Priority.INTERACTIVE, **payload) -> int:
+        """Queue a job and return its 1-based position, or raise QueueFull"""
+        if len(self._queue) >= self.max_depth:
+            raise QueueFull(self.retry_after)
+        
+        entry = (int(priority), next(self._seq), job_id, payload)
+        heapq.heappush(self._queue, entry)
+        self._available.release()
+        return self._position_of(entry)
+    
+    def _position_of(self, entry: Tuple) -> int:
+        return 1 + sum(1 for other in self._queue if other[:2] < entry[:2])
+    
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based queue position of a waiting job, None once it has started"""
+        for entry in self._queue:
+            if entry[2] == job_id:
+                return self._position_of(entry)
+        return None
+    
+    async def start(self) -> None:
+        """Start the worker tasks on the running loop"""
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.concurrency)
+        ]
+    
+    async def stop(self) -> None:
+        """Cancel the workers; jobs still queued are left queued"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    async def _worker(self, index: int) -> None:
+        while True:
+            await self._available.acquire()
+            priority, _, job_id, payload = heapq.heappop(self._queue)
+            
+            self.running[job_id] = Priority(priority)
+            try:
+                await self.handler(job_id, **payload)
+            except Exception as e:
+                logger.error(f"Worker {index} failed on job {job_id}: {str(e)}")
+            finally:
+                self.running.pop(job_id, None)
+
+@dataclass
+class JobTiming:
+    """Latency milestones of one job inside the page scheduler (time.monotonic)"""
+    started_at: float
+    units: int
+    units_done: int = 0
+    first_unit_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    
+    @property
+    def time_to_first_page(self) -> Optional[float]:
+        return None if self.first_unit_at is None else self.first_unit_at - self.started_at
+    
+    @property
+    def completion(self) -> Optional[float]:
+        return None if self.finished_at is None else self.finished_at - self.started_at
+
+class FairPageScheduler:
+    """Shares page-unit slots between concurrent jobs
+    
+    Every page unit (a few pages of detection, or a redaction pass) waits
+    for one of `slots` execution slots. A freed slot goes to the next job in
+    turn rather than the next request in line, so a job with a thousand
+    pages queued cannot starve a one-page job admitted after it.
+    
+    Policies:
+    - round_robin: jobs take turns, one unit each
+    - smallest_first: the job with the fewest remaining units goes next
+    """
+    
+    def __init__(self, slots: int = 1, policy: str = "round_robin"):
+        if policy not in ("round_robin", "smallest_first"):
+            raise ValueError(f"Unknown page scheduling policy: {policy}")
+        self.slots = slots
+        self.policy = policy
+        self._free = slots
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.timings: Dict[str, JobTiming] = {}
+    
+    def register(self, job_key: str, units: int) -> JobTiming:
+        """Start tracking a job that will run `units` page units"""
+        timing = JobTiming(started_at=time.monotonic(), units=units)
+        self.timings[job_key] = timing
+        return timing
+    
+    def unregister(self, job_key: str) -> Optional[JobTiming]:
+        """Stop tracking a job and return its timing"""
+        return self.timings.pop(job_key, None)
+    
+    async def run(self, job_key: str, make_unit: Callable[[], Awaitable[Any]]) -> Any:
+        """Wait for this job's turn, then await make_unit()"""
+        await self._acquire(job_key)
+        try:
+            return await make_unit()
+        finally:
+            self._release()
+            timing = self.timings.get(job_key)
+            if timing is not None:
+                now = time.monotonic()
+                timing.units_done += 1
+                if timing.first_unit_at is None:
+                    timing.first_unit_at = now
+                if timing.units_done >= timing.units:
+                    timing.finished_at = now
+    
+    async def _acquire(self, job_key: str) -> None:
+        if self._free > 0 and not self._waiting:
+            self._free -= 1
+            return
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(job_key, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as we were cancelled; pass it on
+                self._release()
+            raise
+    
+    def _next_job(self) -> str:
+        if self.policy == "smallest_first":
+            def remaining(job_key):
+                timing = self.timings.get(job_key)
+                return timing.units - timing.units_done if timing else 0
+            return min(self._waiting, key=remaining)
+        return next(iter(self._waiting))
+    
+    def _release(self) -> None:
+        """Hand the freed slot to the next job's oldest live waiter"""
+        while self._waiting:
+            job_key = self._next_job()
+            waiters = self._waiting.pop(job_key)
+            waiter = waiters.popleft()
+            if waiters:
+                # Back of the rotation for its next unit
+                self._waiting[job_key] = waiters
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._free += 1
@@ -0,0 +1,191 @@
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+class ScratchStorage:
+    """Job inputs and outputs, kept in tmpfs up to a byte budget and on disk beyond it
+    
+    Every path a job writes is allocated here rather than formatted by hand,
+    so callers never need to know which tier a file landed on.
+    """
+    
+    def __init__(self, disk_dir: str = "temp", output_dir: str = "output",
+                 ramdisk_dir: Optional[str] = None, ramdisk_budget: int = 0):
+        self.disk_dirs = {"input": Path(disk_dir), "output": Path(output_dir)}
+        self.ram_dirs: Dict[str, Path] = {}
+        self.ramdisk_budget = ramdisk_budget
+        self._ram_files: Dict[str, int] = {}  # path -> bytes accounted against the budget
+        self._reserved: Set[str] = set()  # ramdisk paths allocated by size hint, not written yet
+        self._lock = threading.Lock()
+        
+        for directory in self.disk_dirs.values():
+            directory.mkdir(parents=True, exist_ok=True)
+        
+        if ramdisk_dir and ramdisk_budget > 0 and Path(ramdisk_dir).parent.is_dir():
+            root = Path(ramdisk_dir)
+            self.ram_dirs = {"input": root / "input", "output": root / "output"}
+            for directory in self.ram_dirs.values():
+                directory.mkdir(parents=True, exist_ok=True)
+                # Files left by a previous run still occupy tmpfs
+                for entry in os.scandir(directory):
+                    if entry.is_file():
+                        self._ram_files[entry.path] = entry.stat().st_size
+        elif ramdisk_dir:
+            logger.warning(f"Ramdisk {ramdisk_dir} unavailable, scratch files go to disk")
+    
+    @classmethod
+    def from_config(cls, config: Config) -> "ScratchStorage":
+        use_ramdisk = config.get("io.use_ramdisk", True)
+        return cls(
+            disk_dir=config.get("io.scratch_dir", "temp"),
+            output_dir=config.get("io.output_dir", "output"),
+            ramdisk_dir=config.get("io.ramdisk_dir", "/dev/shm/docushield") if use_ramdisk else None,
+            ramdisk_budget=int(config.get("io.ramdisk_budget_mb", 512) * 1024 * 1024)
+        )
+    
+    @property
+    def ram_used(self) -> int:
+        with self._lock:
+            return sum(self._ram_files.values())
+    
+    def _try_reserve(self, path: str, nbytes: int) -> bool:
+        """Account nbytes more for a ramdisk path if the budget allows"""
+        with self._lock:
+            used = sum(self._ram_files.values())
+            if used + nbytes > self.ramdisk_budget:
+                used = self._forget_deleted()
+            if used + nbytes > self.ramdisk_budget:
+                return False
+            self._ram_files[path] = self._ram_files.get(path, 0) + nbytes
+            return True
+    
+    def _forget_deleted(self) -> int:
+        """Stop accounting for files deleted behind our back and return the bytes still used
+        
+        Another process sharing the ramdisk (a prefork worker evicting a job
+        this one wrote) removes files without releasing them here. Outputs
+        reserved but not written yet are kept. Called with the lock held,
+        only when the budget looks exhausted.
+        """
+        self._ram_files = {
+            path: nbytes for path, nbytes in self._ram_files.items()
+            if path in self._reserved or os.path.exists(path) or os.path.exists(f"{path}.part")
+        }
+        return sum(self._ram_files.values())
+    
+    def release(self, path: str) -> None:
+        """Stop accounting for a file (deleted, or moved off the scratch area)"""
+        with self._lock:
+            self._ram_files.pop(path, None)
+            self._reserved.discard(path)
+    
+    def allocate(self, kind: str, name: str, size_hint: int = 0) -> str:
+        """Path for a new `kind` ('input' or 'output') file, on tmpfs if size_hint fits"""
+        if kind in self.ram_dirs:
+            path = str(self.ram_dirs[kind] / name)
+            if self._try_reserve(path, size_hint):
+                if size_hint:
+                    with self._lock:
+                        self._reserved.add(path)
+                return path
+        return str(self.disk_dirs[kind] / name)
+    
+    def output_path(self, job_id: str, filename: str, size_hint: int = 0) -> str:
+        """Path for a job's redacted document"""
+        return self.allocate("output", f"{job_id}_redacted_{filename}", size_hint)
+    
+    def is_ram(self, path: str) -> bool:
+        return any(Path(path).parent == directory for directory in self.ram_dirs.values())
+    
+    @contextmanager
+    def atomic_write(self, final_path: str) -> Iterator[str]:
+        """Yield a temporary path next to final_path, renamed into place on success
+        
+        The temporary name keeps the extension so writers that infer the
+        format from it (PIL) still work.
+        """
+        final = Path(final_path)
+        tmp_path = str(final.with_name(f".tmp-{uuid.uuid4().hex[:8]}-{final.name}"))
+        try:
+            yield tmp_path
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self.release(final_path)
+            raise
+        
+        if self.is_ram(final_path):
+            # Replace the size hint with the real size
+            with self._lock:
+                self._ram_files[final_path] = os.path.getsize(final_path)
+                self._reserved.discard(final_path)
+    
+    def open_writer(self, kind: str, name: str) -> "SpillingWriter":
+        """Writer that starts on tmpfs and moves to disk if the budget runs out"""
+        return SpillingWriter(self, kind, name)
+    
+    def discard(self, path: str) -> None:
+        """Delete a scratch or output file and return its budget"""
+        if path and os.path.exists(path):
+            os.remove(path)
+        self.release(path)
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "ram_files": len(self._ram_files),
+                "ram_bytes": sum(self._ram_files.values()),
+                "ram_budget": self.ramdisk_budget if self.ram_dirs else 0
+            }
+
+class SpillingWriter:
+    """Sequential writer for a scratch file of unknown size"""
+    
+    def __init__(self, scratch: ScratchStorage, kind: str, name: str):
+        self.scratch = scratch
+        self.kind = kind
+        self.name = name
+        self.size = 0
+        self.final_path = scratch.allocate(kind, name, 0)
+        self.part_path = f"{self.final_path}.part"
+        self._file = open(self.part_path, "wb")
+    
+    def write(self, chunk: bytes) -> None:
+        if self.scratch.is_ram(self.final_path) and not self.scratch._try_reserve(self.final_path, len(chunk)):
+            self._spill()
+        self._file.write(chunk)
+        self.size += len(chunk)
+    
+    def _spill(self) -> None:
+        """Move what has been written so far from tmpfs to disk"""
+        self._file.close()
+        ram_part = self.part_path
+        self.scratch.release(self.final_path)
+        self.final_path = str(self.scratch.disk_dirs[self.kind] / self.name)
+        self.part_path = f"{self.final_path}.part"
+        shutil.move(ram_part, self.part_path)
+        self._file = open(self.part_path, "ab")
+        logger.info(f"Scratch budget exhausted, spilled {self.name} to disk after {self.size} bytes")
+    
+    def commit(self) -> str:
+        """Finish the file and rename it into place"""
+        self._file.close()
+        os.replace(self.part_path, self.final_path)
+        return self.final_path
+    
+    def abort(self) -> None:
+        """Drop the partial file"""
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+        self.scratch.release(self.final_path)
@@ -0,0 +1,101 @@
+import math
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+from .models import BoundingBox
+
+# (x0, y0, x1, y1) in PDF points
+Rect = Tuple[float, float, float, float]
+
+class TextLayer:
+    """Page text with word coordinates and a character offset -> bbox index"""
+    
+    def __init__(self, words: List[tuple]):
+        """Build from PyMuPDF word tuples (x0, y0, x1, y1, word, block_no, line_no, word_no)"""
+        parts = []
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.rects: List[Rect] = []
+        self.lines: List[Tuple[int, int]] = []
+        
+        offset = 0
+        prev_line = None
+        for x0, y0, x1, y1, word, block_no, line_no, _ in words:
+            line = (block_no, line_no)
+            if prev_line is not None:
+                # Words on one line are space separated, lines end with a newline
+                parts.append(" " if line == prev_line else "\n")
+                offset += 1
+            parts.append(word)
+            self.starts.append(offset)
+            self.ends.append(offset + len(word))
+            self.rects.append((x0, y0, x1, y1))
+            self.lines.append(line)
+            offset += len(word)
+            prev_line = line
+        
+        self.text = "".join(parts)
+    
+    @classmethod
+    def from_page(cls, page) -> "TextLayer":
+        """Extract the word layer of a PyMuPDF page (the only text extraction per page)"""
+        return cls(page.get_text("words", sort=False))
+    
+    def __len__(self) -> int:
+        return len(self.starts)
+    
+    def line_extents(self) -> Dict[Tuple[int, int], Tuple[float, float]]:
+        """Top and bottom edge of each line"""
+        extents: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        for (_, top, _, bottom), line in zip(self.rects, self.lines):
+            if line in extents:
+                top, bottom = min(top, extents[line][0]), max(bottom, extents[line][1])
+            extents[line] = (top, bottom)
+        return extents
+    
+    def lines_starting(self, y0: float, y1: float) -> "TextLayer":
+        """A layer of the lines whose top edge lies in [y0, y1)"""
+        extents = self.line_extents()
+        return TextLayer([
+            (*rect, self.text[start:end], *line, i)
+            for i, (start, end, rect, line) in enumerate(zip(self.starts, self.ends, self.rects, self.lines))
+            if y0 <= extents[line][0] < y1
+        ])
+    
+    def word_index(self, offset: int) -> int:
+        """Index of the word containing (or preceding) a character offset"""
+        return max(0, bisect_right(self.starts, offset) - 1)
+    
+    def span_rects(self, start: int, end: int) -> List[Rect]:
+        """Rectangles covering text[start:end], one per text line"""
+        if not self.starts or end <= start:
+            return []
+        
+        first = self.word_index(start)
+        if self.ends[first] <= start:
+            # Span starts in the separator after a word
+            first += 1
+        last = self.word_index(end - 1)
+        
+        rects: List[Rect] = []
+        current_line = None
+        for i in range(first, last + 1):
+            x0, y0, x1, y1 = self.rects[i]
+            if self.lines[i] == current_line:
+                px0, py0, px1, py1 = rects[-1]
+                rects[-1] = (min(px0, x0), min(py0, y0), max(px1, x1), max(py1, y1))
+            else:
+                rects.append((x0, y0, x1, y1))
+                current_line = self.lines[i]
+        return rects
+    
+    def span_boxes(self, start: int, end: int) -> List[BoundingBox]:
+        """Integer bounding boxes covering text[start:end], one per text line"""
+        return [to_bbox(rect) for rect in self.span_rects(start, end)]
+
+def to_bbox(rect: Rect) -> BoundingBox:
+    """Round a float rectangle outwards to an integer BoundingBox"""
+    x0, y0, x1, y1 = rect
+    x = math.floor(x0)
+    y = math.floor(y0)
+    return BoundingBox(x=x, y=y, width=math.ceil(x1) - x, height=math.ceil(y1) - y)
@@ -0,0 +1,186 @@
+import logging
+import math
+import os
+import struct
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Bits per pixel of the raw modes a band can be read from without a decoder
+_RAW_BITS = {"1": 1, "L": 8, "LA": 16, "RGB": 24, "RGBA": 32, "RGBX": 32, "CMYK": 32}
+
+def iter_bands(height: int, band_height: int, overlap: int = 0) -> Iterator[Tuple[int, int]]:
+    """[y0, y1) row bands covering height, each extended by `overlap` rows below"""
+    for y0 in range(0, height, band_height):
+        yield y0, min(height, y0 + band_height + overlap)
+
+class StripSource:
+    """Reads an image in horizontal bands of rows
+    
+    Uncompressed images (a 'raw' tile, as Pillow reports for plain TIFF
+    strips) are read through a memory map, so a band costs only its own
+    rows. Anything else is decoded once in its native mode (1 byte a pixel
+    for bilevel and grey scans) and converted to RGB band by band, which
+    avoids the full-size RGB copy but not the decode itself; `bounded`
+    says which case applies.
+    """
+    
+    def __init__(self, path: str, frame: int = 0):
+        self.path = path
+        self._image = Image.open(path)
+        if frame:
+            self._image.seek(frame)
+        self.width, self.height = self._image.size
+        self.mode = self._image.mode
+        self.info = dict(self._image.info)
+        self._raw = self._raw_layout()
+        self._map: Optional[np.memmap] = None
+        self._decoded: Optional[Image.Image] = None
+    
+    @property
+    def bounded(self) -> bool:
+        return self._raw is not None
+    
+    def _raw_layout(self) -> Optional[Tuple[int, str, int]]:
+        """(offset, rawmode, row bytes) if the pixels are stored uncompressed, top-down"""
+        tiles = self._image.tile
+        if len(tiles) != 1:
+            return None
+        decoder, extents, offset, args = tiles[0]
+        if decoder != "raw" or tuple(extents) != (0, 0, self.width, self.height):
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if orientation != 1 or rawmode not in _RAW_BITS:
+            return None
+        row_bytes = stride or math.ceil(self.width * _RAW_BITS[rawmode] / 8)
+        return offset, rawmode, row_bytes
+    
+    def read(self, y0: int, y1: int) -> Image.Image:
+        """Rows [y0, y1) as an RGB image"""
+        if self._raw is not None:
+            offset, rawmode, row_bytes = self._raw
+            if self._map is None:
+                self._map = np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset,
+                                      shape=(self.height * row_bytes,))
+            rows = self._map[y0 * row_bytes:y1 * row_bytes]
+            band = Image.frombuffer(self.mode, (self.width, y1 - y0), rows, "raw", rawmode, row_bytes, 1)
+        else:
+            if self._decoded is None:
+                logger.warning(f"{self.path} is compressed; decoding it whole before banding")
+                self._image.load()
+                self._decoded = self._image
+            band = self._decoded.crop((0, y0, self.width, y1))
+        # Always a private copy: raw bands would otherwise alias the read-only map
+        return band.copy() if band.mode == "RGB" else band.convert("RGB")
+    
+    def close(self) -> None:
+        self._map = None
+        self._decoded = None
+        self._image.close()
+    
+    def __enter__(self) -> "StripSource":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class StripTiffWriter:
+    """Writes an RGB TIFF one strip at a time
+    
+    Strips go to disk as soon as they are complete (deflate-compressed
+    unless compress=False) and the directory is written on close, so memory
+    holds at most one band plus one strip whatever the image size.
+    """
+    
+    def __init__(self, fileobj: BinaryIO, width: int, height: int, rows_per_strip: int,
+                 compress: bool = True, dpi: Optional[Tuple[float, float]] = None):
+        self.file = fileobj
+        self.width = width
+        self.height = height
+        self.rows_per_strip = rows_per_strip
+        self.compress = compress
+        self.dpi = dpi
+        self.offsets: List[int] = []
+        self.counts: List[int] = []
+        self.rows_written = 0
+        self._pending: Optional[np.ndarray] = None
+        # Header; the directory offset is patched in on close
+        self.file.write(b"II*\x00" + struct.pack("<I", 0))
+    
+    def write_rows(self, band: Image.Image) -> None:
+        """Append rows (an RGB image of the full width); full strips are written out"""
+        data = np.asarray(band.convert("RGB") if band.mode != "RGB" else band)
+        if self._pending is not None:
+            data = np.concatenate([self._pending, data])
+            self._pending = None
+        full = len(data) - len(data) % self.rows_per_strip
+        for start in range(0, full, self.rows_per_strip):
+            self._write_strip(data[start:start + self.rows_per_strip])
+        if full < len(data):
+            # Fewer rows than a strip are held until more arrive (or close)
+            self._pending = data[full:].copy()
+    
+    def _write_strip(self, rows: np.ndarray) -> None:
+        strip = rows.tobytes()
+        if self.compress:
+            strip = zlib.compress(strip, 6)
+        self._align()
+        self.offsets.append(self.file.tell())
+        self.counts.append(len(strip))
+        self.file.write(strip)
+        self.rows_written += len(rows)
+    
+    def _align(self) -> None:
+        if self.file.tell() % 2:
+            self.file.write(b"\x00")
+    
+    def _array(self, fmt: str, values: List[int]) -> int:
+        """Write an out-of-line tag value and return its offset"""
+        self._align()
+        offset = self.file.tell()
+        self.file.write(struct.pack(f"<{len(values)}{fmt}", *values))
+        return offset
+    
+    def close(self) -> None:
+        if self._pending is not None:
+            self._write_strip(self._pending)
+            self._pending = None
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} of {self.height} rows")
+        
+        SHORT, LONG, RATIONAL = 3, 4, 5
+        tags = [
+            (256, LONG, 1, self.width),
+            (257, LONG, 1, self.height),
+            (258, SHORT, 3, self._array("H", [8, 8, 8])),
+            (259, SHORT, 1, 8 if self.compress else 1),
+            (262, SHORT, 1, 2),
+            (273, LONG, len(self.offsets), self._array("I", self.offsets) if len(self.offsets) > 1 else self.offsets[0]),
+            (277, SHORT, 1, 3),
+            (278, LONG, 1, self.rows_per_strip),
+            (279, LONG, len(self.counts), self._array("I", self.counts) if len(self.counts) > 1 else self.counts[0]),
+        ]
+        if self.dpi:
+            tags.append((282, RATIONAL, 1, self._array("I", [round(self.dpi[0] * 100), 100])))
+            tags.append((283, RATIONAL, 1, self._array("I", [round(self.dpi[1] * 100), 100])))
+        tags.append((284, SHORT, 1, 1))
+        if self.dpi:
+            tags.append((296, SHORT, 1, 2))
+        
+        self._align()
+        ifd_offset = self.file.tell()
+        self.file.write(struct.pack("<H", len(tags)))
+        for tag, kind, count, value in sorted(tags):
+            # Single SHORTs are left-justified in the 4-byte value field
+            packed = struct.pack("<HH", value, 0) if kind == SHORT and count == 1 else struct.pack("<I", value)
+            self.file.write(struct.pack("<HHI", tag, kind, count) + packed)
+        self.file.write(struct.pack("<I", 0))
+        self.file.seek(4)
+        self.file.write(struct.pack("<I", ifd_offset))
+        self.file.seek(0, os.SEEK_END)
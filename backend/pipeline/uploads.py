@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, List
+
+from .config import Config
+from .scratch import ScratchStorage
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of each supported format
+MAGIC_SIGNATURES: Dict[str, List[bytes]] = {
+    '.pdf': [b'%PDF-'],
+    '.jpg': [b'\xff\xd8\xff'],
+    '.jpeg': [b'\xff\xd8\xff'],
+    '.png': [b'\x89PNG\r\n\x1a\n'],
+    '.tiff': [b'II*\x00', b'MM\x00*'],
+}
+
+class UploadError(ValueError):
+    """Upload rejected; status_code is the HTTP status to report"""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+def max_upload_bytes(config: Config, file_ext: str) -> int:
+    """Configured size limit for a file type"""
+    if file_ext == '.pdf':
+        return int(config.get("io.max_pdf_mb", 200) * 1024 * 1024)
+    return int(config.get("io.max_image_mb", 50) * 1024 * 1024)
+
+def sniff_matches(file_ext: str, head: bytes) -> bool:
+    """Whether the first bytes of a file match its extension"""
+    return any(head.startswith(magic) for magic in MAGIC_SIGNATURES.get(file_ext, []))
+
+async def save_upload(upload, scratch: ScratchStorage, name: str, file_ext: str, max_bytes: int,
+                      chunk_size: int = 1024 * 1024) -> StoredUpload:
+    """Stream an upload to scratch storage in fixed-size chunks
+    
+    The first chunk is sniffed before anything is written, the content is
+    hashed as it streams, and the copy stops as soon as max_bytes is crossed.
+    Data goes to a .part file that is renamed into place only when complete.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    
+    first = await upload.read(chunk_size)
+    if not sniff_matches(file_ext, first):
+        raise UploadError(415, f"File content does not match {file_ext}")
+    
+    writer = scratch.open_writer("input", name)
+    try:
+        chunk = first
+        while chunk:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadError(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+            digest.update(chunk)
+            await asyncio.to_thread(writer.write, chunk)
+            chunk = await upload.read(chunk_size)
+        path = writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+    
+    logger.info(f"Stored upload {path}: {size} bytes")
+    return StoredUpload(path=path, size=size, sha256=digest.hexdigest())
\ No newline at end of file
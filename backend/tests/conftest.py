@@ -4,6 +4,11 @@ import os
 from pathlib import Path
 
 
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long-running end-to-end tests")
+    config.addinivalue_line("markers", "benchmark: micro-benchmarks that report throughput")
+
+
 @pytest.fixture(scope="session")
 def temp_dir():
     """Create a temporary directory for test files"""
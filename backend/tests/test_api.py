@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 import io
+import os
 import time
 from PIL import Image
 
@@ -9,9 +10,23 @@ from app import app
 
 
 class TestAPI:
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path, monkeypatch):
+        from app import config
+        monkeypatch.setitem(config.data["cache"], "dir", str(tmp_path / "cache"))
+
+    @pytest.fixture
+    def jobs_path(self, tmp_path, monkeypatch):
+        from app import config
+        path = tmp_path / "jobs.db"
+        monkeypatch.setitem(config.data["jobs"], "path", str(path))
+        return path
+
     @pytest.fixture
-    def client(self):
-        return TestClient(app)
+    def client(self, jobs_path):
+        # Entering the client runs the lifespan, which starts the job scheduler
+        with TestClient(app) as client:
+            yield client
 
     @pytest.fixture
     def sample_image(self):
@@ -75,6 +90,68 @@ class TestAPI:
         assert "detail" in data
         assert "Unsupported file type" in data["detail"]
 
+    def test_upload_content_mismatch(self, client):
+        """Test that files whose magic bytes do not match the extension are rejected"""
+        files = {"file": ("fake.pdf", io.BytesIO(b"MZ\x90\x00 not a pdf"), "application/pdf")}
+        response = client.post("/api/v1/redact", files=files)
+        assert response.status_code == 415
+        assert "does not match" in response.json()["detail"]
+
+    def test_upload_over_size_limit(self, client, large_image, monkeypatch):
+        """Test that uploads beyond the configured limit are aborted with 413"""
+        from app import config
+        monkeypatch.setitem(config.data["io"], "max_image_mb", 0.001)
+        monkeypatch.setitem(config.data["io"], "upload_chunk_kb", 1)
+
+        files = {"file": ("large_test.jpg", large_image, "image/jpeg")}
+        response = client.post("/api/v1/redact", files=files)
+        assert response.status_code == 413
+        from app import scratch
+        for directory in [*scratch.disk_dirs.values(), *scratch.ram_dirs.values()]:
+            assert not [name for name in os.listdir(directory) if name.endswith("large_test.jpg.part")]
+
+    def test_queue_full_returns_429(self, client, sample_image, monkeypatch):
+        """Test that uploads are refused with Retry-After when the queue is full"""
+        import app as app_module
+        monkeypatch.setattr(app_module.scheduler, "max_depth", 0)
+
+        files = {"file": ("test.jpg", sample_image, "image/jpeg")}
+        response = client.post("/api/v1/redact", files=files)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == str(app_module.scheduler.retry_after)
+
+    def test_queue_full_is_refused_before_the_body_is_parsed(self, client, monkeypatch):
+        """Test that a full queue refuses the upload without parsing its multipart body"""
+        import app as app_module
+        monkeypatch.setattr(app_module.scheduler, "max_depth", 0)
+
+        response = client.post(
+            "/api/v1/redact", content=b"not a multipart body",
+            headers={"Content-Type": "multipart/form-data; boundary=missing"}
+        )
+        assert response.status_code == 429
+
+    def test_unknown_priority(self, client, sample_image):
+        """Test that an unknown priority class is rejected"""
+        files = {"file": ("test.jpg", sample_image, "image/jpeg")}
+        response = client.post("/api/v1/redact?priority=urgent", files=files)
+        assert response.status_code == 400
+
+    def test_unfinished_jobs_fail_on_startup(self, jobs_path):
+        """Test that jobs a previous server left queued or processing are failed at startup"""
+        from pipeline.job_store import SQLiteJobStore
+        store = SQLiteJobStore(str(jobs_path))
+        store.create("queued-job", "a.pdf")
+        store.create("running-job", "b.pdf")
+        store.update("running-job", status="processing")
+        store.close()
+
+        with TestClient(app) as client:
+            for job_id in ("queued-job", "running-job"):
+                data = client.get(f"/api/v1/jobs/{job_id}").json()
+                assert data["status"] == "failed"
+                assert "restart" in data["error"]
+
     def test_upload_no_file(self, client):
         """Test upload endpoint with no file provided"""
         response = client.post("/api/v1/redact")
@@ -0,0 +1,77 @@
+import gzip
+
+import pytest
+
+from pipeline.audit_log import AuditWriter, merge_audit_logs, read_audit_log
+
+
+ENTRIES = [
+    {"pii_type": "PAN", "page": 0, "confidence": 0.95},
+    {"pii_type": "EMAIL", "page": 1, "confidence": 0.6},
+]
+
+
+class TestAuditWriter:
+    @pytest.mark.parametrize("name", ["audit.jsonl", "audit.jsonl.gz"])
+    def test_round_trip(self, tmp_path, name):
+        """Test that entries read back tagged with their source document"""
+        path = str(tmp_path / name)
+        with AuditWriter(path) as writer:
+            assert writer.write(ENTRIES, source="a.pdf") == 2
+        assert list(read_audit_log(path)) == [{"file": "a.pdf", **entry} for entry in ENTRIES]
+
+    def test_gzip_output_is_compressed(self, tmp_path):
+        """Test that a .gz log is a standard gzip stream"""
+        path = tmp_path / "audit.jsonl.gz"
+        with AuditWriter(str(path)) as writer:
+            writer.write(ENTRIES)
+        assert gzip.decompress(path.read_bytes()).count(b"\n") == 2
+
+    def test_flushed_entries_survive_crash_and_append(self, tmp_path):
+        """Test that flushed entries outlive an unclosed writer and appends after it stay readable"""
+        path = str(tmp_path / "audit.jsonl.gz")
+        crashed = AuditWriter(path)
+        crashed.write(ENTRIES[:1], source="a.pdf")
+        crashed.flush()
+        crashed._raw.close()  # the process died: no gzip trailer
+        assert [entry["file"] for entry in read_audit_log(path)] == ["a.pdf"]
+
+        with AuditWriter(path) as writer:
+            writer.write(ENTRIES[1:], source="b.pdf")
+        assert [entry["file"] for entry in read_audit_log(path)] == ["a.pdf", "b.pdf"]
+
+    def test_truncated_line_is_skipped(self, tmp_path):
+        """Test that a line cut off mid-write is dropped"""
+        path = tmp_path / "audit.jsonl"
+        path.write_text('{"pii_type": "PAN"}\n{"pii_ty')
+        assert list(read_audit_log(str(path))) == [{"pii_type": "PAN"}]
+
+    def test_append_after_truncated_line(self, tmp_path):
+        """Test that appending to a log with a torn last line keeps every appended entry"""
+        path = tmp_path / "audit.jsonl"
+        path.write_text('{"a": 1}\n{"b": 2, "tor')
+        with AuditWriter(str(path)) as writer:
+            writer.write([{"c": 3}, {"d": 4}])
+        assert list(read_audit_log(str(path))) == [{"a": 1}, {"c": 3}, {"d": 4}]
+
+        path.write_text('{"b": 2, "tor')
+        with AuditWriter(str(path)) as writer:
+            writer.write([{"c": 3}])
+        assert list(read_audit_log(str(path))) == [{"c": 3}]
+
+
+class TestMergeAuditLogs:
+    def test_merge_and_filter(self, tmp_path):
+        """Test that shards merge in order and filters apply to every shard"""
+        shards = []
+        for i in range(2):
+            path = str(tmp_path / f"shard{i}.jsonl.gz")
+            with AuditWriter(path) as writer:
+                writer.write(ENTRIES, source=f"doc{i}.pdf")
+            shards.append(path)
+
+        merged = str(tmp_path / "merged.jsonl")
+        assert merge_audit_logs(shards, merged) == 4
+        filtered = str(tmp_path / "pan.jsonl")
+        assert merge_audit_logs(shards, filtered, pii_types=["PAN"], min_confidence=0.9) == 2
+        assert [entry["file"] for entry in read_audit_log(filtered)] == ["doc0.pdf", "doc1.pdf"]
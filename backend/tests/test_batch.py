@@ -0,0 +1,189 @@
+import asyncio
+import json
+import os
+
+import fitz
+import pytest
+
+from cli import _redact_documents
+from pipeline.audit_log import read_audit_log
+from pipeline.batch import MANIFEST_NAME, BatchManifest, file_record, iter_input_files
+from pipeline.result_cache import file_sha256
+
+
+def make_pdf(path, text="PAN ABCDE1234F"):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+class TestFileDiscovery:
+    def test_single_pass_matches_any_case(self, tmp_path):
+        """Test that every supported file is found once regardless of extension case"""
+        for name in ["a.pdf", "b.PDF", "c.Jpeg", "notes.txt"]:
+            (tmp_path / name).write_bytes(b"x")
+        names = [p.name for p in iter_input_files(tmp_path)]
+        assert names == ["a.pdf", "b.PDF", "c.Jpeg"]
+
+    def test_recursive(self, tmp_path):
+        """Test that subdirectories are only walked when recursive"""
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "top.png").write_bytes(b"x")
+        (tmp_path / "sub" / "deep.tiff").write_bytes(b"x")
+        assert [p.name for p in iter_input_files(tmp_path)] == ["top.png"]
+        assert [p.name for p in iter_input_files(tmp_path, recursive=True)] == ["top.png", "deep.tiff"]
+
+    def test_output_directory_is_skipped(self, tmp_path):
+        """Test that an output directory inside the input tree is not walked"""
+        (tmp_path / "out").mkdir()
+        (tmp_path / "top.png").write_bytes(b"x")
+        (tmp_path / "out" / "redacted_top.png").write_bytes(b"x")
+        found = iter_input_files(tmp_path, recursive=True, exclude=tmp_path / "out")
+        assert [p.name for p in found] == ["top.png"]
+
+
+class TestBatchManifest:
+    def test_done_files_are_skipped_until_changed(self, tmp_path):
+        """Test that a done record holds until the input's content changes"""
+        source = make_pdf(tmp_path / "doc.pdf")
+        manifest = BatchManifest(str(tmp_path))
+        manifest.record(**file_record(source, sha256="unused", status="done"))
+        manifest.close()
+
+        reloaded = BatchManifest(str(tmp_path))
+        assert reloaded.is_done(source)
+        make_pdf(source, text="something else entirely")
+        assert not reloaded.is_done(source)
+
+    def test_torn_line_is_ignored(self, tmp_path):
+        """Test that a partial record left by a crash does not break loading"""
+        source = make_pdf(tmp_path / "doc.pdf")
+        record = file_record(source, status="failed", error="boom")
+        (tmp_path / MANIFEST_NAME).write_text(json.dumps(record) + "\n" + '{"input": "/x", "sta')
+        manifest = BatchManifest(str(tmp_path))
+        assert list(manifest.records) == [record["input"]]
+        assert not manifest.is_done(source)
+
+
+class TestBatchRedaction:
+    @pytest.fixture(autouse=True)
+    def workdir(self, tmp_path, monkeypatch):
+        # The CLI keeps its result cache and scratch files under the working directory
+        monkeypatch.chdir(tmp_path)
+
+    def _run(self, input_dir, output_dir, workers=1, audit_file=None):
+        asyncio.run(_redact_documents(
+            str(input_dir), str(output_dir), "configs/policies.yaml", audit_file, True,
+            "configs/default.yaml", workers=workers
+        ))
+
+    def _manifest(self, output_dir):
+        return BatchManifest(str(output_dir)).records
+
+    def test_rerun_skips_done_and_retries_failed(self, tmp_path, capsys):
+        """Test that a re-run redacts nothing new and retries only failures"""
+        inputs, outputs = tmp_path / "in", tmp_path / "out"
+        (inputs / "nested").mkdir(parents=True)
+        make_pdf(inputs / "one.pdf")
+        make_pdf(inputs / "nested" / "one.pdf")
+        (inputs / "broken.pdf").write_bytes(b"not a pdf")
+
+        self._run(inputs, outputs)
+        records = self._manifest(outputs)
+        statuses = sorted(record["status"] for record in records.values())
+        assert statuses == ["done", "done", "failed"]
+        # Same names in different folders do not overwrite each other
+        assert (outputs / "redacted_one.pdf").exists()
+        assert (outputs / "nested" / "redacted_one.pdf").exists()
+
+        capsys.readouterr()
+        self._run(inputs, outputs)
+        out = capsys.readouterr().out
+        assert "0 files processed, 1 failed, 2 already done" in out
+
+    def test_unreadable_input_is_a_failed_record(self, tmp_path, monkeypatch):
+        """Test that an input that cannot be hashed fails alone instead of ending the batch"""
+        inputs, outputs = tmp_path / "in", tmp_path / "out"
+        inputs.mkdir()
+        make_pdf(inputs / "a.pdf")
+        make_pdf(inputs / "b.pdf")
+
+        def unreadable(path, *args, **kwargs):
+            if path.endswith("a.pdf"):
+                raise PermissionError(f"Permission denied: '{path}'")
+            return file_sha256(path, *args, **kwargs)
+
+        monkeypatch.setattr("pipeline.batch.file_sha256", unreadable)
+        self._run(inputs, outputs)
+        records = {os.path.basename(key): record for key, record in self._manifest(outputs).items()}
+        assert records["a.pdf"]["status"] == "failed"
+        assert "Permission denied" in records["a.pdf"]["error"]
+        assert records["b.pdf"]["status"] == "done"
+
+    def test_deleted_input_is_a_failed_record(self, tmp_path, monkeypatch):
+        """Test that an input deleted between discovery and processing fails alone"""
+        inputs, outputs = tmp_path / "in", tmp_path / "out"
+        inputs.mkdir()
+        make_pdf(inputs / "a.pdf")
+        make_pdf(inputs / "b.pdf")
+
+        def deleted(path, *args, **kwargs):
+            if path.endswith("a.pdf"):
+                os.remove(path)
+            return file_sha256(path, *args, **kwargs)
+
+        monkeypatch.setattr("pipeline.batch.file_sha256", deleted)
+        self._run(inputs, outputs)
+        records = {os.path.basename(key): record for key, record in self._manifest(outputs).items()}
+        assert records["a.pdf"]["status"] == "failed"
+        assert "No such file" in records["a.pdf"]["error"]
+        assert records["b.pdf"]["status"] == "done"
+
+    def test_output_inside_input_is_not_redacted_again(self, tmp_path, capsys):
+        """Test that outputs written under the input tree are not picked up by a re-run"""
+        inputs = tmp_path / "in"
+        inputs.mkdir()
+        make_pdf(inputs / "one.pdf")
+
+        asyncio.run(_redact_documents(
+            str(inputs), str(inputs / "redacted"), "configs/policies.yaml", None, True,
+            "configs/default.yaml"
+        ))
+        capsys.readouterr()
+        asyncio.run(_redact_documents(
+            str(inputs), str(inputs / "redacted"), "configs/policies.yaml", None, True,
+            "configs/default.yaml"
+        ))
+        assert "0 files processed, 0 failed, 1 already done" in capsys.readouterr().out
+        assert sorted(os.listdir(inputs / "redacted")) == [MANIFEST_NAME, "redacted_one.pdf"]
+
+    @pytest.mark.slow
+    def test_parallel_workers(self, tmp_path):
+        """Test that files redacted on worker processes are all checkpointed"""
+        inputs, outputs = tmp_path / "in", tmp_path / "out"
+        inputs.mkdir()
+        for i in range(4):
+            make_pdf(inputs / f"doc{i}.pdf")
+
+        self._run(inputs, outputs, workers=2)
+        records = self._manifest(outputs)
+        assert len(records) == 4
+        assert all(record["status"] == "done" for record in records.values())
+        assert sorted(os.listdir(outputs)) == [MANIFEST_NAME] + [f"redacted_doc{i}.pdf" for i in range(4)]
+
+    def test_audit_log_grows_across_resumed_runs(self, tmp_path):
+        """Test that each run appends audit entries for the files it redacted"""
+        inputs, outputs = tmp_path / "in", tmp_path / "out"
+        inputs.mkdir()
+        make_pdf(inputs / "first.pdf")
+        audit = str(tmp_path / "audit.jsonl.gz")
+
+        self._run(inputs, outputs, audit_file=audit)
+        make_pdf(inputs / "second.pdf")
+        self._run(inputs, outputs, audit_file=audit)
+
+        sources = [os.path.basename(entry["file"]) for entry in read_audit_log(audit)]
+        assert sources and sources == sorted(sources)
+        assert set(sources) == {"first.pdf", "second.pdf"}
@@ -0,0 +1,427 @@
+import os
+import re
+import time
+
+import pytest
+
+from pipeline.config import Config
+from pipeline.pii_text import TextPIIDetector
+
+
+STATEMENT_LINE = (
+    "12/03/2024 NEFT to Mr Sharma A/C 123456789012345 IFSC HDFC0001234 "
+    "ref 9876543210 mail a.b@bank.com PAN ABCDE1234F Aadhaar 1234 5678 9012 bal 45,000.00\n"
+)
+
+
+def _chars_per_sec(fn, text, rounds=3):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return len(text) / best
+
+
+@pytest.mark.benchmark
+class TestTextScanBenchmark:
+    @pytest.fixture
+    def detector(self):
+        return TextPIIDetector(Config.load())
+
+    @pytest.fixture
+    def statement_text(self):
+        """Roughly one dense bank-statement page per 40 lines, 50 pages"""
+        return STATEMENT_LINE * 2000
+
+    def test_single_pass_vs_per_type_loop(self, detector, statement_text):
+        """Compare chars/sec of the compiled scanner against one finditer per PII type"""
+        raw_patterns = [r'\b' + pattern for pattern in detector.patterns.values()]
+
+        def per_type_loop(text):
+            return [m for pattern in raw_patterns for m in re.finditer(pattern, text, re.IGNORECASE)]
+
+        def single_pass(text):
+            return list(detector.scanner.finditer(text))
+
+        loop_rate = _chars_per_sec(per_type_loop, statement_text)
+        scan_rate = _chars_per_sec(single_pass, statement_text)
+        print(f"\nper-type loop: {loop_rate:,.0f} chars/s, single pass: {scan_rate:,.0f} chars/s "
+              f"({scan_rate / loop_rate:.2f}x)")
+
+        # The loop reports overlapping digits several times; the scanner does not
+        assert len(single_pass(statement_text)) < len(per_type_loop(statement_text))
+
+
+@pytest.mark.benchmark
+class TestRasterHandoffBenchmark:
+    def test_pixmap_view_vs_png_encode(self):
+        """Compare handing a 2x page render to detectors as PNG bytes vs an array view"""
+        import fitz
+        from pipeline.raster import from_pixmap
+
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "Aadhaar 1234 5678 9012 " * 4)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+
+        start = time.perf_counter()
+        encoded = pixmap.tobytes()
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        raster = from_pixmap(pixmap)
+        view_time = time.perf_counter() - start
+        doc.close()
+
+        print(f"\nPNG encode: {encode_time * 1000:.2f} ms ({len(encoded):,} bytes produced), "
+              f"array view: {view_time * 1000:.3f} ms ({raster.bytes_copied} bytes copied)")
+        assert raster.bytes_copied == 0
+
+
+def _p99(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+@pytest.mark.benchmark
+class TestEventLoopLatencyBenchmark:
+    @pytest.fixture
+    def dense_pdf(self, tmp_path):
+        import fitz
+
+        doc = fitz.open()
+        for _ in range(12):
+            page = doc.new_page()
+            for line in range(40):
+                page.insert_text((36, 40 + line * 18), STATEMENT_LINE.strip()[:90], fontsize=8)
+        path = tmp_path / "job_dense.pdf"
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    async def _status_call_latencies(self, work):
+        """Latency of a trivial handler polled every 2 ms while `work` runs"""
+        import asyncio
+
+        latencies = []
+        done = asyncio.Event()
+
+        async def poll():
+            loop = asyncio.get_running_loop()
+            while not done.is_set():
+                start = loop.time()
+                await asyncio.sleep(0.002)
+                latencies.append(loop.time() - start - 0.002)
+
+        poller = asyncio.create_task(poll())
+        await asyncio.sleep(0)
+        try:
+            await work()
+        finally:
+            done.set()
+            await poller
+        return latencies
+
+    def test_status_p99_inline_vs_executors(self, dense_pdf, tmp_path, monkeypatch):
+        """Compare status-call p99 while a PDF is processed on the loop vs on executors"""
+        import asyncio
+        import fitz
+        from pipeline.page_shards import detect_pages
+        from pipeline.processor import DocumentProcessor
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "output").mkdir()
+        processor = DocumentProcessor(Config.load())
+
+        async def inline():
+            # Pre-executor behaviour: every stage runs on the event loop thread
+            with fitz.open(dense_pdf) as doc:
+                detections = detect_pages(
+                    doc, 0, len(doc), processor.text_detector, processor.visual_detector
+                )
+            processor.redaction_engine.redact_pdf(dense_pdf, detections, "dense.pdf")
+
+        async def offloaded():
+            await processor.process_document(dense_pdf, "dense.pdf")
+
+        try:
+            inline_latencies = asyncio.run(self._status_call_latencies(inline))
+            offloaded_latencies = asyncio.run(self._status_call_latencies(offloaded))
+        finally:
+            processor.close()
+
+        before, after = _p99(inline_latencies), _p99(offloaded_latencies)
+        print(f"\nstatus p99 latency: inline {before * 1000:.1f} ms ({len(inline_latencies)} polls), "
+              f"executors {after * 1000:.1f} ms ({len(offloaded_latencies)} polls)")
+        # Counted rather than timed: inline work never yields, so the poller only gets
+        # a turn around it, while on executors it keeps being served throughout
+        assert len(inline_latencies) <= 2
+        assert len(offloaded_latencies) >= 10
+
+
+@pytest.mark.benchmark
+class TestDetectionMemoryBenchmark:
+    def test_detection_set_vs_dataclasses(self):
+        """Compare peak memory of 50k detections plus audit rows as dataclass lists vs columns"""
+        import tracemalloc
+        from datetime import datetime
+        from pipeline.detections import DetectionSet
+        from pipeline.models import AuditEntry, BoundingBox, PIIDetection, PIIType
+
+        count = 50_000
+        types = list(PIIType)
+
+        def make_detection(i):
+            return PIIDetection(text=f"{i:012d}", pii_type=types[i % len(types)], confidence=0.9,
+                                bbox=BoundingBox(x=i % 600, y=i % 800, width=80, height=20), page=i // 500)
+
+        def dataclass_lists():
+            detections = [make_detection(i) for i in range(count)]
+            audit = [
+                AuditEntry(pii_type=d.pii_type.value, method="mask",
+                           bbox={"x": d.bbox.x, "y": d.bbox.y, "width": d.bbox.width, "height": d.bbox.height},
+                           page=d.page, confidence=d.confidence, timestamp=datetime.now().isoformat())
+                for d in detections
+            ]
+            return detections, audit
+
+        def columns():
+            # Built page by page, as the pipeline does, then turned into the result's audit rows
+            pages = [DetectionSet.from_detections(make_detection(i) for i in range(start, start + 500))
+                     for start in range(0, count, 500)]
+            detections = DetectionSet.concat(pages)
+            return detections, detections.audit_entries({}, datetime.now().isoformat())
+
+        def peak(fn):
+            tracemalloc.start()
+            result = fn()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del result
+            return peak_bytes
+
+        list_peak = peak(dataclass_lists)
+        column_peak = peak(columns)
+        print(f"\ndataclass lists: {list_peak / 2**20:.1f} MiB peak, "
+              f"DetectionSet: {column_peak / 2**20:.1f} MiB peak ({list_peak / column_peak:.1f}x)")
+        assert column_peak < list_peak
+
+
+@pytest.mark.benchmark
+class TestRedactionGeometryBenchmark:
+    def test_merged_regions_vs_one_annotation_per_hit(self):
+        """Compare apply_redactions on a dense page with raw vs merged boxes"""
+        import fitz
+        from pipeline.detections import DetectionSet
+        from pipeline.geometry import corner_boxes, redaction_regions
+        from pipeline.models import BoundingBox, PIIDetection, PIIType
+
+        # 60 lines of digits, each matched as AADHAAR and ACCOUNT_NO, next to a phone number
+        hits = []
+        for line in range(60):
+            y = 40 + line * 16
+            for pii_type in (PIIType.AADHAAR, PIIType.ACCOUNT_NO):
+                hits.append(PIIDetection("", pii_type, 0.9, BoundingBox(72, y, 90, 10)))
+            hits.append(PIIDetection("", PIIType.PHONE, 0.9, BoundingBox(163, y, 60, 10)))
+        detections = DetectionSet.from_detections(hits)
+
+        def apply(boxes):
+            doc = fitz.open()
+            page = doc.new_page()
+            for line in range(60):
+                page.insert_text((72, 48 + line * 16), "1234 5678 9012 98765 43210 some other words", fontsize=9)
+            start = time.perf_counter()
+            for box in boxes:
+                page.add_redact_annot(fitz.Rect(*box), fill=(0, 0, 0))
+            page.apply_redactions()
+            elapsed = time.perf_counter() - start
+            doc.close()
+            return elapsed
+
+        raw = corner_boxes(detections, 1).tolist()
+        merged = [box for _, box in redaction_regions(detections, {}, padding=1, gap=2)[0]]
+        raw_time, merged_time = apply(raw), apply(merged)
+        print(f"\none annot per hit: {len(raw)} annots {raw_time * 1000:.1f} ms, "
+              f"merged: {len(merged)} annots {merged_time * 1000:.1f} ms")
+        assert len(merged) < len(raw)
+
+
+@pytest.mark.benchmark
+class TestPdfWriterBenchmark:
+    def test_save_profiles(self, tmp_path):
+        """Report save time and output size of a redacted 30-page document per writer profile"""
+        import fitz
+        from pipeline.pdf_writer import WRITER_PROFILES, supported_options
+
+        doc = fitz.open()
+        for i in range(30):
+            page = doc.new_page()
+            for line in range(40):
+                page.insert_text((72, 60 + line * 18), f"Line {line} of page {i}: account 1234 5678 9012 3456")
+            page.add_redact_annot(fitz.Rect(150, 50, 300, 64), fill=(0, 0, 0))
+            page.apply_redactions()
+        redacted = doc.tobytes()
+        doc.close()
+
+        sizes = {}
+        for name, profile in WRITER_PROFILES.items():
+            options = supported_options(profile)
+            path = str(tmp_path / f"{name}.pdf")
+            # A fresh document per profile: garbage collection rewrites the one saved
+            with fitz.open("pdf", redacted) as doc:
+                start = time.perf_counter()
+                doc.save(path, **options)
+                elapsed = time.perf_counter() - start
+            sizes[name] = os.path.getsize(path)
+            print(f"\n{name:>9}: {elapsed * 1000:7.1f} ms, {sizes[name] / 1024:8.1f} KiB")
+
+        assert sizes["smallest"] <= sizes["balanced"] < sizes["fast"]
+
+
+def _raster_sum(array):
+    return int(array[::64, ::64].sum())
+
+
+def _slot_sum(ref):
+    from pipeline.raster_ring import read_slot
+
+    return _raster_sum(read_slot(ref))
+
+
+@pytest.mark.benchmark
+class TestRasterRingBenchmark:
+    def test_ring_vs_pickled_rasters(self):
+        """Compare sending 30 MB rasters to worker processes pickled vs through the raster ring"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        import numpy as np
+        from pipeline.raster_ring import RasterRing
+
+        raster = np.random.default_rng(0).integers(0, 256, (3300, 3100, 3), dtype=np.uint8)
+        rounds = 8
+        ring = RasterRing(slots=2, slot_bytes=raster.nbytes)
+        try:
+            with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+                expected = pool.submit(_raster_sum, raster).result()
+
+                start = time.perf_counter()
+                pickled = [pool.submit(_raster_sum, raster).result() for _ in range(rounds)]
+                pickle_time = (time.perf_counter() - start) / rounds
+
+                start = time.perf_counter()
+                shared = [pool.submit(_slot_sum, ring.write(i % 2, raster)).result() for i in range(rounds)]
+                ring_time = (time.perf_counter() - start) / rounds
+        finally:
+            ring.close()
+
+        print(f"\n{raster.nbytes / 2**20:.0f} MiB raster: pickled {pickle_time * 1000:.1f} ms/page, "
+              f"ring {ring_time * 1000:.1f} ms/page ({pickle_time / ring_time:.1f}x)")
+        assert pickled == shared == [expected] * rounds
+
+
+@pytest.mark.benchmark
+class TestRenderScaleBenchmark:
+    PAGE_SIZES = [(612, 792)] * 4 + [(2384, 3370), (164, 420), (164, 420)]
+
+    @pytest.fixture
+    def models_dir(self, tmp_path):
+        """Tiny stand-ins for the signature and PaddleOCR models (see test_onnx_engine, test_ocr)"""
+        import json
+
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+        from tests.test_ocr import CHARACTERS, tiny_db_detector, tiny_recognizer
+        from tests.test_onnx_engine import tiny_yolov5
+
+        for folder in ("visual", "paddleocr"):
+            (tmp_path / folder).mkdir()
+        (tmp_path / "visual" / "sig.onnx").write_bytes(tiny_yolov5(640))
+        (tmp_path / "paddleocr" / "det.onnx").write_bytes(tiny_db_detector())
+        (tmp_path / "paddleocr" / "rec.onnx").write_bytes(tiny_recognizer())
+        (tmp_path / "paddleocr" / "keys.txt").write_text("\n".join(CHARACTERS) + "\n")
+        manifest = {"models": {
+            "visual": {"signature_detector": {"path": "visual/sig.onnx"}},
+            "paddleocr": {
+                "det_model": {"path": "paddleocr/det.onnx"},
+                "rec_model": {"path": "paddleocr/rec.onnx", "dict": "paddleocr/keys.txt"},
+            },
+        }}
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+        return tmp_path
+
+    def _document(self):
+        """Letter pages with a pasted scan holding a PAN, an A0 drawing and receipts, with ground truth"""
+        import io
+        import fitz
+        from PIL import Image
+
+        scan = Image.new("RGB", (300, 150), "white")
+        scan.paste((0, 0, 0), (20, 60, 280, 85))
+        buffer = io.BytesIO()
+        scan.save(buffer, format="PNG")
+
+        doc = fitz.open()
+        truth = []
+        for page_num, (width, height) in enumerate(self.PAGE_SIZES):
+            page = doc.new_page(width=width, height=height)
+            page.insert_text((20, 40), "Account statement", fontsize=9)
+            # The signature model finds a centred square a quarter of the long side wide
+            side = max(width, height) / 4
+            truth.append((page_num, "SIGNATURE", ((width - side) / 2, (height - side) / 2,
+                                                  (width + side) / 2, (height + side) / 2)))
+            if (width, height) == (612, 792):
+                page.insert_image(fitz.Rect(150, 400, 450, 550), stream=buffer.getvalue())
+                truth.append((page_num, "PAN", (170, 460, 430, 485)))
+        return doc, truth
+
+    def _recall(self, detections, truth):
+        """Share of true boxes with a detection of the same type centred inside them"""
+        found = 0
+        for page_num, pii_type, (x0, y0, x1, y1) in truth:
+            for d in detections:
+                cx, cy = d.bbox.x + d.bbox.width / 2, d.bbox.y + d.bbox.height / 2
+                if d.page == page_num and d.pii_type.value == pii_type and x0 <= cx <= x1 and y0 <= cy <= y1:
+                    found += 1
+                    break
+        return found / len(truth)
+
+    def test_pages_per_second_and_recall(self, models_dir):
+        """Report pages/sec, recall and rendered pixels for fixed render scales and the adaptive planner"""
+        from pipeline.ocr import PageOCR
+        from pipeline.page_shards import detect_pages
+        from pipeline.pii_visual import VisualPIIDetector
+        from pipeline.render_plan import RenderPlanner
+
+        doc, truth = self._document()
+        results = {}
+        for setting in (1, 2, 3, "auto"):
+            config = Config.load()
+            config.set("visual.models_dir", str(models_dir))
+            config.set("visual.signature_threshold", 0.1)
+            config.set("render.scale", setting)
+            text, visual, ocr, planner = (TextPIIDetector(config), VisualPIIDetector(config),
+                                          PageOCR(config), RenderPlanner(config))
+            detect_pages(doc, 0, 1, text, visual, ocr=ocr, planner=planner)
+
+            # Count the pixels each plan asks for; timings vary with machine load and are only reported
+            planned = []
+            plan = planner.plan
+            def recording_plan(*args, **kwargs):
+                render = plan(*args, **kwargs)
+                if render is not None:
+                    planned.append(render.size[0] * render.size[1])
+                return render
+            planner.plan = recording_plan
+
+            start = time.perf_counter()
+            detections = list(detect_pages(doc, 0, len(doc), text, visual, ocr=ocr, planner=planner))
+            elapsed = time.perf_counter() - start
+            results[setting] = (len(doc) / elapsed, self._recall(detections, truth), sum(planned))
+            print(f"\nrender scale {setting!s:>4}: {results[setting][0]:6.1f} pages/s, recall {results[setting][1]:.2f}, "
+                  f"{results[setting][2] / 1e6:.1f} Mpx rendered")
+        doc.close()
+
+        assert results["auto"][1] >= results[2][1]
+        assert results["auto"][2] < results[3][2]
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from pipeline.config import Config, PolicySet, load_policies, DEFAULT_POLICIES
+
+
+class TestPolicySnapshot:
+    @pytest.fixture
+    def policies_file(self, tmp_path):
+        path = tmp_path / "policies.yaml"
+        path.write_text("PHONE: mask\n")
+        return path
+
+    def test_defaults_merged(self, policies_file):
+        """Test that file entries override the built-in defaults"""
+        policies = load_policies(policies_file)
+        assert policies["PHONE"] == "mask"
+        assert policies["FACE"] == DEFAULT_POLICIES["FACE"]
+
+    def test_snapshot_is_immutable(self, policies_file):
+        """Test that a snapshot cannot be modified in place"""
+        policies = load_policies(policies_file)
+        with pytest.raises(TypeError):
+            policies["PHONE"] = "blur"
+
+    def test_cached_until_file_changes(self, policies_file):
+        """Test that repeated access reuses the parsed snapshot"""
+        first = load_policies(policies_file)
+        assert load_policies(policies_file) is first
+
+        policies_file.write_text("PHONE: blur\n")
+        stat = policies_file.stat()
+        os.utime(policies_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        reloaded = load_policies(policies_file)
+        assert reloaded is not first
+        assert reloaded["PHONE"] == "blur"
+        assert reloaded.version != first.version
+
+    def test_touch_without_change_keeps_version(self, policies_file):
+        """Test that an mtime bump with identical content keeps the snapshot"""
+        first = load_policies(policies_file)
+        stat = policies_file.stat()
+        os.utime(policies_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert load_policies(policies_file) is first
+
+    def test_missing_file_uses_defaults(self, tmp_path):
+        """Test that a missing policy file falls back to defaults"""
+        policies = load_policies(tmp_path / "missing.yaml")
+        assert dict(policies) == DEFAULT_POLICIES
+        assert policies.version == PolicySet(DEFAULT_POLICIES).version
+
+    def test_config_exposes_snapshot(self, policies_file):
+        """Test that Config.policies returns the cached snapshot"""
+        config = Config.load(policies_path=str(policies_file))
+        assert config.policies is config.policies
+        assert config.policies["PHONE"] == "mask"
@@ -0,0 +1,53 @@
+import pickle
+
+from pipeline.detections import DetectionSet
+from pipeline.models import BoundingBox, PIIDetection, PIIType
+
+
+def make_set():
+    return DetectionSet.from_detections([
+        PIIDetection("ABCDE1234F", PIIType.PAN, 0.95, BoundingBox(10, 20, 80, 12), page=1),
+        PIIDetection("a@b.com", PIIType.EMAIL, 0.6, BoundingBox(5, 5, 40, 10), page=0),
+        PIIDetection("", PIIType.FACE, 0.8, BoundingBox(100, 100, 50, 60), page=1),
+    ])
+
+
+class TestDetectionSet:
+    def test_iteration_matches_dataclasses(self):
+        """Test that iterating yields detections with the familiar attributes"""
+        detections = make_set()
+        first = next(iter(detections))
+        assert first == PIIDetection("ABCDE1234F", PIIType.PAN, 0.95, BoundingBox(10, 20, 80, 12), page=1)
+        assert [d.pii_type for d in detections] == [PIIType.PAN, PIIType.EMAIL, PIIType.FACE]
+        assert detections[2].bbox.height == 60
+        assert len(detections) == 3
+
+    def test_filters(self):
+        """Test vectorized filters by type, page and confidence"""
+        detections = make_set()
+        assert len(detections.filter(pii_types=[PIIType.PAN, PIIType.FACE])) == 2
+        assert len(detections.filter(pages=[0])) == 1
+        assert [d.text for d in detections.filter(pages=[1], min_confidence=0.9)] == ["ABCDE1234F"]
+
+    def test_by_page_and_counts(self):
+        """Test per-page split and type counts"""
+        detections = make_set()
+        pages = detections.by_page()
+        assert sorted(pages) == [0, 1]
+        assert [d.pii_type for d in pages[1]] == [PIIType.PAN, PIIType.FACE]
+        assert detections.type_counts() == {"EMAIL": 1, "PAN": 1, "FACE": 1}
+
+    def test_concat_and_pickle(self):
+        """Test that sets concatenate in order and survive a trip between processes"""
+        joined = DetectionSet.concat([make_set(), make_set()])
+        restored = pickle.loads(pickle.dumps(joined))
+        assert len(restored) == 6
+        assert list(restored) == list(joined)
+        assert len(DetectionSet.concat([])) == 0
+
+    def test_audit_entries(self):
+        """Test that audit entries use the policy per type and one shared timestamp"""
+        entries = make_set().audit_entries({"PAN": "replace"}, "2024-01-01T00:00:00")
+        assert [e.method for e in entries] == ["replace", "mask", "mask"]
+        assert entries[0].bbox == {"x": 10, "y": 20, "width": 80, "height": 12}
+        assert {e.timestamp for e in entries} == {"2024-01-01T00:00:00"}
@@ -0,0 +1,63 @@
+import numpy as np
+
+from pipeline.detections import DetectionSet
+from pipeline.geometry import merge_boxes, nms, redaction_regions, suppress_duplicates
+from pipeline.models import BoundingBox, PIIDetection, PIIType
+
+
+def detection(pii_type, x, y, width, height, page=0, confidence=0.9):
+    return PIIDetection("", pii_type, confidence, BoundingBox(x, y, width, height), page)
+
+
+class TestNMS:
+    def test_keeps_best_of_overlapping(self):
+        """Test that the highest-scoring box of an overlapping cluster survives"""
+        boxes = np.array([[0, 0, 100, 100], [5, 5, 105, 105], [300, 300, 350, 350]])
+        keep = nms(boxes, np.array([0.6, 0.9, 0.5]), 0.5)
+        assert sorted(keep.tolist()) == [1, 2]
+
+    def test_suppress_duplicates_only_touches_visual_types(self):
+        """Test that repeated faces collapse while identical text hits are kept"""
+        detections = DetectionSet.from_detections([
+            detection(PIIType.FACE, 0, 0, 100, 100, confidence=0.7),
+            detection(PIIType.FACE, 2, 2, 100, 100, confidence=0.8),
+            detection(PIIType.FACE, 2, 2, 100, 100, page=1),
+            detection(PIIType.AADHAAR, 10, 10, 80, 12),
+            detection(PIIType.AADHAAR, 10, 10, 80, 12),
+        ])
+        kept = suppress_duplicates(detections, 0.5)
+        assert [(d.pii_type, d.page) for d in kept] == [
+            (PIIType.FACE, 0), (PIIType.FACE, 1), (PIIType.AADHAAR, 0), (PIIType.AADHAAR, 0)
+        ]
+        assert kept[0].confidence == 0.8
+
+
+class TestMergeBoxes:
+    def test_overlapping_and_adjacent_boxes_merge(self):
+        """Test that the same digits matched twice and a touching word become one box"""
+        boxes = np.array([[10, 10, 90, 22], [10, 10, 90, 22], [91, 10, 140, 22]])
+        assert merge_boxes(boxes, gap=2).tolist() == [[10, 10, 140, 22]]
+
+    def test_neighbouring_lines_are_not_bridged(self):
+        """Test that hits at opposite ends of adjacent lines keep their own boxes"""
+        boxes = np.array([[400, 10, 500, 22], [10, 21, 110, 33]])
+        assert sorted(merge_boxes(boxes, gap=2).tolist()) == sorted(boxes.tolist())
+
+    def test_separate_boxes_are_untouched(self):
+        """Test that distant boxes are returned as they are"""
+        boxes = np.array([[0, 0, 10, 10], [50, 50, 60, 60]])
+        assert merge_boxes(boxes).tolist() == boxes.tolist()
+
+
+class TestRedactionRegions:
+    def test_regions_per_page_and_method(self):
+        """Test that boxes are padded, merged within a method and kept apart across methods"""
+        detections = DetectionSet.from_detections([
+            detection(PIIType.AADHAAR, 10, 10, 80, 12),
+            detection(PIIType.ACCOUNT_NO, 10, 10, 80, 12),
+            detection(PIIType.PHONE, 10, 10, 80, 12),
+            detection(PIIType.PAN, 10, 10, 80, 12, page=2),
+        ])
+        regions = redaction_regions(detections, {"PHONE": "replace"}, padding=4)
+        assert sorted(regions[0]) == [("mask", (6, 6, 94, 26)), ("replace", (6, 6, 94, 26))]
+        assert regions[2] == [("mask", (6, 6, 94, 26))]
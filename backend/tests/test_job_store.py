@@ -0,0 +1,120 @@
+import pytest
+
+from pipeline.job_store import MemoryJobStore, SQLiteJobStore
+from pipeline.models import AuditEntry, ProcessResult
+
+
+def _result(entries=3):
+    return ProcessResult(
+        job_id="job-1",
+        filename="scan.pdf",
+        total_pages=2,
+        detections_count=entries,
+        audit_entries=[
+            AuditEntry(pii_type="PAN", method="mask", bbox={"x": 1, "y": 2, "width": 3, "height": 4},
+                       page=0, confidence=0.9, timestamp="2024-01-01T00:00:00")
+            for _ in range(entries)
+        ],
+        output_path="output/job-1_redacted_scan.pdf",
+        summary={"total_pages": 2},
+        policy_version="abc123"
+    )
+
+
+class TestJobStore:
+    @pytest.fixture(params=["memory", "sqlite"])
+    def store(self, request, tmp_path):
+        store = MemoryJobStore() if request.param == "memory" else SQLiteJobStore(str(tmp_path / "jobs.db"))
+        yield store
+        store.close()
+
+    def test_create_and_get(self, store):
+        """Test that a created job is queued and returned with its status fields"""
+        store.create("job-1", "scan.pdf")
+        job = store.get("job-1")
+        assert job["id"] == "job-1"
+        assert job["filename"] == "scan.pdf"
+        assert job["status"] == "queued"
+        assert "created_at" in job
+        assert store.get("missing") is None
+
+    def test_status_excludes_audit_entries(self, store):
+        """Test that status records carry summary fields but not the audit log"""
+        store.create("job-1", "scan.pdf")
+        store.complete("job-1", _result(), download_url="/dl")
+
+        job = store.get("job-1")
+        assert job["status"] == "completed"
+        assert job["detections_count"] == 3
+        assert job["download_url"] == "/dl"
+        assert "audit_entries" not in job
+
+        result = store.get_result("job-1")
+        assert len(result["audit_entries"]) == 3
+        assert result["audit_entries"][0]["pii_type"] == "PAN"
+
+    def test_failed_job_records_error(self, store):
+        """Test that failures keep their error message"""
+        store.create("job-1", "scan.pdf")
+        store.update("job-1", status="failed", error="boom")
+        assert store.get("job-1")["error"] == "boom"
+
+    def test_evicts_only_expired_finished_jobs(self, store):
+        """Test TTL eviction skips running jobs and recent results"""
+        store.create("old", "a.pdf")
+        store.complete("old", _result())
+        store.create("running", "b.pdf")
+        store.update("running", status="processing")
+
+        updated_at = store.get("old")["updated_at"]
+        assert store.evict_expired(ttl_seconds=60, now=updated_at + 30) == []
+
+        evicted = store.evict_expired(ttl_seconds=60, now=updated_at + 120)
+        assert [job["id"] for job in evicted] == ["old"]
+        assert evicted[0]["output_path"] == "output/job-1_redacted_scan.pdf"
+        assert store.get("old") is None
+        assert store.get_result("old") is None
+        assert store.get("running")["status"] == "processing"
+
+    def test_fail_unfinished(self, store):
+        """Test that queued and processing jobs are failed and finished ones left alone"""
+        store.create("queued", "a.pdf")
+        store.create("running", "b.pdf")
+        store.update("running", status="processing")
+        store.create("done", "c.pdf")
+        store.complete("done", _result())
+
+        failed = store.fail_unfinished("restarted")
+        assert sorted(job["id"] for job in failed) == ["queued", "running"]
+        assert all(job["status"] == "failed" for job in failed)
+        assert store.get("running")["error"] == "restarted"
+        assert store.get("done")["status"] == "completed"
+        assert store.fail_unfinished() == []
+
+    def test_fail_unfinished_of_one_worker(self, store):
+        """Test that only the exited worker's unfinished jobs are failed"""
+        store.create("mine", "a.pdf", worker_pid=101)
+        store.create("mine-done", "b.pdf", worker_pid=101)
+        store.complete("mine-done", _result())
+        store.create("sibling", "c.pdf", worker_pid=202)
+
+        failed = store.fail_unfinished("worker exited", worker_pid=101)
+        assert [job["id"] for job in failed] == ["mine"]
+        assert store.get("mine")["status"] == "failed"
+        assert store.get("mine-done")["status"] == "completed"
+        assert store.get("sibling")["status"] == "queued"
+
+
+class TestSQLiteJobStore:
+    def test_jobs_survive_restart(self, tmp_path):
+        """Test that jobs persist across store instances"""
+        path = str(tmp_path / "jobs.db")
+        store = SQLiteJobStore(path)
+        store.create("job-1", "scan.pdf")
+        store.complete("job-1", _result())
+        store.close()
+
+        reopened = SQLiteJobStore(path)
+        assert reopened.get("job-1")["status"] == "completed"
+        assert len(reopened.get_result("job-1")["audit_entries"]) == 3
+        reopened.close()
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from pipeline.config import Config
+from pipeline.model_registry import DIGEST_CACHE_NAME, DigestCache, ModelRegistry
+
+
+def make_models_dir(path, data=b"weights", sha256=None):
+    (path / "visual").mkdir()
+    (path / "visual" / "model.onnx").write_bytes(data)
+    entry = {"path": "visual/model.onnx", "sha256": sha256 or hashlib.sha256(data).hexdigest()}
+    (path / "manifest.json").write_text(json.dumps({"models": {"visual": {"model": entry}}}))
+    return path
+
+
+class TestDigestCache:
+    def test_unchanged_files_are_not_rehashed(self, tmp_path):
+        """Test that a restart reuses the sidecar until the file changes"""
+        model = tmp_path / "model.onnx"
+        model.write_bytes(b"weights")
+        first = DigestCache(tmp_path / DIGEST_CACHE_NAME)
+        assert first.digest(model) == hashlib.sha256(b"weights").hexdigest()
+        assert first.hashed == 1
+
+        restarted = DigestCache(tmp_path / DIGEST_CACHE_NAME)
+        restarted.digest(model)
+        assert restarted.hashed == 0
+
+        model.write_bytes(b"retrained weights")
+        assert restarted.digest(model) == hashlib.sha256(b"retrained weights").hexdigest()
+        assert restarted.hashed == 1
+
+    def test_unwritable_sidecar(self, tmp_path):
+        """Test that digests still work when the sidecar cannot be saved"""
+        model = tmp_path / "model.onnx"
+        model.write_bytes(b"weights")
+        cache = DigestCache(tmp_path / "missing-dir" / DIGEST_CACHE_NAME)
+        assert cache.digest(model) == hashlib.sha256(b"weights").hexdigest()
+
+
+class TestModelRegistry:
+    def test_weights_are_mapped_and_verified_once(self, tmp_path):
+        """Test that a model maps to its bytes and is only hashed on first use"""
+        registry = ModelRegistry(make_models_dir(tmp_path))
+        weights = registry.weights("visual", "model")
+        assert weights[:] == b"weights"
+        assert registry.weights("visual", "model") is weights
+        assert registry.digests.hashed == 1
+        registry.close()
+
+    def test_checksum_mismatch(self, tmp_path):
+        """Test that a model not matching the manifest is refused"""
+        registry = ModelRegistry(make_models_dir(tmp_path, sha256="0" * 64))
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            registry.weights("visual", "model")
+
+    def test_missing_model(self, tmp_path):
+        """Test that unknown or absent models are reported as unavailable"""
+        registry = ModelRegistry(make_models_dir(tmp_path))
+        os.remove(tmp_path / "visual" / "model.onnx")
+        assert not registry.available("visual", "model")
+        assert not registry.available("visual", "other")
+        with pytest.raises(FileNotFoundError):
+            registry.weights("visual", "model")
+
+    def test_loads_are_shared(self, tmp_path):
+        """Test that the shared registry builds each object once per process"""
+        registry = ModelRegistry.shared(make_models_dir(tmp_path))
+        assert ModelRegistry.shared(tmp_path) is registry
+        calls = []
+        for _ in range(3):
+            registry.get_or_load("key", lambda: calls.append(1) or object())
+        assert len(calls) == 1
+
+    def test_processors_share_sessions(self, tmp_path):
+        """Test that two visual detectors over one models directory share session pools"""
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+        from tests.test_onnx_engine import tiny_yolov5
+        from pipeline.pii_visual import VisualPIIDetector
+
+        models_dir = make_models_dir(tmp_path, data=tiny_yolov5())
+        manifest = json.loads((models_dir / "manifest.json").read_text())
+        manifest["models"]["visual"] = {"signature_detector": manifest["models"]["visual"]["model"]}
+        (models_dir / "manifest.json").write_text(json.dumps(manifest))
+
+        config = Config.load()
+        config.set("visual.models_dir", str(models_dir))
+        config.set("visual.input_size", 64)
+        first, second = VisualPIIDetector(config), VisualPIIDetector(config)
+        first.warm_up()
+        pools = [next(iter(d.detectors.values())).pool for d in (first, second)]
+        assert pools[0] is pools[1]
+        assert pools[0].sessions_created == 1
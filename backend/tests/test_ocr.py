@@ -0,0 +1,315 @@
+import asyncio
+import io
+import json
+import os
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+from pipeline.config import Config
+from pipeline.models import PIIType
+from pipeline.ocr import PaddleOCR, PageOCR, ctc_decode, line_words, OcrLine, ocr_regions, text_boxes
+from pipeline.onnx_engine import SessionPool
+from pipeline.processor import DocumentProcessor
+from pipeline.render_plan import RenderPlan
+from pipeline.text_layer import TextLayer
+
+CHARACTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+CHARSET = ["<blank>"] + list(CHARACTERS) + [" "]
+READ_TEXT = "PAN ABCDE1234F"
+
+
+def tiny_db_detector():
+    """A DB-shaped detector: text probability is high where the input is dark"""
+    from onnx import TensorProto, helper, numpy_helper
+
+    graph = helper.make_graph(
+        [
+            helper.make_node("ReduceMean", ["x"], ["mean"], axes=[1], keepdims=1),
+            helper.make_node("Mul", ["mean", "gain"], ["scaled"]),
+            helper.make_node("Add", ["scaled", "bias"], ["logits"]),
+            helper.make_node("Sigmoid", ["logits"], ["prob"]),
+        ],
+        "tiny_db",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, ["batch", 3, "height", "width"])],
+        [helper.make_tensor_value_info("prob", TensorProto.FLOAT, ["batch", 1, "height", "width"])],
+        initializer=[
+            numpy_helper.from_array(np.array(-10, dtype=np.float32), "gain"),
+            # Zero padding (the mean colour) stays well under the threshold
+            numpy_helper.from_array(np.array(-5, dtype=np.float32), "bias"),
+        ],
+    )
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)]).SerializeToString()
+
+
+def tiny_recognizer(text=READ_TEXT):
+    """A CTC-shaped recognizer that reads the same text from every crop"""
+    from onnx import TensorProto, helper, numpy_helper
+
+    table = np.full((1, 2 * len(text), len(CHARSET)), 0.001, dtype=np.float32)
+    for t, char in enumerate(text):
+        table[0, 2 * t, CHARSET.index(char)] = 0.9
+        table[0, 2 * t + 1, 0] = 0.9
+    graph = helper.make_graph(
+        [
+            helper.make_node("ReduceMean", ["x"], ["mean"], axes=[1, 2, 3], keepdims=1),
+            helper.make_node("Reshape", ["mean", "shape"], ["per_image"]),
+            helper.make_node("Mul", ["per_image", "zero"], ["nothing"]),
+            helper.make_node("Add", ["nothing", "table"], ["probs"]),
+        ],
+        "tiny_rec",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, ["batch", 3, 48, "width"])],
+        [helper.make_tensor_value_info("probs", TensorProto.FLOAT, ["batch", table.shape[1], len(CHARSET)])],
+        initializer=[
+            numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), "shape"),
+            numpy_helper.from_array(np.array(0, dtype=np.float32), "zero"),
+            numpy_helper.from_array(table, "table"),
+        ],
+    )
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)]).SerializeToString()
+
+
+def bar_image(width, height, box):
+    """White image with one black bar standing in for a line of text"""
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    x0, y0, x1, y1 = box
+    image[y0:y1, x0:x1] = 0
+    return image
+
+
+def png_bytes(image):
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TestRouting:
+    def _regions(self, page):
+        return ocr_regions(page, TextLayer.from_page(page))
+
+    def test_born_digital_page_is_skipped(self):
+        """Test that a page with only native text gets no OCR regions"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "Statement for account 1234 5678 9012")
+        assert self._regions(page) == []
+
+    def test_scanned_page_is_read_whole(self):
+        """Test that a page made of one image without text is OCR'd as a whole"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=png_bytes(bar_image(100, 130, (10, 40, 90, 50))))
+        assert self._regions(page) == [tuple(page.rect)]
+
+    def test_only_image_regions_of_mixed_page(self):
+        """Test that a born-digital page with a pasted scan is OCR'd only over the scan"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "Please find the signed form below")
+        page.insert_image(fitz.Rect(72, 400, 372, 550), stream=png_bytes(bar_image(200, 100, (10, 40, 190, 60))))
+        # Logos are too small to be worth reading
+        page.insert_image(fitz.Rect(500, 20, 520, 40), stream=png_bytes(bar_image(20, 20, (0, 0, 5, 5))))
+        assert self._regions(page) == [(72, 400, 372, 550)]
+
+    def test_searchable_scan_is_skipped(self):
+        """Test that an image already covered by a text layer is not OCR'd again"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=png_bytes(bar_image(100, 130, (10, 40, 90, 50))))
+        for line in range(3):
+            page.insert_text((72, 300 + line * 20), "Text layer added by the scanner's OCR")
+        assert self._regions(page) == []
+
+
+class TestOcrDecoding:
+    def test_text_boxes(self):
+        """Test that connected blobs become one box each, grown back by the unclip ratio"""
+        prob = np.zeros((40, 60), dtype=np.float32)
+        prob[5:15, 5:25] = 0.9
+        # Touches the first blob only at a corner
+        prob[15:20, 25:30] = 0.9
+        prob[30:36, 40:58] = 0.9
+        boxes = text_boxes(prob, unclip_ratio=0.0)
+        assert sorted(boxes.tolist()) == [[5, 5, 30, 20], [40, 30, 58, 36]]
+
+        grown = text_boxes(prob, unclip_ratio=1.5)
+        assert grown[0, 0] < 5 and grown[0, 2] > 30
+
+    def test_weak_blobs_are_dropped(self):
+        """Test that regions whose mean probability is under the box threshold are ignored"""
+        prob = np.zeros((20, 20), dtype=np.float32)
+        prob[5:10, 5:15] = 0.4
+        assert len(text_boxes(prob, threshold=0.3, box_threshold=0.6)) == 0
+
+    def test_ctc_decode(self):
+        """Test that repeats collapse unless separated by a blank"""
+        steps = [1, 1, 0, 1, 2, 2, 0]
+        probs = np.full((len(steps), len(CHARSET)), 0.01)
+        probs[np.arange(len(steps)), steps] = 0.8
+        assert ctc_decode(probs, CHARSET) == ("AAB", pytest.approx(0.8))
+
+    def test_line_words_in_page_points(self):
+        """Test that words are spaced along the line and mapped back through crop origin and scale"""
+        plan = RenderPlan(2.0, (0, 0, 595, 842))
+        words = line_words([OcrLine((0, 10, 100, 30), "AB CDEFGH", 0.9)], origin=(200, 100), plan=plan)
+        assert [w[4] for w in words] == ["AB", "CDEFGH"]
+        assert words[0][:4] == pytest.approx((100, 55, 100 + 100 / 9, 65))
+        assert words[1][2] == pytest.approx(150)
+
+
+class TestPaddleOCR:
+    @pytest.fixture(autouse=True)
+    def models(self):
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+
+    def test_batches_keep_images_apart(self):
+        """Test that images of different sizes batched together get their own lines"""
+        engine = PaddleOCR(SessionPool(tiny_db_detector()), SessionPool(tiny_recognizer()), CHARSET,
+                           det_batch_size=2, rec_batch_size=2)
+        images = [
+            bar_image(320, 160, (40, 60, 280, 80)),
+            bar_image(200, 400, (20, 300, 180, 330)),
+            bar_image(100, 100, (0, 0, 0, 0)),
+        ]
+        results = engine.recognize(images)
+
+        assert [len(lines) for lines in results] == [1, 1, 0]
+        assert results[0][0].text == READ_TEXT
+        x0, y0, x1, y1 = results[0][0].box
+        assert x0 <= 40 and y0 <= 60 and x1 >= 280 and y1 >= 80
+        assert 250 <= results[1][0].box[1] <= 300 < results[1][0].box[3]
+
+
+class TestPageOCR:
+    @pytest.fixture
+    def models_dir(self, tmp_path):
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+        (tmp_path / "paddleocr").mkdir()
+        (tmp_path / "paddleocr" / "det.onnx").write_bytes(tiny_db_detector())
+        (tmp_path / "paddleocr" / "rec.onnx").write_bytes(tiny_recognizer())
+        (tmp_path / "paddleocr" / "keys.txt").write_text("\n".join(CHARACTERS) + "\n")
+        manifest = {"models": {"paddleocr": {
+            "det_model": {"path": "paddleocr/det.onnx"},
+            "rec_model": {"path": "paddleocr/rec.onnx", "dict": "paddleocr/keys.txt"},
+        }}}
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+        return tmp_path
+
+    def _config(self, models_dir, engine="onnx"):
+        config = Config.load()
+        config.set("visual.models_dir", str(models_dir))
+        config.set("visual.engine", "mock")
+        config.set("ocr.engine", engine)
+        return config
+
+    def test_mixed_pdf_reads_only_the_scan(self, models_dir, tmp_path, monkeypatch):
+        """Test that OCR runs on the scanned page only and its PII lands in page points"""
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "Born-digital cover letter, nothing to read here")
+        scan = doc.new_page()
+        scan.insert_image(scan.rect, stream=png_bytes(bar_image(306, 396, (50, 100, 250, 120))))
+        path = tmp_path / "job_mixed.pdf"
+        doc.save(str(path))
+        doc.close()
+
+        crops_read = []
+        recognize = PaddleOCR.recognize
+
+        def counting_recognize(engine, images):
+            crops_read.extend(image.shape for image in images)
+            return recognize(engine, images)
+
+        monkeypatch.setattr(PaddleOCR, "recognize", counting_recognize)
+        processor = DocumentProcessor(self._config(models_dir))
+        try:
+            result = asyncio.run(processor._process_pdf(str(path), "mixed.pdf"))
+        finally:
+            processor.close()
+
+        # The whole scanned page at the render scale, and nothing else
+        assert crops_read == [(1684, 1190, 3)]
+        pans = [e for e in result.audit_entries if e.pii_type == PIIType.PAN.value]
+        assert [e.page for e in pans] == [1]
+        bbox = pans[0].bbox
+        # The bar spans x 97-486, y 213-255 of the A4 page; the PAN is the line's second word
+        assert 150 <= bbox["x"] and bbox["x"] + bbox["width"] <= 520
+        assert bbox["y"] <= 213 and bbox["y"] + bbox["height"] >= 255
+
+    def test_images_are_read_whole(self, models_dir, tmp_path):
+        """Test that image uploads, which have no text layer, are OCR'd in image pixels"""
+        path = tmp_path / "job_scan.png"
+        Image.fromarray(bar_image(400, 300, (40, 100, 360, 130))).save(path)
+        processor = DocumentProcessor(self._config(models_dir))
+        try:
+            result = asyncio.run(processor._process_image(str(path), "scan.png"))
+        finally:
+            processor.close()
+        pans = [e for e in result.audit_entries if e.pii_type == PIIType.PAN.value]
+        assert len(pans) == 1
+        bbox = pans[0].bbox
+        assert bbox["y"] <= 100 and bbox["y"] + bbox["height"] >= 130
+
+    def test_tiled_images_are_read_band_by_band(self, models_dir, tmp_path):
+        """Test that tiled images are OCR'd and a line in two bands' overlap is detected once"""
+        image = bar_image(400, 600, (40, 250, 360, 280))
+        image[450:480, 40:360] = 0
+        path = tmp_path / "job_scan.tif"
+        Image.fromarray(image).save(path)
+        config = self._config(models_dir)
+        config.set("tiles.min_mpx", 0.1)
+        config.set("tiles.height_px", 256)
+        config.set("tiles.overlap_px", 128)
+        processor = DocumentProcessor(config)
+        try:
+            result = asyncio.run(processor._process_image(str(path), "scan.tif"))
+        finally:
+            processor.close()
+
+        assert result.summary["tiled"] is True
+        pans = sorted((e.bbox for e in result.audit_entries if e.pii_type == PIIType.PAN.value),
+                      key=lambda bbox: bbox["y"])
+        assert len(pans) == 2
+        for bbox, (top, bottom) in zip(pans, [(250, 280), (450, 480)]):
+            assert bbox["y"] <= top and bbox["y"] + bbox["height"] >= bottom
+
+    def test_tall_lines_across_a_band_edge_are_read_whole(self, models_dir, tmp_path):
+        """Test that a line taller than half the overlap crossing a band's bottom edge is detected whole once"""
+        path = tmp_path / "job_scan.tif"
+        Image.fromarray(bar_image(400, 600, (40, 343, 360, 413))).save(path)
+        config = self._config(models_dir)
+        config.set("tiles.min_mpx", 0.1)
+        config.set("tiles.height_px", 256)
+        config.set("tiles.overlap_px", 128)
+        processor = DocumentProcessor(config)
+        try:
+            result = asyncio.run(processor._process_image(str(path), "scan.tif"))
+        finally:
+            processor.close()
+
+        pans = [e.bbox for e in result.audit_entries if e.pii_type == PIIType.PAN.value]
+        assert len(pans) == 1
+        assert pans[0]["y"] <= 343 and pans[0]["y"] + pans[0]["height"] >= 413
+
+    def test_ocr_off(self, models_dir):
+        """Test that with OCR off no regions are routed even when models exist"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=png_bytes(bar_image(100, 130, (10, 40, 90, 50))))
+        ocr = PageOCR(self._config(models_dir, engine="off"))
+        assert ocr.regions(page, TextLayer.from_page(page)) == []
+        assert PageOCR(self._config(models_dir)).regions(page, TextLayer.from_page(page)) == [tuple(page.rect)]
+
+    def test_model_state(self, models_dir):
+        """Test that the model state changes when the OCR dictionary is replaced"""
+        assert PageOCR(self._config(models_dir, engine="off")).model_state() == {"engine": "off"}
+        state = PageOCR(self._config(models_dir)).model_state()
+        assert state["engine"] == "onnx" and len(state["det_model"]) == 64
+
+        keys = models_dir / "paddleocr" / "keys.txt"
+        keys.write_text("\n".join(reversed(CHARACTERS)) + "\n")
+        os.utime(keys, ns=(0, 0))
+        assert PageOCR(self._config(models_dir)).model_state()["dict"] != state["dict"]
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from pipeline.config import Config
+from pipeline.models import PIIType
+from pipeline.onnx_engine import Letterbox, OnnxDetector, SessionPool, letterbox, retinaface_priors
+from pipeline.pii_visual import VisualPIIDetector
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+INPUT_SIZE = 64
+
+
+def tiny_yolov5(size=INPUT_SIZE):
+    """A YOLOv5-shaped model: one centred box of a quarter of the input, scored by mean brightness"""
+    from onnx import TensorProto, helper, numpy_helper
+
+    mask = np.array([[[0, 0, 0, 0, 1, 0]]], dtype=np.float32)
+    box = np.array([[[size / 2, size / 2, size / 4, size / 4, 0, 1]]], dtype=np.float32)
+    graph = helper.make_graph(
+        [
+            helper.make_node("ReduceMean", ["images"], ["mean"], axes=[1, 2, 3], keepdims=1),
+            helper.make_node("Reshape", ["mean", "shape"], ["score"]),
+            helper.make_node("Mul", ["score", "mask"], ["scored"]),
+            helper.make_node("Add", ["scored", "box"], ["output"]),
+        ],
+        "tiny_yolov5",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, size, size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["batch", 1, 6])],
+        initializer=[
+            numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), "shape"),
+            numpy_helper.from_array(mask, "mask"),
+            numpy_helper.from_array(box, "box"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    return model.SerializeToString()
+
+
+class TestLetterbox:
+    def test_boxes_map_back_through_padding(self):
+        """Test that a wide raster is centred vertically and boxes map back to it"""
+        image = np.zeros((100, 200, 3), dtype=np.uint8)
+        canvas, transform = letterbox(image, INPUT_SIZE)
+        assert canvas.shape == (INPUT_SIZE, INPUT_SIZE, 3)
+        assert transform == Letterbox(scale=0.32, pad_x=0, pad_y=16, width=200, height=100)
+        assert (canvas[:16] == 114).all() and (canvas[16:48] == 0).all()
+
+        mapped = transform.to_source(np.array([[24.0, 24.0, 40.0, 40.0], [0.0, 0.0, 8.0, 8.0]]))
+        assert mapped[0].tolist() == pytest.approx([75, 25, 125, 75])
+        # Boxes in the padding are clipped to the raster
+        assert mapped[1, 1] == mapped[1, 3] == 0
+
+    def test_grey_rasters(self):
+        """Test that single-channel rasters are letterboxed to RGB"""
+        canvas, _ = letterbox(np.full((10, 10, 1), 200, dtype=np.uint8), INPUT_SIZE)
+        assert (canvas == 200).all()
+
+    def test_retinaface_prior_count(self):
+        """Test the anchor count of a 640 input (strides 8/16/32, two sizes each)"""
+        assert retinaface_priors(640).shape == (16800, 4)
+
+
+class TestOnnxDetector:
+    def test_batches_keep_page_order_and_coordinates(self):
+        """Test that batched pages of different shapes get their own scores and boxes"""
+        detector = OnnxDetector(SessionPool(tiny_yolov5()), "yolov5", input_size=INPUT_SIZE,
+                                batch_size=2, threshold=0.1)
+        images = [
+            np.full((100, 100, 3), 255, dtype=np.uint8),
+            np.full((100, 100, 3), 51, dtype=np.uint8),
+            np.full((100, 200, 3), 255, dtype=np.uint8),
+        ]
+        results = detector.detect(images)
+
+        assert [len(r) for r in results] == [1, 1, 1]
+        assert results[0][0].tolist() == pytest.approx([37.5, 37.5, 62.5, 62.5, 1.0], abs=1e-4)
+        assert results[1][0, 4] == pytest.approx(0.2, abs=1e-4)
+        assert results[2][0, :4].tolist() == pytest.approx([75, 25, 125, 75])
+
+    def test_threshold_drops_weak_boxes(self):
+        """Test that boxes scoring under the threshold are not returned"""
+        detector = OnnxDetector(SessionPool(tiny_yolov5()), "yolov5", input_size=INPUT_SIZE, threshold=0.5)
+        assert len(detector.detect([np.zeros((50, 50, 3), dtype=np.uint8)])[0]) == 0
+
+    def test_pool_is_bounded(self):
+        """Test that concurrent callers never create more sessions than the pool size"""
+        pool = SessionPool(tiny_yolov5(), size=2)
+        detector = OnnxDetector(pool, "yolov5", input_size=INPUT_SIZE, threshold=0.1)
+        image = np.full((80, 80, 3), 128, dtype=np.uint8)
+
+        threads = [threading.Thread(target=detector.detect, args=([image] * 3,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert 1 <= pool.sessions_created <= 2
+
+    def test_pool_reads_model_from_path(self, tmp_path):
+        """Test that sessions can be built from a model file without handing over its bytes"""
+        path = tmp_path / "model.onnx"
+        path.write_bytes(tiny_yolov5())
+        images = [np.full((80, 80, 3), 128, dtype=np.uint8)]
+        from_path = OnnxDetector(SessionPool(path), "yolov5", input_size=INPUT_SIZE, threshold=0.1)
+        from_bytes = OnnxDetector(SessionPool(tiny_yolov5()), "yolov5", input_size=INPUT_SIZE, threshold=0.1)
+        assert from_path.detect(images)[0].tolist() == from_bytes.detect(images)[0].tolist()
+
+
+class TestVisualPIIDetector:
+    def _config(self, models_dir, engine="auto"):
+        config = Config.load()
+        config.set("visual.models_dir", str(models_dir))
+        config.set("visual.engine", engine)
+        config.set("visual.input_size", INPUT_SIZE)
+        config.set("visual.signature_threshold", 0.1)
+        return config
+
+    def test_models_from_manifest(self, tmp_path):
+        """Test that manifest models are loaded and their hits carry page and type"""
+        (tmp_path / "visual").mkdir()
+        (tmp_path / "visual" / "sig.onnx").write_bytes(tiny_yolov5())
+        manifest = {"models": {"visual": {"signature_detector": {"path": "visual/sig.onnx"}}}}
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+
+        detector = VisualPIIDetector(self._config(tmp_path))
+        assert list(detector.detectors) == [PIIType.SIGNATURE]
+
+        images = [np.full((100, 100, 3), 255, dtype=np.uint8)] * 2
+        pages = detector.detect_pii_batch(images, [3, 4])
+        assert [[(d.page, d.pii_type) for d in found] for found in pages] == [
+            [(3, PIIType.SIGNATURE)], [(4, PIIType.SIGNATURE)]
+        ]
+        bbox = pages[0][0].bbox
+        assert (bbox.x, bbox.y, bbox.width, bbox.height) == (37, 37, 26, 26)
+
+    def test_model_state(self, tmp_path):
+        """Test that the model state names the resolved engine and each model's digest"""
+        assert VisualPIIDetector(self._config(tmp_path)).model_state() == {"engine": "mock"}
+        assert VisualPIIDetector(self._config(tmp_path, engine="off")).model_state() == {"engine": "off"}
+
+        models_dir = tmp_path / "models"
+        (models_dir / "visual").mkdir(parents=True)
+        weights = tiny_yolov5()
+        (models_dir / "visual" / "sig.onnx").write_bytes(weights)
+        manifest = {"models": {"visual": {"signature_detector": {"path": "visual/sig.onnx"}}}}
+        (models_dir / "manifest.json").write_text(json.dumps(manifest))
+        assert VisualPIIDetector(self._config(models_dir)).model_state() == {
+            "engine": "onnx", "signature_detector": hashlib.sha256(weights).hexdigest()
+        }
+
+    def test_missing_models(self, tmp_path):
+        """Test that auto mode falls back to mock output and onnx mode refuses"""
+        assert VisualPIIDetector(self._config(tmp_path)).detectors == {}
+        with pytest.raises(FileNotFoundError):
+            VisualPIIDetector(self._config(tmp_path, engine="onnx")).detectors
+
+    def test_model_errors_fail_detection(self, tmp_path):
+        """Test that missing or mismatched models raise from detection instead of finding nothing"""
+        images = [np.full((100, 100, 3), 255, dtype=np.uint8)]
+        with pytest.raises(FileNotFoundError):
+            VisualPIIDetector(self._config(tmp_path, engine="onnx")).detect_pii_batch(images, [1])
+
+        models_dir = tmp_path / "models"
+        (models_dir / "visual").mkdir(parents=True)
+        (models_dir / "visual" / "sig.onnx").write_bytes(tiny_yolov5())
+        manifest = {"models": {"visual": {"signature_detector": {"path": "visual/sig.onnx", "sha256": "0" * 64}}}}
+        (models_dir / "manifest.json").write_text(json.dumps(manifest))
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            VisualPIIDetector(self._config(models_dir)).detect_pii_batch(images, [1])
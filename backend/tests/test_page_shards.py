@@ -0,0 +1,192 @@
+import asyncio
+import os
+
+import fitz
+import pytest
+
+from pipeline.config import Config
+from pipeline import page_shards
+from pipeline.page_shards import plan_page_units
+from pipeline.processor import DocumentProcessor
+
+
+class TestPagePlanning:
+    def test_units_cover_all_pages_in_order(self):
+        """Test that units are contiguous and cover every page once"""
+        assert plan_page_units(10, 4) == [(0, 4), (4, 8), (8, 10)]
+
+    def test_single_page_units(self):
+        """Test that the default unit is one page"""
+        assert plan_page_units(3) == [(0, 1), (1, 2), (2, 3)]
+
+    def test_empty_document(self):
+        """Test that an empty document yields no units"""
+        assert plan_page_units(0, 4) == []
+
+
+class TestWorkerDocument:
+    @pytest.fixture(autouse=True)
+    def no_open_document(self):
+        yield
+        page_shards._close_worker_document()
+
+    def _make_pdf(self, path, text):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), text)
+        doc.save(str(path))
+        doc.close()
+
+    def test_replaced_file_is_reopened(self, tmp_path):
+        """Test that a new file at the same path, size and mtime is not read through the old handle"""
+        path = tmp_path / "job.pdf"
+        self._make_pdf(path, "first upload AAAA")
+        first = page_shards._worker_document(str(path))
+        assert page_shards._worker_document(str(path)) is first
+
+        stat = path.stat()
+        replacement = tmp_path / "next.pdf"
+        self._make_pdf(replacement, "second upload BB")
+        os.truncate(replacement, stat.st_size)
+        os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(replacement, path)
+
+        assert page_shards._worker_document(str(path)) is not first
+        assert first.is_closed
+
+    def test_deleted_file_drops_handle(self, tmp_path):
+        """Test that the handle on a deleted input is closed"""
+        path = tmp_path / "job.pdf"
+        self._make_pdf(path, "PAN ABCDE1234F")
+        doc = page_shards._worker_document(str(path))
+        path.unlink()
+        with pytest.raises(FileNotFoundError):
+            page_shards._worker_document(str(path))
+        assert doc.is_closed
+
+    def test_last_unit_closes_handle(self, tmp_path):
+        """Test that a worker keeps its handle between units and lets it go after the last one"""
+        path = tmp_path / "job.pdf"
+        doc = fitz.open()
+        for i in range(2):
+            doc.new_page().insert_text((72, 72), f"Page {i} PAN ABCDE1234F")
+        doc.save(str(path))
+        doc.close()
+
+        page_shards.init_worker(Config.load().data)
+        page_shards.detect_page_range(str(path), 0, 1)
+        assert page_shards._open_doc is not None
+        page_shards.detect_page_range(str(path), 1, 2)
+        assert page_shards._open_doc is None
+
+
+class TestShardedProcessing:
+    @pytest.fixture
+    def sample_pdf(self, tmp_path):
+        doc = fitz.open()
+        for i in range(6):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Page {i} PAN ABCDE1234F phone 98765432{i:02d}")
+        path = tmp_path / "job_sample.pdf"
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    def _detections(self, config, sample_pdf):
+        processor = DocumentProcessor(config)
+        try:
+            result = asyncio.run(processor._process_pdf(sample_pdf, "sample.pdf"))
+        finally:
+            processor.close()
+        return [(e.page, e.pii_type) for e in result.audit_entries]
+
+    def test_sharded_matches_sequential(self, sample_pdf):
+        """Test that page-sharded detection merges to the sequential result"""
+        config = Config.load()
+        config.set("processing.pdf_workers", 1)
+        sequential = self._detections(config, sample_pdf)
+
+        config = Config.load()
+        config.set("processing.pdf_workers", 3)
+        config.set("processing.pages_per_unit", 2)
+        sharded = self._detections(config, sample_pdf)
+
+        assert sharded == sequential
+        assert [page for page, _ in sharded] == sorted(page for page, _ in sharded)
+
+    def test_parent_render_matches_sequential(self, sample_pdf):
+        """Test that pages rendered into the raster ring detect like the sequential path"""
+        config = Config.load()
+        config.set("processing.pdf_workers", 1)
+        sequential = self._detections(config, sample_pdf)
+
+        config = Config.load()
+        config.set("processing.pdf_workers", 3)
+        config.set("processing.pages_per_unit", 2)
+        config.set("processing.render", "parent")
+        # Fewer slots than units in flight, so units wait on each other
+        config.set("processing.raster_slots", 2)
+        assert self._detections(config, sample_pdf) == sequential
+
+    def test_short_documents_stay_in_process(self, sample_pdf, monkeypatch):
+        """Test that only documents of at least shard_min_pages pages are sharded"""
+        sharded = []
+        detect_sharded = DocumentProcessor._detect_pages_sharded
+
+        async def counting(processor, file_path, units, copy_counter):
+            sharded.append(len(units))
+            return await detect_sharded(processor, file_path, units, copy_counter)
+
+        monkeypatch.setattr(DocumentProcessor, "_detect_pages_sharded", counting)
+        config = Config.load()
+        config.set("processing.pdf_workers", 3)
+        config.set("processing.shard_min_pages", 7)
+        assert len(self._detections(config, sample_pdf)) > 0
+        assert sharded == []
+
+        config.set("processing.shard_min_pages", 6)
+        self._detections(config, sample_pdf)
+        assert sharded == [6]
+
+
+class TestFairPageProcessing:
+    def _make_pdf(self, path, pages):
+        doc = fitz.open()
+        for i in range(pages):
+            doc.new_page().insert_text((72, 72), f"Page {i} PAN ABCDE1234F")
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+
+    def test_small_job_finishes_before_large_job(self, tmp_path):
+        """Test that a one-page job admitted behind a long PDF is not stuck behind all of it"""
+        config = Config.load()
+        config.set("cache.enabled", False)
+        config.set("io.use_ramdisk", False)
+        config.set("io.output_dir", str(tmp_path / "out"))
+        big = self._make_pdf(tmp_path / "job_big.pdf", 40)
+        small = self._make_pdf(tmp_path / "job_small.pdf", 1)
+        processor = DocumentProcessor(config)
+        finished = []
+
+        async def process(path, name):
+            result = await processor.process_document(path, name)
+            finished.append(name)
+            return result
+
+        async def run():
+            big_job = asyncio.ensure_future(process(big, "big.pdf"))
+            # Admit the small job once the large one holds the pdf thread
+            while not processor.page_scheduler.timings:
+                await asyncio.sleep(0.001)
+            small_result = await process(small, "small.pdf")
+            return small_result, await big_job
+
+        try:
+            small_result, big_result = asyncio.run(run())
+        finally:
+            processor.close()
+
+        assert finished == ["small.pdf", "big.pdf"]
+        assert big_result.total_pages == 40
+        for result in (small_result, big_result):
+            assert 0 <= result.summary["time_to_first_page_s"] <= result.summary["completion_s"]
@@ -0,0 +1,102 @@
+import fitz
+import pytest
+
+from pipeline.config import Config
+from pipeline.detections import DetectionSet
+from pipeline.models import BoundingBox, PIIDetection, PIIType
+from pipeline.pdf_writer import WRITER_PROFILES, save_options
+from pipeline.redaction import RedactionEngine
+
+
+class TestSaveOptions:
+    def test_profile_with_override(self):
+        """Test that options set in the section override the chosen profile"""
+        config = Config.load()
+        config.set("pdf_writer.profile", "fast")
+        config.set("pdf_writer.garbage", 1)
+        options = save_options(config)
+        assert options["garbage"] == 1
+        assert options["deflate"] is False
+
+    def test_garbage_zero_is_refused(self):
+        """Test that an override that would keep unreferenced objects is rejected"""
+        config = Config.load()
+        config.set("pdf_writer.garbage", 0)
+        with pytest.raises(ValueError):
+            save_options(config)
+
+    def test_unknown_profile(self):
+        """Test that a misspelled profile is rejected"""
+        config = Config.load()
+        config.set("pdf_writer.profile", "tiny")
+        with pytest.raises(ValueError):
+            save_options(config)
+
+    def test_only_supported_options_reach_save(self):
+        """Test that every returned option is accepted by this PyMuPDF's save"""
+        config = Config.load()
+        config.set("pdf_writer.profile", "smallest")
+        options = save_options(config)
+        assert set(options) <= set(WRITER_PROFILES["smallest"])
+        doc = fitz.open()
+        doc.new_page()
+        doc.tobytes(**options)
+        doc.close()
+
+
+class TestRedactPdfPages:
+    def test_untouched_pages_are_skipped(self, tmp_path, monkeypatch):
+        """Test that apply_redactions runs only on pages with detections"""
+        doc = fitz.open()
+        for i in range(5):
+            doc.new_page().insert_text((72, 72), f"page {i}")
+        source = tmp_path / "job_doc.pdf"
+        doc.save(str(source))
+        doc.close()
+
+        applied = []
+        original = fitz.Page.apply_redactions
+        monkeypatch.setattr(fitz.Page, "apply_redactions",
+                            lambda page, *a, **k: applied.append(page.number) or original(page, *a, **k))
+
+        config = Config.load()
+        config.set("io.use_ramdisk", False)
+        config.set("io.output_dir", str(tmp_path / "out"))
+        detections = DetectionSet.from_detections([
+            PIIDetection("x", PIIType.PAN, 0.9, BoundingBox(72, 60, 50, 14), page=3)
+        ])
+        output = RedactionEngine(config).redact_pdf(str(source), detections, "doc.pdf")
+
+        assert applied == [3]
+        with fitz.open(output) as redacted:
+            assert len(redacted) == 5
+            assert "page 3" not in redacted[3].get_text()
+            assert "page 2" in redacted[2].get_text()
+
+    @pytest.mark.parametrize("profile", sorted(WRITER_PROFILES))
+    def test_redacted_bytes_in_no_object(self, tmp_path, profile):
+        """Test that no object of the saved file, referenced or not, still holds the redacted text"""
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "PAN ABCDE1234F")
+        source = tmp_path / "job_pan.pdf"
+        doc.save(str(source))
+        doc.close()
+
+        config = Config.load()
+        config.set("io.use_ramdisk", False)
+        config.set("io.output_dir", str(tmp_path / "out"))
+        config.set("pdf_writer.profile", profile)
+        detections = DetectionSet.from_detections([
+            PIIDetection("ABCDE1234F", PIIType.PAN, 0.9, BoundingBox(100, 58, 80, 18), page=0)
+        ])
+        output = RedactionEngine(config).redact_pdf(str(source), detections, "pan.pdf")
+
+        # Text operators may spell the string literally or as hex
+        needles = (b"ABCDE1234F", b"ABCDE1234F".hex().encode())
+        with fitz.open(output) as redacted:
+            for xref in range(1, redacted.xref_length()):
+                data = redacted.xref_object(xref).encode().lower()
+                if redacted.xref_is_stream(xref):
+                    data += redacted.xref_stream(xref).lower()
+                assert not any(needle.lower() in data for needle in needles), f"xref {xref}"
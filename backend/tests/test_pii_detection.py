@@ -70,6 +70,27 @@ class TestTextPIIDetector:
         
         assert expected_types.issubset(pii_types)
     
+    def test_overlapping_digits_reported_once(self, detector):
+        """Test that Aadhaar and phone digits are not re-reported as account numbers"""
+        text = "Aadhaar 123456789012 mobile 9876543210 account 12345678901234"
+        detections = detector.detect_pii(text, 0)
+        
+        found = [(d.pii_type, d.text) for d in detections]
+        assert found == [
+            (PIIType.AADHAAR, "123456789012"),
+            (PIIType.PHONE, "9876543210"),
+            (PIIType.ACCOUNT_NO, "12345678901234"),
+        ]
+    
+    def test_detections_in_text_order(self, detector):
+        """Test that single-pass scanning returns regex hits in document order"""
+        text = "ABCDE1234F on 12/03/2024 via HDFC0001234 to a@b.com"
+        detections = detector.detect_pii(text, 0)
+        
+        assert [d.pii_type for d in detections] == [
+            PIIType.PAN, PIIType.DATE, PIIType.IFSC, PIIType.EMAIL
+        ]
+    
     def test_pan_validation(self, detector):
         """Test PAN validation"""
         assert detector.validate_pan("ABCDE1234F") == True
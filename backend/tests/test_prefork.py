@@ -0,0 +1,90 @@
+import json
+import os
+import signal
+import time
+import urllib.request
+
+import pytest
+
+from pipeline.prefork import PreforkServer, format_memory_report, process_memory
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux smaps_rollup")
+
+PRELOAD_BYTES = 64 * 1024 * 1024
+preloaded = None
+
+
+def preload():
+    global preloaded
+    # Written, so every page is resident in the parent before the fork
+    preloaded = b"\x01" * PRELOAD_BYTES
+
+
+async def pid_app(scope, receive, send):
+    """Minimal ASGI app answering with the serving worker's pid"""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            await send({"type": f"{message['type']}.complete"})
+            if message["type"] == "lifespan.shutdown":
+                return
+    body = json.dumps({"pid": os.getpid(), "preloaded": len(preloaded)}).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def get_json(port):
+    for _ in range(100):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2) as response:
+                return json.loads(response.read())
+        except OSError:
+            time.sleep(0.05)
+    raise AssertionError("server did not answer")
+
+
+class TestProcessMemory:
+    def test_own_process(self):
+        """Test that resident memory splits into shared and private pages"""
+        memory = process_memory(os.getpid())
+        assert memory["rss"] > 0
+        assert memory["shared"] + memory["private"] == pytest.approx(memory["rss"], rel=0.05)
+        assert "pss MiB" in format_memory_report([{"pid": os.getpid(), "role": "test", **memory}])
+
+
+@pytest.mark.slow
+class TestPreforkServer:
+    def test_workers_share_preloaded_pages(self):
+        """Test that forked workers serve requests and keep the preloaded data shared"""
+        server = PreforkServer(pid_app, "127.0.0.1", 0, workers=2, preload=preload, log_level="warning")
+        server.start()
+        try:
+            assert get_json(server.port)["preloaded"] == PRELOAD_BYTES
+            report = {row["role"]: row for row in server.memory_report()}
+            assert set(report) == {"parent", "worker0", "worker1"}
+            for role in ("worker0", "worker1"):
+                # The 64 MiB buffer is counted as shared, not copied into each worker
+                assert report[role]["shared"] >= PRELOAD_BYTES
+                assert report[role]["private"] < PRELOAD_BYTES
+                assert report[role]["pss"] < report[role]["rss"]
+        finally:
+            server.stop()
+        assert server.children == {}
+
+    def test_dead_worker_is_replaced(self):
+        """Test that supervision cleans up after a dead worker and refills the pool from the preloaded parent"""
+        exited = []
+        server = PreforkServer(pid_app, "127.0.0.1", 0, workers=1, preload=preload, log_level="warning",
+                               on_worker_exit=exited.append)
+        server.start()
+        try:
+            first = get_json(server.port)["pid"]
+            os.kill(first, signal.SIGKILL)
+            deadline = time.monotonic() + 5
+            while first in server.children and time.monotonic() < deadline:
+                server._reap(respawn=True)
+                time.sleep(0.05)
+            assert get_json(server.port)["pid"] not in (first, None)
+            assert exited == [first]
+        finally:
+            server.stop()
@@ -0,0 +1,46 @@
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+from pipeline.raster import CopyCounter, from_pil, from_pixmap
+
+
+class TestRasterViews:
+    @pytest.fixture
+    def pixmap(self):
+        doc = fitz.open()
+        page = doc.new_page(width=200, height=100)
+        page.draw_rect(fitz.Rect(10, 10, 50, 50), color=(1, 0, 0), fill=(1, 0, 0))
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+        doc.close()
+        return pixmap
+
+    def test_pixmap_view_shares_samples(self, pixmap):
+        """Test that the pixmap view aliases the samples buffer instead of copying"""
+        raster = from_pixmap(pixmap)
+        assert raster.array.shape == (pixmap.height, pixmap.width, pixmap.n)
+        assert not raster.array.flags.owndata
+        assert raster.bytes_copied == 0
+        assert raster.array.tobytes() == pixmap.samples
+
+    def test_pixmap_view_is_read_only(self, pixmap):
+        """Test that detectors cannot write through the view"""
+        raster = from_pixmap(pixmap)
+        with pytest.raises(ValueError):
+            raster.array[0, 0, 0] = 1
+
+    def test_pil_view_counts_copy(self):
+        """Test that the PIL path reports the bytes it copies"""
+        img = Image.new("RGB", (30, 20), color="white")
+        raster = from_pil(img)
+        assert raster.array.shape == (20, 30, 3)
+        assert raster.bytes_copied == 30 * 20 * 3
+
+    def test_copy_counter_per_page(self):
+        """Test that copy counts accumulate per page"""
+        counter = CopyCounter()
+        counter.add(0, 10)
+        counter.update({0: 5, 2: 7})
+        assert counter.pages == {0: 15, 2: 7}
+        assert counter.total == 22
@@ -0,0 +1,54 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from pipeline.raster_ring import RasterRing, read_slot
+
+
+@pytest.fixture
+def ring():
+    ring = RasterRing(slots=2, slot_bytes=64 * 64 * 3)
+    yield ring
+    ring.close()
+
+
+class TestRasterRing:
+    def test_write_then_read(self, ring):
+        """Test that a raster written to a slot reads back as a read-only view"""
+        raster = np.random.default_rng(0).integers(0, 256, (40, 64, 3), dtype=np.uint8)
+        ref = ring.write(1, raster)
+        assert ref.offset == ring.slot_bytes and ref.shape == (40, 64, 3)
+
+        view = read_slot(ref)
+        assert np.array_equal(view, raster)
+        assert not view.flags.writeable
+
+    def test_oversized_raster(self, ring):
+        """Test that a raster larger than a slot is refused"""
+        raster = np.zeros((65, 64, 3), dtype=np.uint8)
+        assert not ring.fits(raster)
+        with pytest.raises(ValueError):
+            ring.write(0, raster)
+
+    def test_acquire_waits_for_release(self, ring):
+        """Test that a full ring holds callers back until slots are released"""
+        async def run():
+            first = await ring.acquire(2)
+            assert ring.in_use == 2
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(ring.acquire(), timeout=0.05)
+
+            waiter = asyncio.create_task(ring.acquire())
+            await asyncio.sleep(0)
+            assert not waiter.done()
+            await ring.release(first)
+            assert (await waiter)[0] in first
+            assert ring.in_use == 1
+
+        asyncio.run(run())
+
+    def test_more_slots_than_the_ring(self, ring):
+        """Test that asking for more slots than exist fails instead of waiting forever"""
+        with pytest.raises(ValueError):
+            asyncio.run(ring.acquire(3))
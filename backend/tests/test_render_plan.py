@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+import fitz
+import numpy as np
+import pytest
+
+from pipeline.config import Config
+from pipeline.models import BoundingBox, PIIType
+from pipeline.processor import DocumentProcessor
+from pipeline.render_plan import RenderPlan, RenderPlanner, render_page
+
+LETTER = (0, 0, 612, 792)
+A0 = (0, 0, 2384, 3370)
+RECEIPT = (0, 0, 164, 420)
+
+
+def planner(**settings):
+    config = Config.load()
+    for key, value in settings.items():
+        config.set(key.replace("__", "."), value)
+    return RenderPlanner(config)
+
+
+class TestRenderPlanner:
+    def test_visual_scale_follows_page_size(self):
+        """Test that the long side is rendered at input_size * oversample pixels, within the scale limits"""
+        plans = planner()
+        assert plans.plan(LETTER, True, []).scale == pytest.approx(1280 / 792)
+        assert plans.plan(A0, True, []).scale == pytest.approx(1280 / 3370)
+        # Small pages stop at max_scale
+        assert plans.plan(RECEIPT, True, []).scale == 3.0
+        assert plans.plan(LETTER, True, []).clip == LETTER
+
+    def test_ocr_needs_its_own_resolution(self):
+        """Test that OCR regions raise the scale to ocr.render_scale whatever the page size"""
+        region = (100, 100, 400, 300)
+        assert planner().plan(A0, True, [region]).scale == 2.0
+
+    def test_clip_to_ocr_regions_without_visual(self):
+        """Test that only the OCR regions are rendered when no visual detection runs"""
+        plan = planner().plan(LETTER, False, [(100, 100, 300, 200), (50, 400, 200, 500)])
+        assert plan.clip == (50, 100, 300, 500) and plan.scale == 2.0
+        assert planner().plan(LETTER, False, []) is None
+
+    def test_pixel_cap(self):
+        """Test that no render exceeds render.max_mpx"""
+        plan = planner().plan(A0, True, [A0])
+        width, height = plan.size
+        assert width * height <= 40_000_000 * 1.001
+
+    def test_fixed_scale(self):
+        """Test that render.scale pins every page to one scale"""
+        assert planner(render__scale=2).plan(A0, True, []).scale == 2.0
+
+
+class TestBackMapping:
+    @pytest.mark.parametrize("scale", [0.37, 1.0, 1.62, 2.0])
+    def test_boxes_map_back_to_points(self, scale):
+        """Test that a box found in a clipped render maps back to the drawn rectangle in points"""
+        doc = fitz.open()
+        page = doc.new_page(width=612, height=792)
+        drawn = fitz.Rect(203.3, 311.7, 381.1, 402.9)
+        page.draw_rect(drawn, color=None, fill=(0, 0, 0))
+
+        raster, plan = render_page(page, RenderPlan(scale, (101.7, 150.2, 500.9, 700.4)))
+        dark = np.argwhere(raster.array[:, :, 0] < 128)
+        (y0, x0), (y1, x1) = dark.min(axis=0), dark.max(axis=0) + 1
+        mapped = plan.to_points(x0, y0, x1, y1)
+        doc.close()
+
+        # Within one render pixel of the truth
+        assert mapped == pytest.approx(tuple(drawn), abs=1 / scale + 1e-6)
+
+    def test_integer_boxes_round_outwards(self):
+        """Test that integer boxes in points always contain the pixel box they came from"""
+        plan = RenderPlan(1.5, LETTER, origin=(0, 0))
+        assert plan.bbox_to_points(BoundingBox(x=10, y=10, width=5, height=4)) == BoundingBox(
+            x=6, y=6, width=4, height=4
+        )
+
+
+class TestVisualBoxesInPoints:
+    def test_visual_detections_land_in_page_points(self, tmp_path):
+        """Test that visual boxes of pages rendered at different scales all come back in points"""
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+        from tests.test_onnx_engine import tiny_yolov5
+
+        (tmp_path / "visual").mkdir()
+        (tmp_path / "visual" / "sig.onnx").write_bytes(tiny_yolov5(640))
+        manifest = {"models": {"visual": {"signature_detector": {"path": "visual/sig.onnx"}}}}
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+
+        doc = fitz.open()
+        for width, height in [(612, 792), (2384, 3370)]:
+            doc.new_page(width=width, height=height)
+        path = tmp_path / "job_sizes.pdf"
+        doc.save(str(path))
+        doc.close()
+
+        config = Config.load()
+        config.set("visual.models_dir", str(tmp_path))
+        config.set("visual.signature_threshold", 0.1)
+        config.set("ocr.engine", "off")
+        processor = DocumentProcessor(config)
+        try:
+            result = asyncio.run(processor._process_pdf(str(path), "sizes.pdf"))
+        finally:
+            processor.close()
+
+        # The model finds a centred square a quarter of the long side wide, here in points,
+        # to within a pixel of the 640 model input
+        boxes = {e.page: e.bbox for e in result.audit_entries if e.pii_type == PIIType.SIGNATURE.value}
+        for page, (width, height) in enumerate([(612, 792), (2384, 3370)]):
+            side = max(width, height) / 4
+            tolerance = max(width, height) / 640 + 1
+            assert boxes[page]["x"] == pytest.approx((width - side) / 2, abs=tolerance)
+            assert boxes[page]["y"] == pytest.approx((height - side) / 2, abs=tolerance)
+            assert boxes[page]["width"] == pytest.approx(side, abs=tolerance)
@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import pytest
+from PIL import Image
+
+from pipeline.config import Config
+from pipeline.models import ProcessResult
+from pipeline.processor import DocumentProcessor
+from pipeline.result_cache import ResultCache, config_fingerprint
+
+
+def _result(output_path, size=100):
+    with open(output_path, "wb") as f:
+        f.write(b"x" * size)
+    return ProcessResult(
+        job_id="", filename="a.png", total_pages=1, detections_count=0,
+        audit_entries=[], output_path=str(output_path), summary={}, policy_version="v1"
+    )
+
+
+class TestResultCache:
+    def test_hit_and_miss_stats(self, tmp_path):
+        """Test that lookups are counted and hits restore the output file"""
+        cache = ResultCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+        key = ResultCache.make_key("abc", "cfg", ".png")
+
+        assert cache.get(key, str(tmp_path / "restored.png")) is None
+        cache.put(key, _result(tmp_path / "out.png"))
+        result = cache.get(key, str(tmp_path / "restored.png"))
+
+        assert result["policy_version"] == "v1"
+        assert (tmp_path / "restored.png").read_bytes() == b"x" * 100
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_lru_eviction_by_size(self, tmp_path):
+        """Test that the least recently used entry is evicted past the byte budget"""
+        cache = ResultCache(str(tmp_path / "cache"), max_bytes=1500)
+        keys = [ResultCache.make_key(str(i), "cfg", ".png") for i in range(3)]
+
+        cache.put(keys[0], _result(tmp_path / "0.png", 500))
+        cache.put(keys[1], _result(tmp_path / "1.png", 500))
+        cache.get(keys[0], str(tmp_path / "r.png"))  # keys[1] is now least recent
+        cache.put(keys[2], _result(tmp_path / "2.png", 500))
+
+        assert cache.get(keys[1], str(tmp_path / "r.png")) is None
+        assert cache.get(keys[0], str(tmp_path / "r.png")) is not None
+        assert cache.stats()["evictions"] == 1
+        assert cache.total_bytes <= 1500
+
+    def test_index_survives_restart(self, tmp_path):
+        """Test that a new cache instance finds entries already on disk"""
+        key = ResultCache.make_key("abc", "cfg", ".png")
+        ResultCache(str(tmp_path / "cache"), 1 << 20).put(key, _result(tmp_path / "out.png"))
+
+        reopened = ResultCache(str(tmp_path / "cache"), 1 << 20)
+        assert reopened.get(key, str(tmp_path / "restored.png")) is not None
+
+    def test_entries_are_shared_between_processes(self, tmp_path):
+        """Test that an entry stored by one cache instance is served by another already running"""
+        first = ResultCache(str(tmp_path / "cache"), 1 << 20)
+        second = ResultCache(str(tmp_path / "cache"), 1 << 20)
+        key = ResultCache.make_key("abc", "cfg", ".png")
+        first.put(key, _result(tmp_path / "out.png"))
+
+        assert second.get(key, str(tmp_path / "restored.png")) is not None
+        assert not list((tmp_path / "cache").glob("*/*.tmp"))
+        second._remove(key)
+        assert first.get(key, str(tmp_path / "restored.png")) is None
+
+    def test_fingerprint_tracks_output_settings(self):
+        """Test that output-affecting settings change the fingerprint and others do not"""
+        config = Config.load()
+        base = config_fingerprint(config)
+
+        config.set("processing.pdf_workers", 8)
+        assert config_fingerprint(config) == base
+
+        config.set("redaction.padding_px", 9)
+        assert config_fingerprint(config) != base
+
+        banded = config_fingerprint(config)
+        config.set("tiles.overlap_px", 64)
+        assert config_fingerprint(config) != banded
+
+    def test_fingerprint_tracks_resolved_models(self):
+        """Test that the engine a detector resolved to and its model digests change the fingerprint"""
+        config = Config.load()
+        mock = {"visual": {"engine": "mock"}, "ocr": {"engine": "off"}}
+        onnx = {"visual": {"engine": "onnx", "signature_detector": "a" * 64}, "ocr": {"engine": "off"}}
+        replaced = {"visual": {"engine": "onnx", "signature_detector": "b" * 64}, "ocr": {"engine": "off"}}
+        fingerprints = {config_fingerprint(config, models) for models in (mock, onnx, replaced)}
+        assert len(fingerprints) == 3
+
+
+class TestProcessorCache:
+    def test_resubmission_served_from_cache(self, tmp_path, monkeypatch):
+        """Test that identical content is not reprocessed"""
+        monkeypatch.chdir(tmp_path)
+        os.makedirs("temp")
+        os.makedirs("output")
+        for job_id in ("job1", "job2"):
+            Image.new("RGB", (400, 300), "white").save(f"temp/{job_id}_scan.png")
+
+        config = Config.load()
+        config.set("cache.dir", str(tmp_path / "cache"))
+        config.set("io.use_ramdisk", False)
+        processor = DocumentProcessor(config)
+        try:
+            first = asyncio.run(processor.process_document("temp/job1_scan.png", "scan.png"))
+            second = asyncio.run(processor.process_document("temp/job2_scan.png", "scan.png"))
+        finally:
+            processor.close()
+
+        assert "cache_hit" not in first.summary
+        assert second.summary["cache_hit"] is True
+        assert second.output_path == "output/job2_redacted_scan.png"
+        assert os.path.exists(second.output_path)
+        assert second.detections_count == first.detections_count
+        assert processor.result_cache.stats()["hits"] == 1
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from pipeline.scheduler import FairPageScheduler, JobScheduler, Priority, QueueFull
+
+
+class TestJobScheduler:
+    def test_priority_then_fifo_order(self):
+        """Test that interactive jobs run before bulk jobs, each in submission order"""
+        order = []
+
+        async def handler(job_id):
+            order.append(job_id)
+
+        async def run():
+            scheduler = JobScheduler(handler, concurrency=1)
+            scheduler.submit("bulk-1", Priority.BULK)
+            scheduler.submit("bulk-2", Priority.BULK)
+            scheduler.submit("ui-1", Priority.INTERACTIVE)
+            scheduler.submit("ui-2", Priority.INTERACTIVE)
+            await scheduler.start()
+            while scheduler.depth or scheduler.running:
+                await asyncio.sleep(0.01)
+            await scheduler.stop()
+
+        asyncio.run(run())
+        assert order == ["ui-1", "ui-2", "bulk-1", "bulk-2"]
+
+    def test_queue_positions(self):
+        """Test that positions reflect priority and drop out once started"""
+        async def run():
+            scheduler = JobScheduler(lambda job_id: asyncio.sleep(0), concurrency=1)
+            assert scheduler.submit("bulk-1", Priority.BULK) == 1
+            assert scheduler.submit("ui-1", Priority.INTERACTIVE) == 1
+            assert scheduler.position("bulk-1") == 2
+            assert scheduler.position("missing") is None
+
+        asyncio.run(run())
+
+    def test_admission_control(self):
+        """Test that submissions beyond max_depth are refused with a retry hint"""
+        async def run():
+            scheduler = JobScheduler(lambda job_id: asyncio.sleep(0), max_depth=2, retry_after=7)
+            scheduler.submit("a")
+            scheduler.submit("b")
+            with pytest.raises(QueueFull) as exc_info:
+                scheduler.submit("c")
+            assert exc_info.value.retry_after == 7
+
+        asyncio.run(run())
+
+    def test_concurrency_limit(self):
+        """Test that no more than `concurrency` jobs run at once"""
+        active = []
+        peak = []
+
+        async def handler(job_id):
+            active.append(job_id)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(job_id)
+
+        async def run():
+            scheduler = JobScheduler(handler, concurrency=2)
+            await scheduler.start()
+            for i in range(6):
+                scheduler.submit(f"job-{i}")
+            while scheduler.depth or scheduler.running:
+                await asyncio.sleep(0.01)
+            await scheduler.stop()
+
+        asyncio.run(run())
+        assert max(peak) == 2
+
+
+class TestFairPageScheduler:
+    def _run_jobs(self, scheduler, jobs):
+        """Run each job's units concurrently and return the global unit order"""
+        order = []
+
+        async def unit(job_key, index):
+            order.append((job_key, index))
+            await asyncio.sleep(0)
+
+        async def job(job_key, units):
+            scheduler.register(job_key, units)
+            for index in range(units):
+                await scheduler.run(job_key, lambda: unit(job_key, index))
+
+        async def run():
+            await asyncio.gather(*(job(key, units) for key, units in jobs))
+
+        asyncio.run(run())
+        return order
+
+    def test_round_robin_interleaves_jobs(self):
+        """Test that a small job is not stuck behind every unit of a large one"""
+        scheduler = FairPageScheduler(slots=1)
+        order = self._run_jobs(scheduler, [("big", 50), ("small", 2)])
+        finished_small = max(i for i, (key, _) in enumerate(order) if key == "small")
+        assert finished_small < 5
+        assert [index for key, index in order if key == "big"] == list(range(50))
+
+    def test_smallest_first_prefers_fewest_remaining(self):
+        """Test that the weighted policy drains the smallest job first"""
+        scheduler = FairPageScheduler(slots=1, policy="smallest_first")
+        order = self._run_jobs(scheduler, [("big", 10), ("mid", 4), ("small", 2)])
+        finished = {key: max(i for i, (k, _) in enumerate(order) if k == key) for key in ("big", "mid", "small")}
+        assert finished["small"] < finished["mid"] < finished["big"]
+
+    def test_timings(self):
+        """Test that first-unit and completion times are recorded per job"""
+        scheduler = FairPageScheduler(slots=1)
+        self._run_jobs(scheduler, [("big", 20), ("small", 1)])
+        big, small = scheduler.timings["big"], scheduler.timings["small"]
+        assert small.units_done == 1 and small.completion is not None
+        assert small.completion <= big.completion
+        assert big.time_to_first_page <= big.completion
+        assert scheduler.unregister("small") is small
+
+    def test_slots_bound_concurrency(self):
+        """Test that at most `slots` units run at once"""
+        active, peak = [], []
+
+        async def unit():
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.005)
+            active.pop()
+
+        async def run():
+            scheduler = FairPageScheduler(slots=2)
+            await asyncio.gather(*(scheduler.run(f"job-{i % 3}", unit) for i in range(9)))
+
+        asyncio.run(run())
+        assert max(peak) == 2
+
+    def test_unknown_policy(self):
+        """Test that an unknown policy name is rejected"""
+        with pytest.raises(ValueError):
+            FairPageScheduler(policy="fifo")
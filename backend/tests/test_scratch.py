@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from pipeline.scratch import ScratchStorage
+
+
+class TestScratchStorage:
+    @pytest.fixture
+    def scratch(self, tmp_path):
+        (tmp_path / "shm").mkdir()
+        return ScratchStorage(
+            disk_dir=str(tmp_path / "temp"),
+            output_dir=str(tmp_path / "output"),
+            ramdisk_dir=str(tmp_path / "shm" / "docushield"),
+            ramdisk_budget=1000
+        )
+
+    def test_allocates_on_ramdisk_within_budget(self, scratch):
+        """Test that files go to tmpfs while the budget allows and to disk after"""
+        first = scratch.output_path("job1", "a.pdf", size_hint=600)
+        second = scratch.output_path("job2", "b.pdf", size_hint=600)
+        assert scratch.is_ram(first)
+        assert not scratch.is_ram(second)
+        assert second.endswith(os.path.join("output", "job2_redacted_b.pdf"))
+
+    def test_discard_returns_budget(self, scratch):
+        """Test that discarding a tmpfs file frees its share of the budget"""
+        path = scratch.output_path("job1", "a.pdf", size_hint=900)
+        scratch.discard(path)
+        assert scratch.is_ram(scratch.output_path("job2", "b.pdf", size_hint=900))
+
+    def test_files_deleted_elsewhere_return_budget(self, scratch):
+        """Test that a tmpfs file deleted by another process stops counting once the budget runs out"""
+        path = scratch.output_path("job1", "a.pdf", size_hint=900)
+        with scratch.atomic_write(path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                f.write(b"x" * 900)
+        assert not scratch.is_ram(scratch.output_path("job2", "b.pdf", size_hint=900))
+
+        os.remove(path)
+        assert scratch.is_ram(scratch.output_path("job3", "c.pdf", size_hint=900))
+        # A reservation not written yet still counts
+        assert not scratch.is_ram(scratch.output_path("job4", "d.pdf", size_hint=900))
+
+    def test_atomic_write(self, scratch):
+        """Test that output only appears under its final name once complete"""
+        path = scratch.output_path("job1", "a.png", size_hint=10)
+        with pytest.raises(RuntimeError):
+            with scratch.atomic_write(path) as tmp_path:
+                with open(tmp_path, "wb") as f:
+                    f.write(b"partial")
+                raise RuntimeError("writer failed")
+        assert not os.path.exists(path)
+        assert os.listdir(os.path.dirname(path)) == []
+
+        path = scratch.output_path("job1", "a.png", size_hint=10)
+        with scratch.atomic_write(path) as tmp_path:
+            assert tmp_path.endswith(".png")
+            with open(tmp_path, "wb") as f:
+                f.write(b"12345")
+        assert open(path, "rb").read() == b"12345"
+        assert scratch.stats()["ram_bytes"] == 5
+
+    def test_writer_spills_to_disk(self, scratch):
+        """Test that a streamed file moves to disk once it outgrows the budget"""
+        writer = scratch.open_writer("input", "job1_big.pdf")
+        for _ in range(3):
+            writer.write(b"x" * 400)
+        path = writer.commit()
+
+        assert not scratch.is_ram(path)
+        assert os.path.getsize(path) == 1200
+        assert scratch.stats()["ram_bytes"] == 0
+
+    def test_no_ramdisk_uses_disk(self, tmp_path):
+        """Test that without a ramdisk everything is written to the disk directories"""
+        scratch = ScratchStorage(disk_dir=str(tmp_path / "temp"), output_dir=str(tmp_path / "output"))
+        assert not scratch.is_ram(scratch.allocate("input", "job1_a.pdf", 10))
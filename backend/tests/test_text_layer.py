@@ -0,0 +1,58 @@
+import fitz
+import pytest
+
+from pipeline.config import Config
+from pipeline.models import PIIType
+from pipeline.pii_text import TextPIIDetector
+from pipeline.text_layer import TextLayer
+
+
+class TestTextLayer:
+    @pytest.fixture
+    def page(self):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "PAN ABCDE1234F issued")
+        page.insert_text((72, 100), "Aadhaar 1234 5678 9012")
+        yield page
+        doc.close()
+
+    @pytest.fixture
+    def layer(self, page):
+        return TextLayer.from_page(page)
+
+    def test_text_joins_words_and_lines(self, layer):
+        """Test that words are space joined within a line and newline joined across lines"""
+        assert layer.text == "PAN ABCDE1234F issued\nAadhaar 1234 5678 9012"
+
+    def test_span_maps_to_word_rect(self, page, layer):
+        """Test that a character span maps to the word's rectangle on the page"""
+        start = layer.text.index("ABCDE1234F")
+        (rect,) = layer.span_rects(start, start + len("ABCDE1234F"))
+        expected = page.search_for("ABCDE1234F")[0]
+        assert rect == pytest.approx(tuple(expected), abs=0.5)
+
+    def test_lines_starting(self, layer):
+        """Test that whole lines are kept or dropped by where their top edge lies"""
+        assert layer.lines_starting(0, 80).text == "PAN ABCDE1234F issued"
+        assert layer.lines_starting(80, 200).text == "Aadhaar 1234 5678 9012"
+
+    def test_multi_word_span_is_one_rect_per_line(self, layer):
+        """Test that spans crossing a line break produce one rectangle per line"""
+        start = layer.text.index("issued")
+        end = layer.text.index("Aadhaar") + len("Aadhaar")
+        assert len(layer.span_rects(start, end)) == 2
+
+        start = layer.text.index("1234 5678")
+        rects = layer.span_rects(start, start + len("1234 5678 9012"))
+        assert len(rects) == 1
+
+    def test_detector_uses_real_coordinates(self, page, layer):
+        """Test that text detections carry bounding boxes from the text layer"""
+        detector = TextPIIDetector(Config.load())
+        detections = detector.detect_pii(layer.text, 0, layer)
+
+        pan = next(d for d in detections if d.pii_type == PIIType.PAN)
+        expected = page.search_for("ABCDE1234F")[0]
+        assert pan.bbox.x <= expected.x0 and pan.bbox.x + pan.bbox.width >= expected.x1
+        assert pan.bbox.y <= expected.y0 and pan.bbox.y + pan.bbox.height >= expected.y1
@@ -0,0 +1,148 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pipeline.config import Config
+from pipeline.models import BoundingBox, PIIDetection, PIIType
+from pipeline.processor import DocumentProcessor
+from pipeline.redaction import RedactionEngine
+from pipeline.tiles import StripSource, StripTiffWriter, iter_bands
+
+
+def make_scan(path, compression="raw", size=(300, 500)):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(str(path), compression=compression, dpi=(300, 300))
+    return pixels
+
+
+def tiled_config(tmp_path):
+    config = Config.load()
+    config.set("cache.enabled", False)
+    config.set("io.use_ramdisk", False)
+    config.set("io.output_dir", str(tmp_path / "out"))
+    config.set("tiles.height_px", 64)
+    config.set("tiles.rows_per_strip", 24)
+    return config
+
+
+class TestBands:
+    def test_bands_cover_every_row(self):
+        """Test that bands start every band_height rows and overlap below"""
+        assert list(iter_bands(250, 100, 20)) == [(0, 120), (100, 220), (200, 250)]
+        assert list(iter_bands(0, 100)) == []
+
+
+class TestStripSource:
+    def test_uncompressed_reads_are_bounded(self, tmp_path):
+        """Test that raw TIFF bands come from the file map and match the pixels"""
+        pixels = make_scan(tmp_path / "raw.tif")
+        with StripSource(str(tmp_path / "raw.tif")) as source:
+            assert source.bounded
+            assert np.array_equal(np.asarray(source.read(100, 164)), pixels[100:164])
+
+    def test_compressed_falls_back_to_decode(self, tmp_path):
+        """Test that compressed TIFFs still read correctly, unbounded"""
+        pixels = make_scan(tmp_path / "lzw.tif", compression="tiff_lzw")
+        with StripSource(str(tmp_path / "lzw.tif")) as source:
+            assert not source.bounded
+            assert np.array_equal(np.asarray(source.read(10, 20)), pixels[10:20])
+
+
+class TestStripTiffWriter:
+    def test_round_trip(self):
+        """Test that bands of any height are written as a readable TIFF"""
+        pixels = np.arange(70 * 9 * 3, dtype=np.uint8).reshape(70, 9, 3)
+        out = io.BytesIO()
+        writer = StripTiffWriter(out, 9, 70, rows_per_strip=16, dpi=(200, 200))
+        for top, bottom in [(0, 5), (5, 40), (40, 70)]:
+            writer.write_rows(Image.fromarray(pixels[top:bottom]))
+        writer.close()
+
+        out.seek(0)
+        with Image.open(out) as img:
+            assert np.array_equal(np.asarray(img), pixels)
+            assert img.info["dpi"] == (200, 200)
+
+    def test_missing_rows_are_an_error(self):
+        """Test that closing before every row is written raises"""
+        writer = StripTiffWriter(io.BytesIO(), 4, 10, rows_per_strip=4)
+        writer.write_rows(Image.new("RGB", (4, 6)))
+        with pytest.raises(ValueError):
+            writer.close()
+
+
+class TestTiledRedaction:
+    def test_matches_whole_image_redaction(self, tmp_path):
+        """Test that band-wise masking paints the same pixels as the in-memory path"""
+        make_scan(tmp_path / "job_scan.tif")
+        detections = [
+            # Spans several 64-row bands
+            PIIDetection(text="x", pii_type=PIIType.PAN, confidence=0.9,
+                         bbox=BoundingBox(x=20, y=50, width=100, height=150), page=0),
+            PIIDetection(text="y", pii_type=PIIType.PHONE, confidence=0.9,
+                         bbox=BoundingBox(x=150, y=300, width=80, height=20), page=0),
+        ]
+        engine = RedactionEngine(tiled_config(tmp_path))
+        whole = engine.redact_image(str(tmp_path / "job_scan.tif"), detections, "whole.tif")
+        tiled = engine.redact_image_tiled(str(tmp_path / "job_scan.tif"), detections, "tiled.tif")
+
+        with Image.open(whole) as a, Image.open(tiled) as b:
+            assert np.array_equal(np.asarray(a.convert("RGB")), np.asarray(b))
+
+    def test_processor_tiles_large_tiffs(self, tmp_path):
+        """Test that TIFFs over the size threshold take the tiled path"""
+        make_scan(tmp_path / "job_scan.tif")
+        config = tiled_config(tmp_path)
+        config.set("tiles.min_mpx", 0.1)
+        processor = DocumentProcessor(config)
+        try:
+            result = asyncio.run(processor._process_image(str(tmp_path / "job_scan.tif"), "scan.tif"))
+        finally:
+            processor.close()
+
+        assert result.summary["tiled"] is True
+        with Image.open(result.output_path) as img:
+            assert img.size == (300, 500)
+
+
+class TestMultiPageTiff:
+    @pytest.fixture
+    def fax(self, tmp_path):
+        path = tmp_path / "job_fax.tif"
+        frames = [Image.new("1", (200, 100), 1) for _ in range(3)]
+        frames[0].save(str(path), save_all=True, append_images=frames[1:], compression="group4", dpi=(204, 196))
+        return str(path)
+
+    def test_redacts_each_frame_with_its_own_regions(self, fax, tmp_path):
+        """Test that only the detection's page is painted and fax compression is kept"""
+        detection = PIIDetection(text="x", pii_type=PIIType.PAN, confidence=0.9,
+                                 bbox=BoundingBox(x=10, y=10, width=50, height=20), page=1)
+        engine = RedactionEngine(tiled_config(tmp_path))
+        output = engine.redact_image(fax, [detection], "fax.tif")
+
+        with Image.open(output) as img:
+            assert img.n_frames == 3
+            for page in range(3):
+                img.seek(page)
+                assert img.mode == "1"
+                assert img.info["compression"] == "group4"
+                assert img.info["dpi"] == (204, 196)
+                painted = not np.asarray(img)[20, 30]
+                assert painted == (page == 1)
+
+    def test_processor_reports_every_frame(self, fax, tmp_path):
+        """Test that a multi-page TIFF counts all its frames as pages"""
+        processor = DocumentProcessor(tiled_config(tmp_path))
+        try:
+            result = asyncio.run(processor._process_image(fax, "fax.tif"))
+        finally:
+            processor.close()
+
+        assert result.total_pages == 3
+        assert result.summary["tiled"] is False
+        with Image.open(result.output_path) as img:
+            assert img.n_frames == 3
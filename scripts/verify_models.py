@@ -6,20 +6,12 @@ Verifies that all required models are present and have correct checksums
 
 import os
 import json
-import hashlib
 import sys
 from pathlib import Path
 
-def calculate_sha256(file_path):
-    """Calculate SHA256 hash of a file"""
-    hash_sha256 = hashlib.sha256()
-    try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
-    except FileNotFoundError:
-        return None
+# Digests are shared with the backend's model registry
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from pipeline.model_registry import DIGEST_CACHE_NAME, DigestCache
 
 def verify_models():
     """Verify all models against manifest"""
@@ -42,6 +34,8 @@ def verify_models():
     
     all_valid = True
     models_dir = project_root / "models"
+    # Unchanged files (same size and mtime) are not rehashed
+    digests = DigestCache(models_dir / DIGEST_CACHE_NAME)
     
     for category, models in manifest["models"].items():
         print(f"📂 {category.upper()}:")
@@ -59,7 +53,7 @@ def verify_models():
             if expected_hash.startswith("placeholder_"):
                 print(f"  ⚠️  {model_name}: Placeholder file (development)")
             else:
-                actual_hash = calculate_sha256(model_path)
+                actual_hash = digests.digest(model_path)
                 if actual_hash == expected_hash:
                     print(f"  ✅ {model_name}: Valid")
                 else:
@@ -70,6 +64,9 @@ def verify_models():
         
         print()
     
+    print(f"ℹ️  Hashed {digests.hashed} files, the rest matched cached digests")
+    print()
+    
     if all_valid:
         print("✅ All models verified successfully!")
         return True